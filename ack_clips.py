@@ -0,0 +1,203 @@
+"""
+Acknowledgement clips: something to hear while the real answer is being made.
+
+Completion, checks and TTS take seconds, and until now the avatar sat silent
+for all of them. A client that opts in (`?ack=1` on the socket URL or
+"ack": true in its hello) gets a short pre-rendered clip as soon as its
+message arrives:
+
+    {"type": "ack", "text": "*tilts head* Hmm, let me think...", "audio": "...",
+     "emotion": "listening", "audio_format": "mp3"}
+
+The clip is chosen by the message's language (local detection, no upstream
+call) and intent: something hurts, a question, play, or anything else. Clips
+are synthesized once per process and format and kept here; with a FAQ pack
+built by build_faq_pack.py they come out of the pack and cost no TTS call at
+all. A clip that is not rendered yet is skipped rather than waited for.
+
+The real answer follows as usual and carries "crossfade_ms": the client fades
+the acknowledgement out over that time when the answer's audio starts.
+snowpaws_turn_first_audio_seconds measures perceived latency (message
+received to first audio sent, ack or answer); snowpaws_turn_seconds is still
+the latency of the real answer.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from audio_formats import tag_format
+from metrics import Counter, TURN_FIRST_AUDIO_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ACK_CLIPS_ENABLED = os.getenv("ACK_CLIPS_ENABLED", "true").lower() == "true"
+# Answers ready within this long get no acknowledgement (0: always send one)
+ACK_AFTER = float(os.getenv("ACK_AFTER_MS", "0")) / 1000
+ACK_CROSSFADE_MS = int(os.getenv("ACK_CROSSFADE_MS", "250"))
+
+# Per intent: the avatar emotion and a few short phrases per language
+PHRASES: Dict[str, dict] = {
+    "hurt": {
+        "emotion": "caring",
+        "en": ["*leans in gently* Oh no, let me think about that...",
+               "*ears perk up softly* I'm here. Give me just a moment..."],
+        "es": ["*se acerca con cuidado* Ay, déjame pensar un momento...",
+               "*mueve las orejas con suavidad* Aquí estoy. Dame un momentito..."],
+    },
+    "question": {
+        "emotion": "listening",
+        "en": ["*tilts head* Hmm, let me think...",
+               "*taps chin with paw* Good question! Let me see..."],
+        "es": ["*inclina la cabeza* Mmm, déjame pensar...",
+               "*se toca la barbilla con la pata* ¡Buena pregunta! A ver..."],
+    },
+    "play": {
+        "emotion": "happy",
+        "en": ["*tail swishes happily* Ooh, fun! One second...",
+               "*eyes sparkle* Oh, I like that! Let me think..."],
+        "es": ["*mueve la cola feliz* ¡Qué divertido! Un segundito...",
+               "*le brillan los ojos* ¡Me encanta! Déjame pensar..."],
+    },
+    "other": {
+        "emotion": "listening",
+        "en": ["*nods attentively* Mm-hmm, let me think...",
+               "*listens carefully* Okay, one moment..."],
+        "es": ["*asiente con atención* Mmm, déjame pensar...",
+               "*escucha con cuidado* Muy bien, un momento..."],
+    },
+}
+
+_INTENT_WORDS = {
+    "hurt": re.compile(r"\b(hurts?|hurting|pain|ache|sick|bleed\w*|fell|broke\w*|scared|afraid|cry\w*|"
+                       r"duele|dolor|enferm\w*|sangr\w*|ca[ií]|miedo|llor\w*)\b"),
+    "play": re.compile(r"\b(play|game|joke|fun|story|sing|silly|"
+                       r"jugar|juego|chiste|divertid\w*|cuento|cantar)\b"),
+}
+
+ACK_CLIPS_SENT = Counter("snowpaws_ack_clips_sent_total", "Acknowledgement clips sent before an answer",
+                         ("language", "intent"))
+ACK_CLIPS_SKIPPED = Counter("snowpaws_ack_clips_skipped_total", "Turns that got no acknowledgement clip",
+                            ("reason",))
+
+
+def wants_ack(query_params, hello: Optional[dict] = None) -> bool:
+    """Whether the client asked for acknowledgement clips, on the socket URL (?ack=1) or in its hello."""
+    if not ACK_CLIPS_ENABLED:
+        return False
+    if hello is not None and "ack" in hello:
+        return bool(hello["ack"])
+    return query_params.get("ack", "").lower() in ("1", "true")
+
+
+def classify(message: str) -> str:
+    """The acknowledgement intent of a child's message, from keywords alone."""
+    text = message.lower()
+    for intent, words in _INTENT_WORDS.items():
+        if words.search(text):
+            return intent
+    if "?" in text or text.startswith(("what", "why", "how", "when", "where", "who", "can", "do", "is", "will")):
+        return "question"
+    return "other"
+
+
+class AckClips:
+    """The rendered clip set of one bot, per language, intent, phrase and audio format."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.clips: Dict[Tuple[str, str, int, str], str] = {}
+        # Mouth tracks of PCM/WAV clips (lipsync.py)
+        self.tracks: Dict[Tuple[str, str, int, str], dict] = {}
+        self._rendering: Set[str] = set()
+
+    def speech_text(self, text: str, language: str) -> str:
+        if language == "es":
+            return self.bot.clean_spanish_text_for_tts(text)
+        return self.bot.clean_text_for_tts(text)
+
+    async def _render(self, audio_format: str):
+        for intent, phrases in PHRASES.items():
+            for language in ("en", "es"):
+                for index, text in enumerate(phrases[language]):
+                    key = (language, intent, index, audio_format)
+                    if key in self.clips:
+                        continue
+                    speech = self.speech_text(text, language)
+                    audio = await self.bot.generate_speech(speech, language, audio_format)
+                    if audio is not None:
+                        self.clips[key] = audio
+                        track = await self.bot.lip_sync(speech, language, audio_format, audio)
+                        if track is not None:
+                            self.tracks[key] = track
+
+    async def warm(self, audio_format: str):
+        """Render the whole set for `audio_format` (once; later calls return at once)."""
+        if audio_format in self._rendering:
+            return
+        self._rendering.add(audio_format)
+        await self._render(audio_format)
+        rendered = sum(1 for key in self.clips if key[3] == audio_format)
+        logger.info("Rendered %d %s acknowledgement clips", rendered, audio_format)
+        if rendered < sum(len(phrases[language]) for phrases in PHRASES.values() for language in ("en", "es")):
+            # TTS failed for some: try again on a later turn
+            self._rendering.discard(audio_format)
+
+    def frame(self, message: str, audio_format: str, language: Optional[str] = None) -> Optional[dict]:
+        """An acknowledgement frame for `message`, or None while the clips are still being rendered."""
+        language = self.bot.translator.quick_detect(message) or language or "en"
+        if language not in ("en", "es"):
+            language = "en"
+        intent = classify(message)
+        phrases = PHRASES[intent][language]
+        index = random.randrange(len(phrases))
+        audio = self.clips.get((language, intent, index, audio_format))
+        if audio is None:
+            if audio_format not in self._rendering:
+                asyncio.ensure_future(self.warm(audio_format))
+            ACK_CLIPS_SKIPPED.inc(reason="not_rendered")
+            return None
+        ACK_CLIPS_SENT.inc(language=language, intent=intent)
+        frame = tag_format({"type": "ack", "text": phrases[index], "audio": audio,
+                            "emotion": PHRASES[intent]["emotion"]}, audio_format)
+        track = self.tracks.get((language, intent, index, audio_format))
+        if track is not None:
+            frame["lipsync"] = track
+        return frame
+
+    async def answer(self, message: str, answer: Awaitable[dict], send: Callable[[dict], Awaitable[None]],
+                     audio_format: str, received_at: float, endpoint: str,
+                     language: Optional[str] = None) -> dict:
+        """
+        Await `answer`, sending an acknowledgement first if it is not ready
+        within ACK_AFTER. Returns the answer, marked for a cross-fade if an
+        acknowledgement went out.
+        """
+        task = asyncio.ensure_future(answer)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=ACK_AFTER)
+            frame = None
+            if not done:
+                frame = self.frame(message, audio_format, language)
+            else:
+                ACK_CLIPS_SKIPPED.inc(reason="answer_ready")
+            if frame is not None:
+                await send(frame)
+                TURN_FIRST_AUDIO_SECONDS.observe(time.perf_counter() - received_at, endpoint=endpoint, source="ack")
+            response = await task
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if frame is not None:
+            response = dict(response, crossfade_ms=ACK_CROSSFADE_MS)
+        return response
+
+
+
+def observe_answer_audio(response: dict, received_at: float, endpoint: str):
+    """Record perceived latency for a sent answer whose audio was the first the child heard."""
+    if response.get("audio") and "crossfade_ms" not in response:
+        TURN_FIRST_AUDIO_SECONDS.observe(time.perf_counter() - received_at, endpoint=endpoint, source="answer")
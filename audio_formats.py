@@ -0,0 +1,192 @@
+"""
+TTS audio format negotiation and accounting.
+
+Clients pick a format per connection, either with an `audio_format` query
+parameter on the socket URL or a hello message:
+
+    {"type": "hello", "audio_format": ["opus", "mp3"]}
+
+The first supported format in the client's list wins (MP3 otherwise), and the
+server answers with {"type": "hello_ack", "audio_format": ..., "mime_type": ...}.
+Every synthesized clip is counted per format, with its duration parsed from
+the container, so /metrics can report bytes per second of speech per format.
+"""
+import json
+import struct
+from typing import Iterable, Optional, Union
+
+from metrics import TTS_AUDIO_BYTES, TTS_AUDIO_SECONDS
+
+DEFAULT_FORMAT = "mp3"
+# OpenAI's PCM output is 24 kHz, 16-bit, mono, little-endian
+PCM_SAMPLE_RATE = 24000
+MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg; codecs=opus",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": f"audio/pcm;rate={PCM_SAMPLE_RATE};channels=1",
+}
+
+
+def negotiate(requested: Union[None, str, Iterable[str]]) -> str:
+    """First supported format from a name, comma-separated list or list; MP3 if none match."""
+    if not requested:
+        return DEFAULT_FORMAT
+    if isinstance(requested, str):
+        requested = requested.split(",")
+    for name in requested:
+        name = str(name).strip().lower()
+        if name in MIME_TYPES:
+            return name
+    return DEFAULT_FORMAT
+
+
+def hello_ack(audio_format: str) -> dict:
+    ack = {"type": "hello_ack", "audio_format": audio_format, "mime_type": MIME_TYPES[audio_format]}
+    if audio_format == "pcm":
+        ack.update(sample_rate=PCM_SAMPLE_RATE, channels=1, sample_width=2)
+    return ack
+
+
+def tag_format(frame: dict, audio_format: str) -> dict:
+    """Label a response frame with its audio format; MP3 frames stay unlabelled as before."""
+    if audio_format != DEFAULT_FORMAT:
+        frame["audio_format"] = audio_format
+    return frame
+
+
+def parse_hello(message: str) -> Optional[dict]:
+    """The hello payload if `message` is a hello frame, else None."""
+    if not message.startswith("{") or '"hello"' not in message:
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and data.get("type") == "hello" else None
+
+
+# MPEG audio: bitrate (kbps) by [version is MPEG-1][layer 3 index], sample rates by version
+_MP3_BITRATES = {
+    True: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0),
+    False: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_AAC_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+# Give up on a frame-based stream after this many bytes without a frame header
+MAX_RESYNC_BYTES = 4096
+
+
+def _mp3_duration(data: bytes) -> Optional[float]:
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = data[6] << 21 | data[7] << 14 | data[8] << 7 | data[9]
+        offset = 10 + size
+    seconds = 0.0
+    skipped = 0
+    while offset + 4 <= len(data) and skipped < MAX_RESYNC_BYTES:
+        header = int.from_bytes(data[offset:offset + 4], "big")
+        version = header >> 19 & 3
+        layer = header >> 17 & 3
+        bitrate_index = header >> 12 & 15
+        rate_index = header >> 10 & 3
+        if (header >> 21 != 0x7FF or version == 1 or layer != 1 or rate_index == 3
+                or bitrate_index in (0, 15)):
+            offset += 1
+            skipped += 1
+            continue
+        skipped = 0
+        mpeg1 = version == 3
+        bitrate = _MP3_BITRATES[mpeg1][bitrate_index] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples = 1152 if mpeg1 else 576
+        padding = header >> 9 & 1
+        seconds += samples / sample_rate
+        offset += samples // 8 * bitrate // sample_rate + padding
+    return seconds or None
+
+
+def _ogg_duration(data: bytes) -> Optional[float]:
+    # The granule position of the last page is the sample count at 48 kHz for Opus
+    last = data.rfind(b"OggS")
+    if last < 0 or last + 14 > len(data):
+        return None
+    (granule,) = struct.unpack_from("<q", data, last + 6)
+    pre_skip = 0
+    head = data.find(b"OpusHead")
+    if head >= 0 and head + 12 <= len(data):
+        (pre_skip,) = struct.unpack_from("<H", data, head + 10)
+    return max(0, granule - pre_skip) / 48000 if granule > 0 else None
+
+
+def _aac_duration(data: bytes) -> Optional[float]:
+    offset = frames = 0
+    sample_rate = None
+    skipped = 0
+    while offset + 7 <= len(data) and skipped < MAX_RESYNC_BYTES:
+        rate_index = data[offset + 2] >> 2 & 15
+        length = (data[offset + 3] & 3) << 11 | data[offset + 4] << 3 | data[offset + 5] >> 5
+        if (data[offset] != 0xFF or data[offset + 1] & 0xF6 != 0xF0
+                or rate_index >= len(_AAC_SAMPLE_RATES) or length < 7):
+            offset += 1
+            skipped += 1
+            continue
+        skipped = 0
+        sample_rate = _AAC_SAMPLE_RATES[rate_index]
+        frames += (data[offset + 6] & 3) + 1
+        offset += length
+    return frames * 1024 / sample_rate if sample_rate else None
+
+
+def _flac_duration(data: bytes) -> Optional[float]:
+    # STREAMINFO is the first metadata block, right after the "fLaC" marker
+    if data[:4] != b"fLaC" or len(data) < 26:
+        return None
+    info = int.from_bytes(data[18:26], "big")
+    sample_rate = info >> 44
+    total_samples = info & (1 << 36) - 1
+    return total_samples / sample_rate if sample_rate and total_samples else None
+
+
+def _wav_duration(data: bytes) -> Optional[float]:
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    byte_rate = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        (size,) = struct.unpack_from("<I", data, offset + 4)
+        if chunk_id == b"fmt " and offset + 16 <= len(data):
+            (byte_rate,) = struct.unpack_from("<I", data, offset + 16)
+        elif chunk_id == b"data" and byte_rate:
+            # Streamed WAVs carry a placeholder size; trust the bytes we actually have
+            return min(size, len(data) - offset - 8) / byte_rate
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def audio_duration(audio_format: str, data: bytes) -> Optional[float]:
+    """Seconds of audio in a TTS clip, parsed from the container; None if it can't be told."""
+    if audio_format == "pcm":
+        return len(data) / (PCM_SAMPLE_RATE * 2)
+    parser = {
+        "mp3": _mp3_duration,
+        "opus": _ogg_duration,
+        "aac": _aac_duration,
+        "flac": _flac_duration,
+        "wav": _wav_duration,
+    }.get(audio_format)
+    try:
+        return parser(data) if parser else None
+    except (struct.error, IndexError, ZeroDivisionError):
+        return None
+
+
+def record_clip(audio_format: str, data: bytes):
+    """Count a synthesized clip toward the per-format bytes-per-second metrics."""
+    seconds = audio_duration(audio_format, data)
+    if seconds:
+        TTS_AUDIO_BYTES.inc(len(data), format=audio_format)
+        TTS_AUDIO_SECONDS.inc(seconds, format=audio_format)
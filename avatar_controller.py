@@ -1,11 +1,19 @@
 from fastapi import FastAPI, WebSocket
-from typing import Dict
+from typing import Dict, Optional
 import json
+import lipsync
+from session_store import Session, SessionStore, get_session_store
+
+# Per-utterance animation data isn't worth persisting
+TRANSIENT_STATE = ("lipSync", "isPlaying")
 
 class AvatarController:
-    def __init__(self):
+    def __init__(self, store: Optional[SessionStore] = None):
         self.app = FastAPI()
+        # Sockets can't leave this process; the avatar state they show lives in the session store
         self.active_connections: Dict[str, WebSocket] = {}
+        self.sessions: Dict[str, Session] = {}
+        self.store = store or get_session_store()
         
         @self.app.websocket("/ws/{client_id}")
         async def websocket_endpoint(websocket: WebSocket, client_id: str):
@@ -20,10 +28,17 @@ class AvatarController:
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        session = Session(self.store, client_id)
+        await session.load(["avatar"])
+        self.sessions[client_id] = session
+        # Restore the avatar a reconnecting client had, even if it was on another instance
+        if session.get("avatar"):
+            await websocket.send_json({"type": "avatar_update", "data": session.get("avatar")})
     
     async def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+        self.sessions.pop(client_id, None)
     
     async def handle_message(self, client_id: str, data: str):
         # Process incoming messages from the client
@@ -39,18 +54,21 @@ class AvatarController:
                 "type": "avatar_update",
                 "data": state
             })
+        session = self.sessions.get(client_id)
+        lasting = {key: value for key, value in state.items() if key not in TRANSIENT_STATE}
+        if session is not None and lasting:
+            session.set("avatar", {**(session.get("avatar") or {}), **lasting})
+            await session.save()
 
-    async def sync_with_audio(self, client_id: str, audio_data: bytes):
+    async def sync_with_audio(self, client_id: str, audio_data: bytes, audio_format: str = "pcm"):
         """Sync avatar lip movement with audio"""
-        # Process audio data for lip sync
-        phonemes = self.analyze_audio(audio_data)
+        # Analyzed on the lip-sync worker pool, off the event loop
+        track = await self.analyze_audio(audio_data, audio_format)
         await self.update_avatar_state(client_id, {
-            "lipSync": phonemes,
+            "lipSync": track,
             "isPlaying": True
         })
     
-    def analyze_audio(self, audio_data: bytes):
-        """Analyze audio to extract phonemes for lip sync"""
-        # This is a placeholder for actual audio analysis
-        # In a real implementation, you would use a library to extract phonemes
-        return ["a", "o", "e"]  # Example phonemes
\ No newline at end of file
+    async def analyze_audio(self, audio_data: bytes, audio_format: str = "pcm") -> Optional[dict]:
+        """Mouth openness and viseme track of PCM/WAV speech (see lipsync.py); None for other formats"""
+        return await lipsync.analyze_async(audio_data, audio_format)
@@ -0,0 +1,170 @@
+"""
+Barge-in on the chat sockets: turns run as tasks so the socket keeps reading.
+
+While a turn is being answered the socket still receives, so heartbeats and
+control messages are handled at once. Clients that tag their messages get
+barge-in:
+
+    {"type": "message", "id": "m2", "text": "no wait, my ARM hurts"}
+    {"type": "message", "id": "m3", "text": "...", "supersede": false}
+    {"type": "cancel", "id": "m2"}                  (no id: every pending turn)
+
+A tagged message supersedes the turn in flight (and any queued behind it)
+unless it says "supersede": false, in which case it is queued. Cancelling a
+turn cancels its task, which aborts the guardrail, completion, translation
+and TTS calls it is waiting on (counted as outcome="cancelled" in
+snowpaws_upstream_calls_total). Frames of a cancelled turn are dropped even
+if they race the cancellation, and the client gets
+{"type": "cancelled", "id": ..., "reason": "superseded" | "cancel"}. Frames
+answering a tagged message carry "reply_to" with its id.
+
+Plain-text messages work as before: they are answered one at a time, in order.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+TURNS_CANCELLED = Counter("snowpaws_turns_cancelled_total", "Turns cancelled before their answer was sent",
+                          ("endpoint", "reason"))
+CANCELLED_TURN_SECONDS = Histogram(
+    "snowpaws_cancelled_turn_seconds", "How long a turn had been running when it was cancelled",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0),
+)
+FRAMES_DROPPED = Counter("snowpaws_stale_frames_dropped_total", "Frames of cancelled turns not sent", ("endpoint",))
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+def parse_message(message: str) -> Optional[dict]:
+    """The payload of a tagged {"type": "message"} frame, else None."""
+    if not message.startswith("{") or '"message"' not in message:
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get("type") == "message" and isinstance(data.get("text"), str):
+        return data
+    return None
+
+
+def parse_cancel(message: str) -> Optional[dict]:
+    """The payload of a {"type": "cancel"} frame, else None."""
+    if not message.startswith("{") or '"cancel"' not in message:
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and data.get("type") == "cancel" else None
+
+
+class Turn:
+    """One message being answered; `send` delivers its frames unless it was cancelled."""
+
+    def __init__(self, scheduler: "TurnScheduler", message_id: Optional[str]):
+        self.scheduler = scheduler
+        self.message_id = message_id
+        self.started_at = time.perf_counter()
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+
+    async def send(self, frame: dict):
+        if self.cancelled:
+            FRAMES_DROPPED.inc(endpoint=self.scheduler.endpoint)
+            return
+        if self.message_id is not None:
+            frame = dict(frame, reply_to=self.message_id)
+        await self.scheduler.send(frame)
+
+
+class TurnScheduler:
+    """Runs a socket's turns as tasks: in order, or superseding the ones still pending."""
+
+    def __init__(self, endpoint: str, send: Send):
+        self.endpoint = endpoint
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.turns: List[Turn] = []
+
+    async def send(self, frame: dict):
+        """Send a frame; turns and the receive loop share the socket one frame at a time."""
+        async with self._send_lock:
+            await self._send(frame)
+
+    def submit(self, answer: Callable[[Turn], Awaitable[None]], message_id: Optional[str] = None,
+               supersede: bool = False) -> Turn:
+        """Start answering a message; with `supersede` every pending turn is cancelled first."""
+        if supersede:
+            self._cancel(self.turns, "superseded")
+        turn = Turn(self, message_id)
+        previous = self.turns[-1].task if self.turns else None
+        turn.task = asyncio.create_task(self._run(turn, answer, previous))
+        self.turns.append(turn)
+        return turn
+
+    async def _run(self, turn: Turn, answer: Callable[[Turn], Awaitable[None]], previous: Optional[asyncio.Task]):
+        try:
+            if previous is not None:
+                # Answers go out in message order; a failed or cancelled turn doesn't hold up the next
+                await asyncio.wait([previous])
+            turn.started_at = time.perf_counter()
+            await answer(turn)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error answering message: {e}", exc_info=True)
+        finally:
+            if turn in self.turns:
+                self.turns.remove(turn)
+
+    def _cancel(self, turns: List[Turn], reason: str) -> List[Turn]:
+        cancelled = []
+        for turn in list(turns):
+            if turn.cancelled or turn.task.done():
+                continue
+            turn.cancelled = True
+            turn.task.cancel()
+            TURNS_CANCELLED.inc(endpoint=self.endpoint, reason=reason)
+            CANCELLED_TURN_SECONDS.observe(time.perf_counter() - turn.started_at)
+            cancelled.append(turn)
+            if turn.message_id is not None:
+                asyncio.ensure_future(self._notify(turn, reason))
+        return cancelled
+
+    async def _notify(self, turn: Turn, reason: str):
+        try:
+            await self.send({"type": "cancelled", "id": turn.message_id, "reason": reason})
+        except Exception:
+            pass
+
+    def cancel(self, message_id: Optional[str] = None, reason: str = "cancel") -> int:
+        """Cancel the turn answering `message_id`, or every pending turn; returns how many were cancelled."""
+        turns = [turn for turn in self.turns if message_id is None or turn.message_id == message_id]
+        return len(self._cancel(turns, reason))
+
+    async def close(self):
+        """Cancel whatever is left when the socket goes away."""
+        for turn in self.turns:
+            turn.cancelled = True
+            turn.task.cancel()
+        if self.turns:
+            await asyncio.wait([turn.task for turn in self.turns])
+
+
+def handle_control(scheduler: TurnScheduler, message: str) -> bool:
+    """Handle a cancel frame; True if `message` was one."""
+    cancel = parse_cancel(message)
+    if cancel is None:
+        return False
+    # Ids are compared as strings, the way tagged messages are submitted; no id cancels everything
+    message_id = cancel.get("id")
+    count = scheduler.cancel(str(message_id) if message_id is not None else None)
+    logger.info("Client cancelled %d turn(s)", count)
+    return True
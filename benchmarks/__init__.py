@@ -0,0 +1 @@
+# Benchmark suite for Dr. Snow Paws; see README.md ("Benchmarks") for usage
@@ -0,0 +1,139 @@
+"""
+Barge-in benchmark: a child corrects themselves while the first answer is still being made.
+
+Each session sends a message and, --correct-after seconds later, a correction.
+In "queued" mode both are plain text, so the correction waits for the first
+answer (the old behaviour); in "barge_in" mode they are tagged
+{"type": "message", "id": ...} frames and the correction supersedes the first
+turn. Reports, per mode, the time from sending the correction to its answer,
+the upstream requests per session (from benchmarks.fake_openai /stats) and
+the frames the client received that answered the abandoned message.
+
+    python -m benchmarks.barge_in_bench --target main --sessions 20 --output barge_in.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.corpus import CHILD_MESSAGES
+from benchmarks.load_test import TARGETS, free_port, percentiles, spawn
+
+MODES = ("queued", "barge_in")
+
+
+async def receive_answer(ws, timeout: float) -> dict:
+    """The next frame that is a reply (not a delta, heartbeat or cancel notice)."""
+    while True:
+        msg = await asyncio.wait_for(ws.receive(), timeout)
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"socket closed: {msg.type}")
+        frame = json.loads(msg.data)
+        if frame.get("type") in ("text_delta", "heartbeat", "cancelled", "hello_ack"):
+            continue
+        return frame
+
+
+async def run_session(session: aiohttp.ClientSession, url: str, target: dict, mode: str, index: int,
+                      args) -> dict:
+    first = CHILD_MESSAGES[(2 * index) % len(CHILD_MESSAGES)]
+    correction = CHILD_MESSAGES[(2 * index + 1) % len(CHILD_MESSAGES)]
+    async with session.ws_connect(url) as ws:
+        if target["greeting"]:
+            await receive_answer(ws, args.turn_timeout)
+        if mode == "barge_in":
+            await ws.send_str(json.dumps({"type": "message", "id": "first", "text": first}))
+            await asyncio.sleep(args.correct_after)
+            sent_at = time.perf_counter()
+            await ws.send_str(json.dumps({"type": "message", "id": "correction", "text": correction}))
+        else:
+            await ws.send_str(first)
+            await asyncio.sleep(args.correct_after)
+            sent_at = time.perf_counter()
+            await ws.send_str(correction)
+        if mode == "barge_in":
+            stale = 0
+            while (await receive_answer(ws, args.turn_timeout)).get("reply_to") != "correction":
+                stale += 1
+        else:
+            # Queued turns are answered in order: the abandoned answer comes first
+            await receive_answer(ws, args.turn_timeout)
+            await receive_answer(ws, args.turn_timeout)
+            stale = 1
+        return {"correction_seconds": time.perf_counter() - sent_at, "stale_frames": stale}
+
+
+async def run_mode(base_url: str, fake_url: str, target: dict, mode: str, args) -> dict:
+    url = base_url.replace("http", "ws", 1) + target["path"]
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{fake_url}/stats") as resp:
+            before = await resp.json()
+        results = await asyncio.gather(*(run_session(session, url, target, mode, i, args)
+                                         for i in range(args.sessions)))
+        # Let cancelled calls and queued turns settle before counting requests
+        await asyncio.sleep(1.0)
+        async with session.get(f"{fake_url}/stats") as resp:
+            after = await resp.json()
+    calls = {key: (after[key] - before[key]) / args.sessions for key in ("chat", "tts")}
+    return {
+        "correction_ms": {k: v * 1000 if isinstance(v, float) else v
+                          for k, v in percentiles([r["correction_seconds"] for r in results]).items()},
+        "upstream_requests_per_session": calls,
+        "stale_frames_per_session": sum(r["stale_frames"] for r in results) / args.sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barge-in: time to answer a correction, upstream requests saved")
+    parser.add_argument("--target", choices=["main", "server"], default="main")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--correct-after", type=float, default=0.3, help="Seconds before the correction is sent")
+    parser.add_argument("--chat-latency", default="fixed:0.8")
+    parser.add_argument("--tts-latency", default="fixed:0.4")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    target = TARGETS[args.target]
+    fake_port = free_port()
+    fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port),
+                  "--chat-latency", args.chat_latency, "--tts-latency", args.tts_latency],
+                 dict(os.environ), fake_port)
+    port = free_port()
+    # No pack or audio cache, so both modes pay for every reply
+    env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+               FAQ_PACK_PATH=os.devnull, AUDIO_CACHE_SIZE="0", LOG_LEVEL="WARNING")
+    app = None
+    try:
+        app = spawn([sys.executable, "-m", "uvicorn", target["app"], "--port", str(port), "--log-level", "warning"],
+                    env, port)
+        results = {mode: asyncio.run(run_mode(f"http://127.0.0.1:{port}", f"http://127.0.0.1:{fake_port}",
+                                              target, mode, args))
+                   for mode in MODES}
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "name": "barge_in_bench",
+        "target": args.target,
+        "sessions": args.sessions,
+        "correct_after": args.correct_after,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
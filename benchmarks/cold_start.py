@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark for the entry points, as a serverless platform sees them.
+
+Each sample is a fresh interpreter that imports the entry module (what a
+Mangum cold start pays before the first event), then serves the first page
+and the first /health check in-process. Reports medians over the runs, and
+exits non-zero when the import median is over the budget, so it doubles as
+the import-time check in CI:
+
+    python -m benchmarks.cold_start --module main --runs 10 --budget-ms 900
+    python -m benchmarks.cold_start --module main --importtime   # slowest imports
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.load_test import REPO_ROOT, percentiles
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1], fromlist=["app"])
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(module.app)
+client_ready = time.perf_counter()
+first_page = client.get(sys.argv[2]).status_code
+page_done = time.perf_counter()
+health = client.get(sys.argv[3]).status_code
+health_done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "first_page": page_done - client_ready,
+    "first_health": health_done - page_done,
+    "status": [first_page, health],
+}))
+"""
+
+PATHS = {
+    "main": ("/", "/health"),
+    "simple_app": ("/", "/health"),
+    "server": ("/", "/metrics"),
+    "app.api.routes": ("/api/hello", "/api/health"),
+}
+
+
+def run_once(module: str, env: dict) -> dict:
+    page, health = PATHS[module]
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, module, page, health],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process"] = time.perf_counter() - start
+    return sample
+
+
+def slowest_imports(module: str, env: dict, top: int = 15) -> list:
+    """Cumulative import times from `python -X importtime`, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point cold-start benchmark")
+    parser.add_argument("--module", choices=sorted(PATHS), default="main")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, help="Fail when the median import time exceeds this")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The bot refuses to start without a key; nothing here calls the API
+    env.setdefault("OPENAI_API_KEY", "sk-cold-start-bench")
+    # One warm-up so every run sees compiled bytecode, like a deployed image
+    run_once(args.module, env)
+    samples = [run_once(args.module, env) for _ in range(args.runs)]
+
+    report = {
+        "name": "cold_start",
+        "module": args.module,
+        "runs": args.runs,
+        "snapshot": os.path.exists(os.path.join(REPO_ROOT, os.getenv("SNAPSHOT_PATH", "snapshot.bin"))),
+    }
+    for key in ("import", "first_page", "first_health", "process"):
+        report[f"{key}_seconds"] = percentiles([sample[key] for sample in samples])
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(args.module, env)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if args.budget_ms is not None:
+        median_ms = report["import_seconds"]["p50"] * 1000
+        if median_ms > args.budget_ms:
+            print(f"Import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Diff two benchmark result files (from load_test.py or the other benchmarks).
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested result dicts into {'a.b.c': number}; lists of results are keyed by 'target'/'name'."""
+    flat: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key in ("config", "generated_at"):
+                continue
+            flat.update(flatten(child, f"{prefix}{key}."))
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            label = child.get("target") or child.get("name") if isinstance(child, dict) else None
+            flat.update(flatten(child, f"{prefix}{label or index}."))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix.rstrip(".")] = float(value)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--min-change", type=float, default=0.0, help="Hide changes smaller than this fraction")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = flatten(json.load(f))
+
+    width = max((len(key) for key in baseline), default=10)
+    for key in sorted(set(baseline) | set(candidate)):
+        old, new = baseline.get(key), candidate.get(key)
+        if old is None or new is None:
+            print(f"{key:<{width}}  {old!s:>14}  {new!s:>14}")
+            continue
+        change = (new - old) / old if old else 0.0
+        if abs(change) < args.min_change:
+            continue
+        print(f"{key:<{width}}  {old:>14.4f}  {new:>14.4f}  {change:+8.1%}")
+
+
+if __name__ == "__main__":
+    main()
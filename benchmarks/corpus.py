@@ -0,0 +1,68 @@
+"""
+Realistic bilingual conversation corpus used by the benchmarks.
+
+Child messages mix short replies, keyword hits for the response bank and
+longer free-form questions, in English and Spanish, roughly in the
+proportions seen in clinic sessions.
+"""
+
+CHILD_MESSAGES_EN = [
+    "hi",
+    "I'm scared",
+    "will the shot hurt?",
+    "does the needle hurt",
+    "my tummy hurts",
+    "what's your favorite color?",
+    "I like dogs",
+    "how old are you",
+    "I don't want medicine it tastes yucky",
+    "can you tell me a story about a brave penguin",
+    "why do I have to get a shot if I'm not sick?",
+    "my arm hurts where they poked me",
+    "what happens during a checkup? will you look in my ears?",
+    "I was brave today!",
+    "do snow leopards get sick too?",
+    "ok",
+    "yes",
+    "my little brother is sick and has a fever, is he going to be okay?",
+    "what is a stethoscope for",
+    "I want to play a game",
+]
+
+CHILD_MESSAGES_ES = [
+    "hola",
+    "tengo miedo",
+    "¿me va a doler la inyección?",
+    "me duele la barriga",
+    "¿cuál es tu color favorito?",
+    "me gustan los perros",
+    "¿cuántos años tienes?",
+    "no quiero la medicina, sabe feo",
+    "¿me cuentas un cuento de un pingüino valiente?",
+    "¿por qué tengo que ponerme una vacuna si no estoy enfermo?",
+    "me duele el brazo",
+    "¡fui muy valiente hoy!",
+    "sí",
+    "¿los leopardos de las nieves se enferman?",
+    "quiero jugar",
+]
+
+BOT_MESSAGES_EN = [
+    "*adjusts stethoscope* Hi there, little friend! I'm Doctor Snow Paws! My fluffy paws are ready to help you feel better today! 🩺",
+    "*speaks very softly* It's okay to feel scared about seeing the doctor. Many brave kids feel that way! Would it help if I showed you my special fluffy stethoscope first? It tickles when I use it! 💙",
+    "*gentle voice* Shots are quick little pinches that keep your body safe from germs. I know they can be scary, but they're super fast - just like a snow leopard! Would you like to squeeze my paw while you get one? 💉",
+    "*tilts head* Hmm, a tummy ache can feel really yucky... Can you show me where it hurts the most? I'll be extra gentle, I promise! 🐾",
+    "*tail swishes happily* Dogs are wonderful! They're fluffy and friendly, just like me. What's your dog's name? 🐶🌟",
+    "*eyes sparkle* Once upon a time, a brave little penguin named Pip waddled all the way to the snowy clinic... Do you want to know what Pip found there? 📚❄️",
+]
+
+BOT_MESSAGES_ES = [
+    "*ajusta el estetoscopio* ¡Hola amiguito! ¡Soy la Dra. Snow Paws! 🩺",
+    "*habla muy suavemente* Está bien tener miedo. ¿Te gustaría sostener mi pata suave y esponjosa mientras te cuento una historia feliz? 💝",
+    "*voz suave* Las vacunas son pellizquitos rápidos que protegen tu cuerpo de los gérmenes. ¡Son súper rápidas, como un leopardo de las nieves! ¿Quieres apretar mi pata? 💉",
+    "*inclina la cabeza* Mmm, el dolor de barriga no es nada divertido... ¿Me muestras dónde te duele más? ¡Seré muy gentil! 🐾",
+    "*ojos brillan con emoción* ¡Había una vez un pingüino valiente llamado Pip que caminó hasta la clínica nevada! ¿Quieres saber qué encontró? 📚",
+]
+
+CHILD_MESSAGES = CHILD_MESSAGES_EN + CHILD_MESSAGES_ES
+BOT_MESSAGES = BOT_MESSAGES_EN + BOT_MESSAGES_ES
@@ -0,0 +1,139 @@
+"""
+Local stand-in for a Redis-compatible key-value server, for the session store.
+
+Speaks enough RESP2 for session_store.RESPSessionStore (PING, GET, MGET, SET
+with EX/PX, DEL, EXPIRE, FLUSHALL, SELECT, AUTH) with an optional per-request
+delay to emulate a network hop. Point the app at it with
+SESSION_STORE=redis://127.0.0.1:<port>/0.
+
+    python -m benchmarks.fake_kv --port 6390 --latency-ms 0.5
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeKV:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: List[bytes]) -> bytes:
+        command = args[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"SELECT", b"AUTH", b"FLUSHALL"):
+            if command == b"FLUSHALL":
+                self.data.clear()
+            return b"+OK\r\n"
+        if command == b"GET":
+            return bulk(self._get(args[1]))
+        if command == b"MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(bulk(self._get(key)) for key in args[1:])
+        if command == b"SET":
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            if b"EX" in options:
+                expires_at = time.time() + int(args[3 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires_at = time.time() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        if command == b"EXPIRE":
+            value = self._get(args[1])
+            if value is None:
+                return b":0\r\n"
+            self.data[args[1]] = (value, time.time() + int(args[2]))
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                # Answer every complete command that has arrived in one go, like a real pipelined server
+                replies = []
+                while True:
+                    args = parse_command(buffer)
+                    if args is None:
+                        break
+                    replies.append(self.execute(args))
+                if not replies:
+                    continue
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def parse_command(buffer: bytearray) -> Optional[List[bytes]]:
+    """Pop one complete command off the front of the buffer, or None if it hasn't fully arrived."""
+    end = buffer.find(b"\r\n")
+    if end < 0:
+        return None
+    if not buffer.startswith(b"*"):
+        # Inline command, as typed into telnet
+        args = bytes(buffer[:end]).split()
+        del buffer[:end + 2]
+        return args or parse_command(buffer)
+    position = end + 2
+    args = []
+    for _ in range(int(buffer[1:end])):
+        line_end = buffer.find(b"\r\n", position)
+        if line_end < 0:
+            return None
+        length = int(buffer[position + 1:line_end])
+        start = line_end + 2
+        if len(buffer) < start + length + 2:
+            return None
+        args.append(bytes(buffer[start:start + length]))
+        position = start + length + 2
+    del buffer[:position]
+    return args
+
+
+async def serve(host: str, port: int, latency: float):
+    kv = FakeKV(latency)
+    server = await asyncio.start_server(kv.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake RESP key-value server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to each request batch")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.latency_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
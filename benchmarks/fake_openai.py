@@ -0,0 +1,196 @@
+"""
+Local stand-in for the OpenAI API used by the load benchmarks.
+
+Serves chat completions, TTS and transcription with configurable latency
+distributions, error rates and payload sizes, so load tests never touch the
+real API. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m benchmarks.fake_openai --port 9100 --chat-latency lognormal:0.8:0.4 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import struct
+import time
+from typing import Callable
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+# Approximate encoded bytes per second of speech for each TTS response_format
+FORMAT_BYTE_RATES = {
+    "mp3": 20000,   # ~160 kbps
+    "opus": 4000,   # ~32 kbps
+    "aac": 8000,    # ~64 kbps
+    "flac": 60000,
+    "wav": 48000,   # 24 kHz, 16-bit mono
+    "pcm": 48000,
+}
+WORDS_PER_SECOND = 2.5
+PCM_SAMPLE_RATE = 24000
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+
+    fixed:0.5 | uniform:0.2:1.0 | normal:0.8:0.2 | lognormal:0.8:0.4 (median, sigma)
+    """
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def synth_pcm(seconds: float) -> bytes:
+    """Speech-shaped 16-bit PCM: voiced tones under a ~4 Hz syllable envelope with short gaps."""
+    samples = int(seconds * PCM_SAMPLE_RATE)
+    out = bytearray()
+    for n in range(samples):
+        t = n / PCM_SAMPLE_RATE
+        syllable = max(0.0, math.sin(2 * math.pi * 4 * t))
+        voice = math.sin(2 * math.pi * 180 * t) + 0.4 * math.sin(2 * math.pi * 720 * t)
+        out += struct.pack("<h", int(9000 * syllable * voice / 1.4))
+    return bytes(out)
+
+
+def wav_header(data_len: int) -> bytes:
+    return b"RIFF" + struct.pack("<I", 36 + data_len) + b"WAVEfmt " + struct.pack(
+        "<IHHIIHH", 16, 1, 1, PCM_SAMPLE_RATE, PCM_SAMPLE_RATE * 2, 2, 16
+    ) + b"data" + struct.pack("<I", data_len)
+
+
+class FakeOpenAI:
+    def __init__(self, args):
+        self.chat_latency = parse_latency(args.chat_latency)
+        self.tts_latency = parse_latency(args.tts_latency)
+        self.transcribe_latency = parse_latency(args.transcribe_latency)
+        self.error_rate = args.error_rate
+        self.reply_words = args.reply_words
+        self.calls = {"chat": 0, "tts": 0, "transcribe": 0, "errors": 0}
+        self.noise = random.randbytes(1 << 20)
+        self.pcm_second = synth_pcm(1.0)
+        self.app = self.build_app()
+
+    def should_fail(self) -> bool:
+        if random.random() < self.error_rate:
+            self.calls["errors"] += 1
+            return True
+        return False
+
+    def chat_reply(self, body: dict) -> str:
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = messages[-1]["content"] if messages else ""
+        if '"reply"' in system and "JSON object" in system:
+            # fused_turn.py: verdict, language, emotion and the reply in one object
+            language = "es" if any(c in user for c in "áéíóúñ¿¡") else "en"
+            words = ["*tilts head*"] + ["nieve" if language == "es" else "snow"] * max(1, self.reply_words - 2) + ["🐾"]
+            return json.dumps({"safe": True, "language": language, "emotion": "listening", "reply": " ".join(words)})
+        if "content safety filter" in system and '"verdicts"' in system:
+            items = json.loads(user)
+            return json.dumps({"verdicts": [{"id": item["id"], "safe": True} for item in items]})
+        if "content safety filter" in system:
+            return f"SAFE: {user}"
+        if "language detector" in system:
+            return "es" if any(c in user for c in "áéíóúñ¿¡") else "en"
+        if "Translate" in system:
+            return user
+        words = ["*tilts head*"] + ["snow"] * max(1, self.reply_words - 2) + ["🐾"]
+        return " ".join(words)
+
+    def build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat(request: Request):
+            body = await request.json()
+            self.calls["chat"] += 1
+            await asyncio.sleep(self.chat_latency())
+            if self.should_fail():
+                return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=500)
+            reply = self.chat_reply(body)
+            if body.get("stream"):
+                return StreamingResponse(self.stream_chunks(body, reply), media_type="text/event-stream")
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+
+        @app.post("/v1/audio/speech")
+        async def speech(request: Request):
+            body = await request.json()
+            self.calls["tts"] += 1
+            await asyncio.sleep(self.tts_latency())
+            if self.should_fail():
+                return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=500)
+            audio_format = body.get("response_format", "mp3")
+            seconds = max(0.5, len(body.get("input", "").split()) / WORDS_PER_SECOND)
+            if audio_format in ("pcm", "wav"):
+                whole, frac = divmod(seconds, 1.0)
+                pcm = self.pcm_second * int(whole) + self.pcm_second[: int(frac * PCM_SAMPLE_RATE) * 2]
+                content = wav_header(len(pcm)) + pcm if audio_format == "wav" else pcm
+            else:
+                size = int(seconds * FORMAT_BYTE_RATES.get(audio_format, 20000))
+                content = (self.noise * (size // len(self.noise) + 1))[:size]
+            return Response(content, media_type="application/octet-stream")
+
+        @app.post("/v1/audio/transcriptions")
+        async def transcriptions(request: Request):
+            await request.body()
+            self.calls["transcribe"] += 1
+            await asyncio.sleep(self.transcribe_latency())
+            if self.should_fail():
+                return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=500)
+            return PlainTextResponse("will the shot hurt")
+
+        @app.get("/stats")
+        async def stats():
+            return self.calls
+
+        return app
+
+    async def stream_chunks(self, body: dict, reply: str):
+        # Spread the reply over ~8 chunks with small gaps, like a real token stream
+        step = max(1, len(reply) // 8)
+        for i in range(0, len(reply), step):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": reply[i:i + step]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0.01)
+        yield "data: [DONE]\n\n"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Fake OpenAI server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--chat-latency", default="lognormal:0.6:0.4")
+    parser.add_argument("--tts-latency", default="lognormal:0.9:0.3")
+    parser.add_argument("--transcribe-latency", default="lognormal:0.7:0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reply-words", type=int, default=30)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    uvicorn.run(FakeOpenAI(args).app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,102 @@
+"""
+Cost and latency of micro-batched input checks (guardrail_batcher.py).
+
+Fires input checks at a Poisson arrival rate against benchmarks.fake_openai,
+once with individual requests and once per batch window, and reports the
+upstream requests made, the per-check latency, the mean batch size and the
+wait the window added:
+
+    python -m benchmarks.guardrail_batch_bench --rate 40 --duration 10 --windows 0 25 50 100 --output batch.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+
+from openai import AsyncOpenAI
+
+import guardrail_batcher
+from benchmarks.load_test import free_port, percentiles, spawn
+from guardrails import DrSnowPawsGuardrails
+
+
+def chat_calls(base_url: str) -> int:
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.loads(response.read())["chat"]
+
+
+async def run_window(window_ms: float, base_url: str, args) -> dict:
+    guardrails = DrSnowPawsGuardrails(AsyncOpenAI(api_key="x", base_url=f"{base_url}/v1"))
+    guardrails.batcher = (guardrail_batcher.GuardrailBatcher(guardrails, window_ms / 1000, args.max_batch)
+                          if window_ms > 0 else None)
+    rng = random.Random(args.seed)
+    latencies = []
+
+    async def one_check(index: int):
+        start = time.perf_counter()
+        await guardrails.check_input(f"Why does my tummy hurt? ({index})")
+        latencies.append(time.perf_counter() - start)
+
+    calls_before = chat_calls(base_url)
+    tasks = []
+    deadline = time.perf_counter() + args.duration
+    index = 0
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(one_check(index)))
+        index += 1
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    await guardrails.client.close()
+    requests = chat_calls(base_url) - calls_before
+    return {
+        "window_ms": window_ms,
+        "checks": len(latencies),
+        "upstream_requests": requests,
+        "requests_saved": len(latencies) - requests,
+        "mean_batch_size": len(latencies) / requests if requests else None,
+        "latency_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(latencies).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guardrail micro-batching benchmark")
+    parser.add_argument("--rate", type=float, default=40.0, help="Input checks per second across all sessions")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 25, 50, 100],
+                        help="Batch windows in ms; 0 sends every check on its own")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--chat-latency", default="lognormal:0.6:0.4")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+                  "--chat-latency", args.chat_latency], dict(os.environ), port)
+    try:
+        results = [asyncio.run(run_window(window, base_url, args)) for window in args.windows]
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "name": "guardrail_batch_bench",
+        "rate": args.rate,
+        "duration": args.duration,
+        "max_batch": args.max_batch,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the lip-sync analysis (lipsync.py) on synthetic PCM speech.
+
+Clips are the synthetic utterances of benchmarks.vad_bench rendered as 24 kHz
+16-bit mono PCM, the way TTS returns them, and trimmed or repeated to each
+--seconds length. Reports the analysis time per second of speech (best of
+--repeats), how much faster than realtime that is, and the size of the track
+sent with the audio frame per second of speech:
+
+    python -m benchmarks.lipsync_bench --seconds 1 3 10 30 --output lipsync.json
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+import lipsync
+import vad
+from audio_formats import PCM_SAMPLE_RATE
+from benchmarks.vad_bench import synth_recording
+
+
+def speech_pcm(rng: random.Random, seconds: float) -> bytes:
+    """`seconds` of synthetic speech as raw 16-bit PCM."""
+    pieces, total = [], 0
+    target = int(seconds * PCM_SAMPLE_RATE)
+    while total < target:
+        wav, _ = synth_recording(rng, PCM_SAMPLE_RATE, 1)
+        samples, _ = vad.decode(wav)
+        pieces.append(samples[:, 0])
+        total += len(samples)
+    mono = np.concatenate(pieces)[:target]
+    return (np.clip(mono, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lip-sync analysis time per second of speech")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1.0, 3.0, 10.0, 30.0])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for seconds in args.seconds:
+        pcm = speech_pcm(rng, seconds)
+        lipsync.analyze(pcm, "pcm")
+        best = float("inf")
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            track = lipsync.analyze(pcm, "pcm")
+            best = min(best, time.perf_counter() - start)
+        frame_bytes = len(json.dumps(track.to_dict()))
+        results.append({
+            "seconds": seconds,
+            "frames": len(track.mouth),
+            "ms_per_speech_second": best * 1000 / seconds,
+            "x_realtime": seconds / best,
+            "track_bytes_per_speech_second": frame_bytes / seconds,
+            "visemes": {code: track.visemes.count(code) for code in "XMAEOS"},
+        })
+
+    report = {
+        "name": "lipsync_bench",
+        "frame_ms": lipsync.FRAME_MS,
+        "repeats": args.repeats,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+End-to-end WebSocket load generator for the chat entry points.
+
+Opens many concurrent sessions against main.py (/chat), server.py (/ws) and
+simple_app.py (/chat) with heartbeats and human-like turn pacing, and reports
+throughput, time-to-first-text, time-to-audio, server memory per connection
+and event-loop lag as JSON that can be diffed between releases
+(see benchmarks/compare.py).
+
+With --spawn, the fake OpenAI server and each app are started locally, so
+nothing touches the real API:
+
+    python -m benchmarks.load_test --spawn --target main --target simple --sessions 200 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.corpus import CHILD_MESSAGES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "main": {"app": "main:app", "path": "/chat", "greeting": True, "heartbeat": '{"type":"heartbeat"}'},
+    "server": {"app": "server:app", "path": "/ws", "greeting": False, "heartbeat": '{"type":"heartbeat"}'},
+    "simple": {"app": "simple_app:app", "path": "/chat", "greeting": True, "heartbeat": "heartbeat"},
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1],
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Flatten a Prometheus text scrape into {'name{labels}': value}."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            try:
+                samples[name] = float(value)
+            except ValueError:
+                continue
+    return samples
+
+
+def histogram_quantiles(before: Dict[str, float], after: Dict[str, float], name: str) -> Dict[str, Optional[float]]:
+    """Approximate p50/p99 (bucket upper bound) of observations made between two scrapes."""
+    buckets = []
+    prefix = f'{name}_bucket{{le="'
+    for key, value in after.items():
+        if key.startswith(prefix):
+            bound = key[len(prefix):-2]
+            upper = float("inf") if bound == "+Inf" else float(bound)
+            buckets.append((upper, value - before.get(key, 0.0)))
+    buckets.sort()
+    total = buckets[-1][1] if buckets else 0
+    result: Dict[str, Optional[float]] = {"observations": total}
+    for label, q in (("p50", 0.5), ("p99", 0.99)):
+        result[label] = next((upper for upper, count in buckets if total and count >= q * total), None)
+    return result
+
+
+class LoadStats:
+    def __init__(self, sessions: int):
+        self.sessions = sessions
+        self.connected = 0
+        self.all_connected = asyncio.Event()
+        self.ttft: List[float] = []
+        self.time_to_audio: List[float] = []
+        self.turns = 0
+        self.turns_without_audio = 0
+        self.errors = 0
+        self.client_lag: List[float] = []
+
+    def mark_connected(self):
+        self.connected += 1
+        if self.connected >= self.sessions:
+            self.all_connected.set()
+
+
+async def receive_answer(ws, timeout: float):
+    """Wait for the next answer frame, skipping heartbeats and auxiliary frames; returns (ttft, tta)."""
+    start = time.perf_counter()
+    first_text = first_audio = None
+    while True:
+        msg = await asyncio.wait_for(ws.receive(), timeout)
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"socket closed ({msg.type})")
+        data = json.loads(msg.data)
+        now = time.perf_counter() - start
+        if data.get("type") == "heartbeat":
+            continue
+        if data.get("text") and first_text is None:
+            first_text = now
+        if data.get("audio") and first_audio is None:
+            first_audio = now
+        # Answer frames have no "type" (legacy) or type "response"; others are auxiliary
+        if data.get("type") in (None, "response"):
+            return first_text, first_audio
+
+
+async def heartbeat_loop(ws, payload: str, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await ws.send_str(payload)
+
+
+async def run_session(http: aiohttp.ClientSession, url: str, target: dict, args, stats: LoadStats):
+    await asyncio.sleep(random.uniform(0, args.ramp_seconds))
+    heartbeat = None
+    try:
+        async with http.ws_connect(url) as ws:
+            stats.mark_connected()
+            if target["greeting"]:
+                await receive_answer(ws, args.turn_timeout)
+            heartbeat = asyncio.create_task(heartbeat_loop(ws, target["heartbeat"], args.heartbeat_seconds))
+            for _ in range(args.turns):
+                await asyncio.sleep(random.uniform(args.think_min, args.think_max))
+                await ws.send_str(random.choice(CHILD_MESSAGES))
+                ttft, tta = await receive_answer(ws, args.turn_timeout)
+                stats.turns += 1
+                if ttft is not None:
+                    stats.ttft.append(ttft)
+                if tta is not None:
+                    stats.time_to_audio.append(tta)
+                else:
+                    stats.turns_without_audio += 1
+            # Keep the connection open until everyone has connected so memory is measured at peak
+            await stats.all_connected.wait()
+    except Exception:
+        stats.errors += 1
+        if not stats.all_connected.is_set():
+            stats.mark_connected()
+    finally:
+        if heartbeat:
+            heartbeat.cancel()
+
+
+async def client_lag_monitor(stats: LoadStats, interval: float = 0.1):
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        stats.client_lag.append(max(0.0, loop.time() - scheduled - interval))
+
+
+async def scrape(http: aiohttp.ClientSession, base_url: str) -> Dict[str, float]:
+    try:
+        async with http.get(f"{base_url}/metrics") as resp:
+            return parse_metrics(await resp.text())
+    except aiohttp.ClientError:
+        return {}
+
+
+async def run_target(name: str, base_url: str, args) -> dict:
+    target = TARGETS[name]
+    ws_url = base_url.replace("http", "ws", 1) + target["path"]
+    stats = LoadStats(args.sessions)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        idle = await scrape(http, base_url)
+        monitor = asyncio.create_task(client_lag_monitor(stats))
+        started = time.perf_counter()
+        sessions = [asyncio.create_task(run_session(http, ws_url, target, args, stats)) for _ in range(args.sessions)]
+        await stats.all_connected.wait()
+        peak = await scrape(http, base_url)
+        await asyncio.gather(*sessions)
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+        final = await scrape(http, base_url)
+
+    rss_key = "snowpaws_process_resident_memory_bytes"
+    rss_idle, rss_peak = idle.get(rss_key), peak.get(rss_key)
+    return {
+        "target": name,
+        "sessions": args.sessions,
+        "turns": stats.turns,
+        "errors": stats.errors,
+        "turns_without_audio": stats.turns_without_audio,
+        "elapsed_seconds": elapsed,
+        "throughput_turns_per_second": stats.turns / elapsed if elapsed else 0.0,
+        "time_to_first_text_seconds": percentiles(stats.ttft),
+        "time_to_audio_seconds": percentiles(stats.time_to_audio),
+        "server": {
+            "rss_idle_bytes": rss_idle,
+            "rss_peak_bytes": rss_peak,
+            "rss_per_connection_bytes": (rss_peak - rss_idle) / args.sessions if rss_idle and rss_peak else None,
+            "event_loop_lag_seconds": histogram_quantiles(idle, final, "snowpaws_event_loop_lag_seconds"),
+        },
+        "client_event_loop_lag_seconds": percentiles(stats.client_lag),
+    }
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def spawn(cmd: List[str], env: dict, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="WebSocket load benchmark")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="Entry point(s) to load")
+    parser.add_argument("--url", help="Base URL of an already running app (single target only)")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake OpenAI server and each app locally")
+    parser.add_argument("--fake-args", default="", help="Extra arguments for benchmarks.fake_openai")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0)
+    parser.add_argument("--think-min", type=float, default=2.0)
+    parser.add_argument("--think-max", type=float, default=6.0)
+    parser.add_argument("--heartbeat-seconds", type=float, default=25.0)
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write JSON results here as well as stdout")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    targets = args.target or ["main"]
+    if not args.spawn and not args.url:
+        sys.exit("Pass --url for a running app or --spawn to start everything locally")
+
+    results = {"generated_at": time.time(), "config": vars(args), "results": []}
+    fake = None
+    try:
+        if args.spawn:
+            fake_port = free_port()
+            fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port)]
+                         + args.fake_args.split(), dict(os.environ), fake_port)
+        for name in targets:
+            app = None
+            base_url = args.url
+            try:
+                if args.spawn:
+                    port = free_port()
+                    env = dict(os.environ, OPENAI_API_KEY="bench",
+                               OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1")
+                    app = spawn([sys.executable, "-m", "uvicorn", TARGETS[name]["app"], "--port", str(port),
+                                 "--log-level", "warning"], env, port)
+                    base_url = f"http://127.0.0.1:{port}"
+                results["results"].append(asyncio.run(run_target(name, base_url, args)))
+            finally:
+                if app:
+                    app.terminate()
+                    app.wait()
+    finally:
+        if fake:
+            fake.terminate()
+            fake.wait()
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
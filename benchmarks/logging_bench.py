@@ -0,0 +1,133 @@
+"""
+Logging overhead per turn for each logging_setup.py configuration.
+
+Runs the same turns through bot.generate_response against
+benchmarks.fake_openai (no upstream latency, so logging dominates the
+difference) with every record written to a sink that takes --sink-latency-ms
+per write, like a stderr pipe to a busy log shipper. Reports, per mode, the
+turn time and its overhead over running with no sink, and the records written
+per turn:
+
+    off               no sink (baseline)
+    sync              DEBUG, written on the event loop (the old setup)
+    enqueued          DEBUG, written by the background thread
+    enqueued_limited  enqueued, with the default hot-path rate limit
+    info              enqueued at INFO: hot-path DEBUG is skipped before formatting
+
+    python -m benchmarks.logging_bench --turns 200 --sink-latency-ms 0.2 --output logging.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from benchmarks.load_test import free_port, percentiles, spawn
+
+MESSAGES = [
+    "Why do I need to wear a cast on my arm for six whole weeks?",
+    "What is your favorite color?",
+    "Me duele la barriga desde el almuerzo, ¿qué hago?",
+    "Can you tell me a joke about penguins?",
+]
+
+MODES = {
+    "off": None,
+    "sync": {"level": "DEBUG", "enqueue": False, "limited": False},
+    "enqueued": {"level": "DEBUG", "enqueue": True, "limited": False},
+    "enqueued_limited": {"level": "DEBUG", "enqueue": True, "limited": True},
+    "info": {"level": "INFO", "enqueue": True, "limited": True},
+}
+
+
+class SlowSink:
+    """A sink whose every write blocks for a while."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.records = 0
+
+    def write(self, message: str):
+        time.sleep(self.latency)
+        self.records += 1
+
+
+async def run_mode(bot, name: str, settings, args) -> dict:
+    import logging_setup
+    from loguru import logger
+
+    sink = SlowSink(args.sink_latency_ms / 1000)
+    if settings is None:
+        logger.remove()
+        logging_setup._min_level_no = 50
+    else:
+        logging_setup.configure(level=settings["level"], enqueue=settings["enqueue"], sink=sink, force=True)
+    for category in ("turn", "tts", "socket"):
+        hot = logging_setup.hot(category)
+        hot.rate_limit = logging_setup.RATE_LIMITS.get("*", 0.0) if settings and settings["limited"] else 0.0
+        hot._tokens = hot.rate_limit
+
+    turn_times = []
+    start_all = time.perf_counter()
+    for i in range(args.turns):
+        start = time.perf_counter()
+        await bot.generate_response(MESSAGES[i % len(MESSAGES)])
+        turn_times.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start_all
+    await logger.complete()
+    logger.remove()
+    return {
+        "turn_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(turn_times).items()},
+        "mean_turn_ms": elapsed / args.turns * 1000,
+        "records_per_turn": sink.records / args.turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead per turn")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--sink-latency-ms", type=float, default=0.2, help="Time each sink write blocks")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    port = free_port()
+    fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+                  "--chat-latency", "fixed:0", "--tts-latency", "fixed:0"], dict(os.environ), port)
+    os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1")
+    try:
+        from bot import DoctorSnowLeopardBot
+
+        async def run_all() -> dict:
+            bot = DoctorSnowLeopardBot()
+            # Warm the audio cache and connections so every mode sees the same turns
+            for message in MESSAGES:
+                await bot.generate_response(message)
+            results = {mode: await run_mode(bot, mode, MODES[mode], args) for mode in args.modes}
+            await bot.client.close()
+            return results
+
+        results = asyncio.run(run_all())
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    if "off" in results:
+        for result in results.values():
+            result["overhead_ms_per_turn"] = result["mean_turn_ms"] - results["off"]["mean_turn_ms"]
+    report = {
+        "name": "logging_bench",
+        "turns": args.turns,
+        "sink_latency_ms": args.sink_latency_ms,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
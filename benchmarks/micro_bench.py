@@ -0,0 +1,126 @@
+"""
+Micro-benchmarks for the per-turn CPU hot paths.
+
+Each benchmark runs one hot function over the bilingual corpus in isolation
+and reports nanoseconds per call (best of several repeats). The run fails
+when a function is slower than its stored baseline by more than the
+tolerance, so anyone changing these paths gets immediate numbers:
+
+    python -m benchmarks.micro_bench                   # compare against baselines.json
+    python -m benchmarks.micro_bench --update          # re-record baselines on this machine
+    python -m benchmarks.micro_bench --only analyze_emotion --tolerance 0.2
+
+Baselines are machine-specific; re-record them when the reference machine changes.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from loguru import logger  # noqa: E402
+
+from benchmarks.corpus import (  # noqa: E402
+    BOT_MESSAGES, BOT_MESSAGES_EN, BOT_MESSAGES_ES, CHILD_MESSAGES,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+
+def build_benchmarks() -> Dict[str, Tuple[Callable[[], None], int]]:
+    """Map benchmark name -> (callable processing the corpus once, calls per invocation)."""
+    from bot import DoctorSnowLeopardBot
+    from simple_app import detect_language
+    from translation import TranslationHandler
+
+    # Measure the functions themselves, not the stderr sink (see benchmarks/logging_bench.py for that)
+    logger.remove()
+    bot = DoctorSnowLeopardBot()
+    translator = TranslationHandler(client=None)
+
+    rng = random.Random(7)
+    # A typical ~3 second MP3 reply from tts-1-hd
+    audio = rng.randbytes(60_000)
+    audio_b64 = base64.b64encode(audio).decode("utf-8")
+    frame = {"text": BOT_MESSAGES_EN[1], "audio": audio_b64, "emotion": "caring"}
+
+    def over(items: List[str], fn: Callable[[str], object]) -> Tuple[Callable[[], None], int]:
+        def run():
+            for item in items:
+                fn(item)
+        return run, len(items)
+
+    return {
+        "clean_text_for_tts": over(BOT_MESSAGES_EN, bot.clean_text_for_tts),
+        "clean_spanish_text_for_tts": over(BOT_MESSAGES_ES, bot.clean_spanish_text_for_tts),
+        "analyze_emotion": over(BOT_MESSAGES, bot.analyze_emotion),
+        "match_response": over(CHILD_MESSAGES, bot.match_response),
+        "translation_quick_detect": over(CHILD_MESSAGES, translator.quick_detect),
+        "simple_app_detect_language": over(CHILD_MESSAGES, detect_language),
+        "base64_encode_audio": (lambda: base64.b64encode(audio).decode("utf-8"), 1),
+        "json_frame": (lambda: json.dumps(frame), 1),
+    }
+
+
+def measure(run: Callable[[], None], calls: int, min_time: float = 0.1, repeat: int = 9) -> float:
+    """Best-of-`repeat` nanoseconds per call, with the loop count auto-scaled to ~min_time."""
+    timer = timeit.Timer(run)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU hot-path micro-benchmarks")
+    parser.add_argument("--only", action="append", help="Run only these benchmarks")
+    parser.add_argument("--update", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.50, help="Allowed slowdown vs. baseline (0.50 = 50%%)")
+    parser.add_argument("--baselines", default=BASELINE_PATH)
+    parser.add_argument("--output", help="Write JSON results here")
+    args = parser.parse_args()
+
+    benchmarks = build_benchmarks()
+    names = args.only or sorted(benchmarks)
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f).get("ns_per_call", {})
+
+    results = {}
+    regressions = []
+    for name in names:
+        run, calls = benchmarks[name]
+        ns = measure(run, calls)
+        baseline = baselines.get(name)
+        ratio = ns / baseline if baseline else None
+        results[name] = {"ns_per_call": ns, "baseline_ns_per_call": baseline, "ratio": ratio}
+        status = ""
+        if ratio is not None and ratio > 1 + args.tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        ratio_text = f"{ratio:6.2f}x" if ratio is not None else "   new"
+        print(f"{name:<30} {ns:12.1f} ns/call  {ratio_text}  {status}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"name": "micro_bench", "results": results}, f, indent=2)
+
+    if args.update:
+        baselines.update({name: round(results[name]["ns_per_call"], 1) for name in names})
+        with open(args.baselines, "w") as f:
+            json.dump({"ns_per_call": dict(sorted(baselines.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"Baselines written to {args.baselines}")
+    elif regressions:
+        print(f"Regressed past {args.tolerance:.0%} tolerance: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
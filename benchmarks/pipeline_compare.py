@@ -0,0 +1,113 @@
+"""
+Side-by-side turn latency of the staged and fused (fused_turn.py) pipelines.
+
+Runs the same English and Spanish messages through bot.generate_response
+against benchmarks.fake_openai in each mode and reports, per mode and
+language, the turn latency, the time until the first reply text was
+available and the upstream chat calls per turn. TTS is off unless --tts is
+given, so the numbers isolate the text pipeline:
+
+    python -m benchmarks.pipeline_compare --turns 30 --chat-latency lognormal:0.6:0.4 --output pipelines.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+
+from benchmarks.load_test import free_port, percentiles, spawn
+
+MESSAGES = {
+    "en": "Why do I need to wear a cast on my arm for six whole weeks?",
+    "es": "Me duele la barriga desde el almuerzo y estoy un poco mareado, ¿qué hago?",
+}
+
+MODES = {
+    "staged": {"pipeline_mode": "staged", "fused_output_check": True},
+    "fused": {"pipeline_mode": "fused", "fused_output_check": True},
+    "fused_unchecked": {"pipeline_mode": "fused", "fused_output_check": False},
+}
+
+
+def upstream_calls(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.loads(response.read())
+
+
+async def run_mode(bot, settings: dict, language: str, base_url: str, args) -> dict:
+    bot.pipeline_mode = settings["pipeline_mode"]
+    bot.fused_output_check = settings["fused_output_check"]
+    turn_times, first_text_times = [], []
+    before = upstream_calls(base_url)
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        first_text = []
+
+        async def on_text(text: str):
+            if not first_text:
+                first_text.append(time.perf_counter() - start)
+
+        await bot.generate_response(MESSAGES[language], on_text=on_text)
+        elapsed = time.perf_counter() - start
+        turn_times.append(elapsed)
+        # Without streaming the text arrives with the full frame
+        first_text_times.append(first_text[0] if first_text else elapsed)
+    after = upstream_calls(base_url)
+    return {
+        "turn_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(turn_times).items()},
+        "first_text_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(first_text_times).items()},
+        "chat_calls_per_turn": (after["chat"] - before["chat"]) / args.turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Staged vs fused pipeline latency")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--chat-latency", default="lognormal:0.6:0.4")
+    parser.add_argument("--tts", action="store_true", help="Include speech synthesis in the turn")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+                  "--chat-latency", args.chat_latency], dict(os.environ), port)
+    os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"{base_url}/v1")
+    try:
+        from bot import DoctorSnowLeopardBot
+
+        async def run_all() -> dict:
+            bot = DoctorSnowLeopardBot()
+            bot.tts_enabled = args.tts
+            results = {}
+            for mode in args.modes:
+                results[mode] = {}
+                for language in MESSAGES:
+                    results[mode][language] = await run_mode(bot, MODES[mode], language, base_url, args)
+            await bot.client.close()
+            return results
+
+        results = asyncio.run(run_all())
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "name": "pipeline_compare",
+        "turns": args.turns,
+        "chat_latency": args.chat_latency,
+        "tts": args.tts,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
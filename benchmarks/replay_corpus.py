@@ -0,0 +1,83 @@
+"""
+Replay the conversation corpus through the bot pipeline against a cassette.
+
+Record once against a real (or fake) upstream, then replay the same corpus
+against new pipeline builds offline to compare per-turn latency and upstream
+call counts with real-shaped data:
+
+    python -m benchmarks.replay_corpus --mode record --cassette cassettes/corpus.cassette
+    python -m benchmarks.replay_corpus --mode replay --cassette cassettes/corpus.cassette --output build.json
+    python -m benchmarks.compare baseline.json build.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.corpus import CHILD_MESSAGES
+from benchmarks.load_test import percentiles
+
+
+async def replay(args) -> dict:
+    # The bot builds its OpenAI client from the environment at construction time
+    from bot import DoctorSnowLeopardBot
+    from metrics import UPSTREAM_CALLS
+
+    bot = DoctorSnowLeopardBot()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def turn(message: str):
+        async with semaphore:
+            start = time.perf_counter()
+            await bot.generate_response(message)
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    messages = CHILD_MESSAGES * args.repeat
+    await asyncio.gather(*(turn(message) for message in messages))
+    elapsed = time.perf_counter() - started
+
+    calls = {}
+    for (endpoint, model, outcome), count in UPSTREAM_CALLS.values.items():
+        calls[f"{endpoint}/{model}/{outcome}"] = count
+    transport = getattr(bot.client._client, "_transport", None)
+    return {
+        "name": "replay_corpus",
+        "mode": args.mode,
+        "turns": len(messages),
+        "elapsed_seconds": elapsed,
+        "turn_latency_seconds": percentiles(latencies),
+        "upstream_calls": calls,
+        "upstream_calls_per_turn": sum(calls.values()) / len(messages),
+        "cassette": getattr(transport, "stats", None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the conversation corpus against a cassette")
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--cassette", default=os.path.join("cassettes", "corpus.cassette"))
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Replay latency multiplier (0 = instant)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_CASSETTE_MODE"] = args.mode
+    os.environ["OPENAI_CASSETTE_PATH"] = args.cassette
+    os.environ["OPENAI_CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+    if args.mode == "replay":
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+    result = asyncio.run(replay(args))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
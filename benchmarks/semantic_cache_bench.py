@@ -0,0 +1,131 @@
+"""
+Hit rate and lookup latency of the semantic response cache (semantic_cache.py) as it grows.
+
+Seeds the cache with one phrasing per intent, pads it with generated
+long-tail questions up to each size, then asks the other phrasings of the
+seeded intents (should hit the right reply) and questions about intents
+that were never cached (should miss). Reports per size the correct-hit rate,
+wrong-hit rate, lookup latency and embedding memory:
+
+    python -m benchmarks.semantic_cache_bench --sizes 1000 10000 100000 --output semantic.json
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.load_test import percentiles
+from semantic_cache import SemanticCache
+
+# First phrasing is cached, the rest are asked
+INTENTS = {
+    "shot_hurt": ["will the shot hurt", "does the needle hurt", "is the shot gonna hurt?", "Will my shot hurt a lot?",
+                  "do shots hurt"],
+    "shot_why": ["why do I need a shot", "why do I have to get a shot?", "why do kids need shots",
+                 "what is the shot for"],
+    "cast_why": ["why do I need to wear a cast", "why do I have to wear a cast on my arm?",
+                 "why do I need this cast", "how come I have a cast"],
+    "medicine_taste": ["does the medicine taste bad", "will my medicine taste yucky?", "is the medicine gross",
+                       "do pills taste bad"],
+    "scared_doctor": ["I'm scared of the doctor", "I am afraid of doctors", "doctors make me nervous",
+                      "I feel scared of the doc"],
+    "tummy_hurt": ["my tummy hurts", "my stomach hurts", "my belly really hurts", "ouch my tummy"],
+    "fever_what": ["what is a fever", "what's a fever?", "what does fever mean", "what is fever"],
+    "sleep_why": ["why do I need to sleep", "why do we have to sleep?", "why do kids need sleep",
+                  "why is sleep important"],
+    "wash_hands": ["why should I wash my hands", "why do I have to wash my hands?", "why wash hands",
+                   "why do we wash our hands"],
+    "blood_test": ["what is a blood test", "what's a blood test?", "what happens in a blood test",
+                   "how does a blood test work"],
+    "xray": ["what is an x-ray", "what's an xray?", "how does an x ray work", "what does an x-ray do"],
+    "stethoscope": ["what is a stethoscope", "what's that thing around your neck", "what is the stethoscope for",
+                    "why do you have a stethoscope"],
+    "es_vacuna": ["¿me va a doler la vacuna?", "¿duele la inyección?", "¿la vacuna duele?", "¿me dolerá el pinchazo?"],
+    "es_barriga": ["me duele la barriga", "me duele la panza", "me duele el estómago", "me duele mucho la barriga"],
+}
+# Never cached: asking these should miss
+NOVEL = [
+    "can I have ice cream after", "what do snow leopards eat", "do you have a family", "how tall are you",
+    "why is the sky blue", "can I go home now", "what's your name", "do you like penguins",
+    "¿qué comen los leopardos?", "¿puedo ir a casa?",
+]
+
+FILLER_SUBJECTS = ["my", "my brother's", "the", "a", "our", "your", "grandma's", "the nurse's", "my friend's"]
+FILLER_NOUNS = ["knee", "elbow", "tooth", "ear", "nose", "foot", "hair", "eye", "finger", "toe", "back", "neck",
+                "skin", "throat", "heart", "bone", "cough", "sneeze", "rash", "bump", "scratch", "bruise"]
+FILLER_VERBS = ["itch", "feel funny", "turn red", "get bigger", "make noise", "feel cold", "get better", "swell",
+                "look weird", "feel hot", "tickle", "grow", "get sore", "feel wobbly"]
+FILLER_TAILS = ["at night", "after school", "when I run", "in the morning", "when I eat candy", "sometimes",
+                "on weekends", "when it rains", "after swimming", "when I'm tired", "", ""]
+FILLER_OPENERS = ["why does", "when will", "how come", "what if", "is it bad if", "can", "should"]
+
+
+def filler_question(rng: random.Random) -> str:
+    return " ".join(filter(None, [rng.choice(FILLER_OPENERS), rng.choice(FILLER_SUBJECTS), rng.choice(FILLER_NOUNS),
+                                  rng.choice(FILLER_VERBS), rng.choice(FILLER_TAILS), str(rng.randint(0, 999))]))
+
+
+def language_of(intent: str) -> str:
+    return "es" if intent.startswith("es_") else "en"
+
+
+def run(size: int, args) -> dict:
+    rng = random.Random(args.seed)
+    cache = SemanticCache(threshold=args.threshold, max_entries=size, dim=args.dim)
+    start = time.perf_counter()
+    for intent, phrasings in INTENTS.items():
+        cache.put(phrasings[0], language_of(intent), f"reply:{intent}", "caring")
+    while len(cache) < size:
+        cache.put(filler_question(rng), "en", "reply:filler", "neutral", dedupe=False)
+    fill_seconds = time.perf_counter() - start
+
+    correct = wrong = asked = 0
+    lookup_times = []
+    for _ in range(args.rounds):
+        for intent, phrasings in INTENTS.items():
+            for question in phrasings[1:]:
+                start = time.perf_counter()
+                hit = cache.get(question, language_of(intent))
+                lookup_times.append(time.perf_counter() - start)
+                asked += 1
+                if hit is not None:
+                    correct += hit.text == f"reply:{intent}"
+                    wrong += hit.text != f"reply:{intent}"
+    novel_hits = 0
+    for question in NOVEL:
+        language = "es" if question.startswith("¿") else "en"
+        start = time.perf_counter()
+        novel_hits += cache.get(question, language) is not None
+        lookup_times.append(time.perf_counter() - start)
+    return {
+        "entries": len(cache),
+        "fill_seconds": round(fill_seconds, 3),
+        "correct_hit_rate": correct / asked,
+        "wrong_hit_rate": wrong / asked,
+        "novel_hit_rate": novel_hits / len(NOVEL),
+        "lookup_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(lookup_times).items()},
+        "embedding_mb": sum(p.vectors.nbytes for p in cache.partitions.values()) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cache hit rate and latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--threshold", type=float, default=0.92)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--rounds", type=int, default=5, help="Times each phrasing is asked")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = [run(size, args) for size in args.sizes]
+    output = json.dumps({"name": "semantic_cache_bench", "threshold": args.threshold, "dim": args.dim,
+                         "results": results}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
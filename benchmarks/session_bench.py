@@ -0,0 +1,104 @@
+"""
+Per-turn latency added by each session-store backend (session_store.py).
+
+Simulates conversations the way the endpoints use the store: one batched load
+when a client (re)connects, then per turn an append to the history, an
+occasional language change and one batched save, with a think-time pause
+between turns. The networked backend runs against benchmarks.fake_kv,
+optionally with an emulated network delay:
+
+    python -m benchmarks.session_bench --sessions 200 --turns 10 --kv-latency-ms 0.5 --output sessions.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import session_store
+from benchmarks.load_test import free_port, percentiles, spawn
+
+
+async def run_backend(store: session_store.SessionStore, args) -> dict:
+    rng = random.Random(args.seed)
+    load_times, turn_times = [], []
+
+    async def conversation(index: int):
+        session_id = f"bench-{index}"
+        start = time.perf_counter()
+        session = session_store.Session(store, session_id)
+        await session.load()
+        load_times.append(time.perf_counter() - start)
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            session.append_history({"role": "user", "content": "x" * rng.randint(20, 120)})
+            session.append_history({"role": "assistant", "content": "y" * rng.randint(80, 300)})
+            if rng.random() < 0.1:
+                session.set("language", rng.choice(["en", "es"]))
+            await session.save()
+            turn_times.append(time.perf_counter() - start)
+            # The child reads and replies between turns
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    # Conversations run concurrently, as they would on one instance
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(index: int):
+        async with semaphore:
+            await conversation(index)
+
+    await asyncio.gather(*(limited(i) for i in range(args.sessions)))
+    await store.close()
+    return {
+        "load_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(load_times).items()},
+        "turn_save_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(turn_times).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session store per-turn latency benchmark")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--think-ms", type=float, default=50.0, help="Mean pause between a session's turns")
+    parser.add_argument("--kv-latency-ms", type=float, default=0.0, help="Emulated network delay for fake_kv")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = {}
+    results["memory"] = asyncio.run(run_backend(session_store.MemorySessionStore(), args))
+    with tempfile.TemporaryDirectory() as directory:
+        store = session_store.SQLiteSessionStore(os.path.join(directory, "sessions.db"))
+        results["sqlite"] = asyncio.run(run_backend(store, args))
+
+    port = free_port()
+    kv = spawn([sys.executable, "-m", "benchmarks.fake_kv", "--port", str(port),
+                "--latency-ms", str(args.kv_latency_ms)], dict(os.environ), port)
+    try:
+        store = session_store.RESPSessionStore("127.0.0.1", port)
+        results["resp"] = asyncio.run(run_backend(store, args))
+    finally:
+        kv.terminate()
+        kv.wait()
+
+    report = {
+        "name": "session_bench",
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "concurrency": args.concurrency,
+        "kv_latency_ms": args.kv_latency_ms,
+        "backends": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
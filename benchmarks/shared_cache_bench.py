@@ -0,0 +1,115 @@
+"""
+Compare per-process and shared (shared_cache.py) audio caches across workers.
+
+Each worker process replays a Zipf-distributed stream of TTS requests (a few
+popular phrases, a long tail of one-offs) against its cache, "synthesizing" a
+base64 clip on every miss. Reports the overall hit rate and memory per worker
+count. RSS counts shared pages once per process; PSS splits them between the
+processes mapping them, so it is the fairer total. Linux only:
+
+    python -m benchmarks.shared_cache_bench --workers 1 4 8 --requests 2000 --output shared_cache.json
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict
+
+from cache import LRUCache
+from shared_cache import SharedCache, SharedLRUCache
+
+
+def memory_kb() -> Dict[str, int]:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name.lower()] = int(rest.split()[0])
+    return values
+
+
+def zipf_phrases(rng: random.Random, phrases: int, count: int, skew: float):
+    weights = [1 / (rank + 1) ** skew for rank in range(phrases)]
+    return rng.choices(range(phrases), weights=weights, k=count)
+
+
+def worker(args: tuple) -> dict:
+    mode, path, capacity, seed, requests, phrases, skew, clip_bytes, max_entries, start_at = args
+    rng = random.Random(seed)
+    cache = (SharedLRUCache("audio", SharedCache(path, capacity)) if mode == "shared"
+             else LRUCache("audio", max_entries=max_entries))
+    baseline = memory_kb()
+    # Start together so the workers really race each other for the same phrases
+    time.sleep(max(0.0, start_at - time.time()))
+    lookup_seconds = 0.0
+    for phrase in zipf_phrases(rng, phrases, requests, skew):
+        key = ("tts-1-hd", "shimmer", 0.9, "mp3", f"phrase {phrase}")
+        start = time.perf_counter()
+        audio = cache.get(key)
+        lookup_seconds += time.perf_counter() - start
+        if audio is None:
+            audio = base64.b64encode(random.Random(phrase).randbytes(clip_bytes)).decode()
+            cache.put(key, audio)
+    after = memory_kb()
+    return {
+        "hits": cache.hits,
+        "misses": cache.misses,
+        "lookup_us": lookup_seconds / requests * 1e6,
+        "rss_growth_kb": after["rss"] - baseline["rss"],
+        "pss_growth_kb": after["pss"] - baseline["pss"],
+    }
+
+
+def run(mode: str, workers: int, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="shared-cache-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        path = os.path.join(directory, "audio.cache")
+        start_at = time.time() + 1.0
+        jobs = [(mode, path, args.capacity_mb * 1024 * 1024, args.seed + i, args.requests, args.phrases,
+                 args.skew, args.clip_kb * 1024, args.max_entries, start_at) for i in range(workers)]
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            results = pool.map(worker, jobs)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    hits = sum(r["hits"] for r in results)
+    total = hits + sum(r["misses"] for r in results)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "hit_rate": hits / total,
+        "synthesized": total - hits,
+        "lookup_us_mean": sum(r["lookup_us"] for r in results) / workers,
+        "rss_growth_mb_total": sum(r["rss_growth_kb"] for r in results) / 1024,
+        "pss_growth_mb_total": sum(r["pss_growth_kb"] for r in results) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-process vs shared audio cache benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per worker")
+    parser.add_argument("--phrases", type=int, default=1500)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--clip-kb", type=int, default=40)
+    parser.add_argument("--max-entries", type=int, default=256, help="Per-process cache size (AUDIO_CACHE_SIZE)")
+    parser.add_argument("--capacity-mb", type=int, default=64, help="Shared cache size (SHARED_CACHE_BYTES)")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = [run(mode, workers, args) for workers in args.workers for mode in ("process", "shared")]
+    output = json.dumps({"name": "shared_cache_bench", "results": results}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Storytelling benchmark: the wait between story segments, with and without prefetch.
+
+Each session on simple_app's /chat socket asks for a story, then keeps asking
+"what happens next?" after --think seconds of listening, until the story
+ends; with --steer-every N, every Nth request steers the story instead (the
+prefetched segment is discarded). The app runs once with prefetch disabled
+(STORY_PREFETCH_MAX=0, "cold") and once with it ("prefetch"). Reports, per
+mode, the time from asking for a segment to receiving it (the first segment
+excluded) and the upstream requests per session (from benchmarks.fake_openai
+/stats), which is what prefetching spends:
+
+    python -m benchmarks.story_bench --sessions 10 --think 2 --output story.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.barge_in_bench import receive_answer
+from benchmarks.load_test import free_port, percentiles, spawn
+
+MODES = {"cold": "0", "prefetch": "16"}
+
+
+async def run_session(session: aiohttp.ClientSession, url: str, args) -> list:
+    gaps = []
+    async with session.ws_connect(url) as ws:
+        await receive_answer(ws, args.turn_timeout)
+        await ws.send_str("Can you tell me a bedtime story about a polar bear?")
+        frame = await receive_answer(ws, args.turn_timeout)
+        request = 1
+        while frame.get("story") and not frame["story"]["last"]:
+            await asyncio.sleep(args.think)
+            request += 1
+            steer = args.steer_every and request % args.steer_every == 0
+            sent_at = time.perf_counter()
+            await ws.send_str("Can the bear find a friend?" if steer else "What happens next?")
+            frame = await receive_answer(ws, args.turn_timeout)
+            gaps.append(time.perf_counter() - sent_at)
+    return gaps
+
+
+async def run_mode(base_url: str, fake_url: str, args) -> dict:
+    url = base_url.replace("http", "ws", 1) + "/chat"
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{fake_url}/stats") as resp:
+            before = await resp.json()
+        results = await asyncio.gather(*(run_session(session, url, args) for _ in range(args.sessions)))
+        async with session.get(f"{fake_url}/stats") as resp:
+            after = await resp.json()
+    gaps = [gap for gaps in results for gap in gaps]
+    return {
+        "segment_gap_ms": {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(gaps).items()},
+        "upstream_requests_per_session": {key: (after[key] - before[key]) / args.sessions for key in ("chat", "tts")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Story mode: wait between segments with and without prefetch")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--think", type=float, default=2.0, help="Seconds the child listens before asking for more")
+    parser.add_argument("--steer-every", type=int, default=0, help="Steer the story on every Nth request (0: never)")
+    parser.add_argument("--chat-latency", default="fixed:0.8")
+    parser.add_argument("--tts-latency", default="fixed:0.4")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    fake_port = free_port()
+    fake = spawn([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port),
+                  "--chat-latency", args.chat_latency, "--tts-latency", args.tts_latency],
+                 dict(os.environ), fake_port)
+    results = {}
+    try:
+        for mode, prefetch_max in MODES.items():
+            port = free_port()
+            # No audio cache: every segment is new speech
+            env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+                       STORY_PREFETCH_MAX=prefetch_max, AUDIO_CACHE_SIZE="0", LOG_LEVEL="WARNING")
+            app = spawn([sys.executable, "-m", "uvicorn", "simple_app:app", "--port", str(port),
+                         "--log-level", "warning"], env, port)
+            try:
+                results[mode] = asyncio.run(run_mode(f"http://127.0.0.1:{port}",
+                                                     f"http://127.0.0.1:{fake_port}", args))
+            finally:
+                app.terminate()
+                app.wait()
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "name": "story_bench",
+        "sessions": args.sessions,
+        "think": args.think,
+        "steer_every": args.steer_every,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
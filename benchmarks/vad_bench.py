@@ -0,0 +1,110 @@
+"""
+Benchmark the VAD / silence-trimming stage (vad.py) on synthetic recordings.
+
+Each recording is a child-like utterance: voiced bursts (a pitched harmonic
+tone with syllable-rate amplitude modulation), short fricative hiss, long
+pauses and leading/trailing silence over a low noise floor. Reports processing
+speed (x realtime), bytes and seconds saved, and the fraction of true speech
+frames the detector kept:
+
+    python -m benchmarks.vad_bench --recordings 50 --output vad.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+import vad
+from benchmarks.load_test import percentiles
+
+
+def synth_recording(rng: random.Random, sample_rate: int, channels: int) -> Tuple[bytes, np.ndarray]:
+    """A 16-bit WAV utterance plus a per-sample mask of where the speech really is."""
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    pieces: List[np.ndarray] = []
+    labels: List[np.ndarray] = []
+
+    def add(samples: np.ndarray, is_speech: bool):
+        pieces.append(samples.astype(np.float32))
+        labels.append(np.full(len(samples), is_speech))
+
+    def silence(seconds: float):
+        add(np_rng.normal(0, 10 ** (-60 / 20), int(seconds * sample_rate)), False)
+
+    silence(rng.uniform(0.5, 2.0))
+    for word in range(rng.randint(3, 8)):
+        seconds = rng.uniform(0.25, 0.7)
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        pitch = rng.uniform(220, 350)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = 0.5 * (1 - np.cos(2 * np.pi * 4 * t)) * rng.uniform(0.1, 0.4)
+        add(voiced * envelope, True)
+        if rng.random() < 0.4:
+            add(np_rng.normal(0, 0.02, int(rng.uniform(0.08, 0.2) * sample_rate)), True)
+        # Children pause a lot mid-sentence
+        silence(rng.uniform(0.1, 1.5) if rng.random() < 0.5 else rng.uniform(0.05, 0.2))
+    silence(rng.uniform(0.5, 3.0))
+
+    mono = np.concatenate(pieces)
+    samples = np.repeat(mono[:, None], channels, axis=1)
+    return vad.encode_wav(samples, sample_rate), np.concatenate(labels)
+
+
+def speech_recall(wav: bytes, truth: np.ndarray) -> float:
+    """Fraction of truly voiced frames the detector keeps."""
+    samples, rate = vad.decode(wav)
+    mono = vad.to_mono_16k(samples, rate)[:, 0]
+    mask, frame_len = vad.speech_mask(mono, vad.TARGET_RATE)
+    # Ground truth at 16 kHz frame resolution: a frame is speech if most of it is
+    positions = (np.arange(len(mask) * frame_len) * rate / vad.TARGET_RATE).astype(np.int64)
+    frame_truth = truth[np.minimum(positions, len(truth) - 1)].reshape(len(mask), frame_len).mean(axis=1) > 0.5
+    return float(mask[frame_truth].mean()) if frame_truth.any() else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VAD silence-trimming benchmark")
+    parser.add_argument("--recordings", type=int, default=50)
+    parser.add_argument("--sample-rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    recordings = [synth_recording(rng, args.sample_rate, args.channels) for _ in range(args.recordings)]
+
+    times, speed, recall = [], [], []
+    totals = {"bytes_in": 0, "bytes_out": 0, "seconds_in": 0.0, "seconds_out": 0.0}
+    for wav, truth in recordings:
+        start = time.perf_counter()
+        result = vad.process(wav)
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        speed.append(result.seconds_in / elapsed)
+        recall.append(speech_recall(wav, truth))
+        for key in totals:
+            totals[key] += getattr(result, key)
+
+    report = {
+        "name": "vad_bench",
+        "recordings": args.recordings,
+        "input_format": f"{args.sample_rate} Hz x {args.channels} ch 16-bit WAV",
+        "process_seconds": percentiles(times),
+        "realtime_factor": percentiles(speed),
+        "bytes_saved_ratio": 1 - totals["bytes_out"] / totals["bytes_in"],
+        "seconds_saved_ratio": 1 - totals["seconds_out"] / totals["seconds_in"],
+        "speech_recall": percentiles(recall),
+        **totals,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrent-viewer benchmark for simple_app.py's /video endpoint.
+
+Spawns simple_app under uvicorn, writes a synthetic video into
+static/assets/videos, and has N concurrent viewers fetch it the way browsers
+do (an initial open-ended range, then sequential chunked ranges, plus
+revalidation requests). Reports throughput and server CPU seconds per GB
+served (from /proc, so Linux only):
+
+    python -m benchmarks.video_bench --viewers 50 --size-mb 8 --output video.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+import aiohttp
+
+from benchmarks.load_test import REPO_ROOT, free_port, percentiles, spawn
+
+VIDEO_NAME = "_bench_video.mp4"
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def viewer(http: aiohttp.ClientSession, url: str, size: int, chunk: int, stats: dict):
+    start = time.perf_counter()
+    etag = None
+    offset = 0
+    try:
+        while offset < size:
+            end = min(offset + chunk, size) - 1
+            async with http.get(url, headers={"Range": f"bytes={offset}-{end}"}) as resp:
+                body = await resp.read()
+                if resp.status != 206:
+                    raise RuntimeError(f"unexpected status {resp.status}")
+                etag = resp.headers.get("ETag")
+            stats["bytes"] += len(body)
+            offset += len(body)
+        async with http.get(url, headers={"If-None-Match": etag or ""}) as resp:
+            await resp.read()
+            stats["revalidated"] += resp.status == 304
+        stats["view_seconds"].append(time.perf_counter() - start)
+    except Exception:
+        stats["errors"] += 1
+
+
+async def run(base_url: str, args, pid: Optional[int]) -> dict:
+    size = args.size_mb * 1024 * 1024
+    url = f"{base_url}/video/{VIDEO_NAME}"
+    stats = {"bytes": 0, "errors": 0, "revalidated": 0, "view_seconds": []}
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        # Warm the ETag cache so the first viewer doesn't pay for hashing
+        async with http.head(url) as resp:
+            resp.raise_for_status()
+        cpu_before = process_cpu_seconds(pid) if pid else None
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            viewer(http, url, size, args.chunk_kb * 1024, stats) for _ in range(args.viewers)
+        ))
+        elapsed = time.perf_counter() - started
+        cpu_after = process_cpu_seconds(pid) if pid else None
+
+    gigabytes = stats["bytes"] / 1e9
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "name": "video_bench",
+        "viewers": args.viewers,
+        "video_bytes": size,
+        "errors": stats["errors"],
+        "revalidated_304": stats["revalidated"],
+        "elapsed_seconds": elapsed,
+        "served_bytes": stats["bytes"],
+        "throughput_mb_per_second": stats["bytes"] / 1e6 / elapsed if elapsed else 0.0,
+        "server_cpu_seconds": cpu,
+        "server_cpu_seconds_per_gb": cpu / gigabytes if cpu is not None and gigabytes else None,
+        "view_seconds": percentiles(stats["view_seconds"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video endpoint throughput benchmark")
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="Bytes per range request, like a browser's buffer")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    video_path = os.path.join(REPO_ROOT, "static", "assets", "videos", VIDEO_NAME)
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    with open(video_path, "wb") as f:
+        f.write(os.urandom(args.size_mb * 1024 * 1024))
+
+    app = None
+    try:
+        port = free_port()
+        env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "bench"))
+        app = spawn([sys.executable, "-m", "uvicorn", "simple_app:app", "--port", str(port),
+                     "--log-level", "warning"], env, port)
+        result = asyncio.run(run(f"http://127.0.0.1:{port}", args, app.pid))
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        os.remove(video_path)
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
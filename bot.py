@@ -1,5 +1,4 @@
 import os
-import sys
 import base64
 import re
 import json
@@ -8,14 +7,47 @@ from loguru import logger
 from fastapi import WebSocket
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
-from guardrails import DrSnowPawsGuardrails
+from guardrails import DrSnowPawsGuardrails, GuardrailUnavailable, UNSAFE_RESPONSE
+from model_router import router
+from semantic_cache import SEMANTIC_CACHE_ENABLED, SemanticCache
+from fused_turn import FUSED_MODEL, FUSED_OUTPUT_CHECK, PIPELINE_MODE, FusedTurnError, fused_turn, wants_text_stream
 from translation import TranslationHandler
+from circuit_breaker import get_breaker, CircuitOpenError
+from cache import LRUCache
+from shared_cache import cache_for
+from session_store import Session, open_session, session_id_from
+from audio_formats import DEFAULT_FORMAT, hello_ack, negotiate, parse_hello, record_clip, tag_format
+from cassette import build_http_client
+import startup_snapshot
+import faq_pack
+import lipsync
+import logging_setup
+from tracing import bind_session, span, start_trace
+from degradation import controller as degradation, parse_speak
+from barge_in import Turn, TurnScheduler, handle_control, parse_message
+from ack_clips import AckClips, observe_answer_audio, wants_ack
+from metrics import start_loop_lag_monitor, ACTIVE_CONNECTIONS, TURN_TTFB_SECONDS, TURN_SECONDS
+import time
 import random
 import asyncio
+import uuid
+from typing import Awaitable, Callable, Optional
 
 load_dotenv(override=True)
-logger.remove(0)
-logger.add(sys.stderr, level="DEBUG")
+logging_setup.configure()
+turn_log = logging_setup.hot("turn")
+tts_log = logging_setup.hot("tts")
+socket_log = logging_setup.hot("socket")
+
+TTS_MODEL = "tts-1-hd"
+
+FALLBACK_RESPONSE = "*adjusts glasses* Oh my! I got a little tangled in my medical notes. Could you please repeat that? 🐾"
+
+TECHNICAL_DIFFICULTIES = {
+    "text": "*looks concerned* I'm having some technical difficulties. Could we try again? 🐾",
+    "audio": None,
+    "emotion": "caring"
+}
 
 class DoctorSnowLeopardBot:
     def __init__(self):
@@ -25,11 +57,32 @@ class DoctorSnowLeopardBot:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OpenAI API key not found in environment variables")
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Retries and timeouts are owned by the per-endpoint circuit breakers
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0, http_client=build_http_client())
+        self.chat_breaker = get_breaker("chat")
+        self.tts_breaker = get_breaker("tts")
+        # Shared by all workers when SHARED_CACHE_PATH is set
+        self.audio_cache = cache_for("audio", max_entries=int(os.getenv("AUDIO_CACHE_SIZE", "256")))
+        # Mouth tracks of PCM/WAV clips (lipsync.py), kept next to the audio they belong to
+        self.lipsync_cache = cache_for("lipsync", max_entries=int(os.getenv("AUDIO_CACHE_SIZE", "256")))
+        # Speech for text-first responses, synthesized if the child taps to hear it
+        self.deferred_speech = LRUCache("deferred_speech", max_entries=1024)
+        # Approved replies for rephrased questions (semantic_cache.py)
+        self.semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+        # Greeting audio synthesized ahead of time (see startup_snapshot.py)
+        for key, audio in startup_snapshot.cached_audio():
+            self.audio_cache.put(key, audio)
+        # Pre-rendered FAQ replies and speech, memory-mapped (see build_faq_pack.py)
+        self.faq_pack = faq_pack.load()
         self.guardrails = DrSnowPawsGuardrails(self.client)
         self.translator = TranslationHandler(self.client)
         self.tts_voice = os.getenv("TTS_VOICE", "shimmer")
         self.tts_enabled = True
+        # Short clips played while the answer is being made (ack_clips.py)
+        self.ack_clips = AckClips(self)
+        # "staged" (one call per step) or "fused" (fused_turn.py)
+        self.pipeline_mode = PIPELINE_MODE
+        self.fused_output_check = FUSED_OUTPUT_CHECK
         self.greetings = [
             "*adjusts stethoscope* Hi there, little friend! I'm Doctor Snow Paws! My fluffy paws are ready to help you feel better today! 🩺",
             "*looks up with a warm smile* Hello there! I'm Doctor Snow Paws! I love meeting brave kids like you! What brings you in today? 🐆",
@@ -53,145 +106,410 @@ class DoctorSnowLeopardBot:
             "family": "*purrs softly* My family is a big group of snow leopards who live in the mountains! My mom taught me how to be a good doctor. Do you want to tell me about your family? 👨‍👧‍👦"
         }
 
-    async def generate_response(self, message: str) -> dict:
+    async def generate_response(self, message: str, audio_format: str = DEFAULT_FORMAT,
+                                session: Optional[Session] = None,
+                                on_text: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        """
+        Answer one message. `on_text` receives reply text as it is generated,
+        when the fused pipeline runs without an output check.
+        """
+        with start_trace("generate_response") as turn:
+            return await self._generate_response(message, turn, audio_format, session, on_text)
+
+    async def _generate_response(self, message: str, turn, audio_format: str = DEFAULT_FORMAT,
+                                 session: Optional[Session] = None,
+                                 on_text: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
         try:
-            logger.debug(f"Processing message: {message}")
+            turn_log.debug("Processing message: {}", message)
             
-            is_safe, safe_message = await self.guardrails.check_input(message)
+            if self.faq_pack is not None:
+                response_data = await self._pack_response(message, turn, audio_format, session)
+                if response_data is not None:
+                    return response_data
+            
+            if self.semantic_cache is not None:
+                response_data = await self._semantic_response(message, turn, audio_format, session)
+                if response_data is not None:
+                    return response_data
+            
+            if self.pipeline_mode == "fused" and self._fused_eligible(message):
+                response_data = await self._fused_response(message, turn, audio_format, session, on_text)
+                if response_data is not None:
+                    return response_data
+            
+            # Under heavy load the message is understood (and matched against the
+            # response bank) while the input check runs, not after it. Bank replies
+            # are fixed text with no output check, so a bank match is then answered
+            # in a single guardrail round-trip. The input check itself always runs.
+            understanding = None
+            if degradation.active("bank_skip_checks"):
+                understanding = asyncio.ensure_future(self._understand(message, session))
+            
+            # While the guardrail is unavailable nothing free-form is generated:
+            # only the fixed response bank (or the canned fallback) is served.
+            bank_only = False
+            try:
+                with span("guardrail_in"):
+                    is_safe, safe_message = await self.guardrails.check_input(message)
+            except GuardrailUnavailable:
+                logger.warning("Input guardrail unavailable, serving response bank only")
+                is_safe, bank_only = True, True
             if not is_safe:
-                logger.debug("Message failed safety check")
+                if understanding is not None:
+                    understanding.cancel()
+                turn_log.debug("Message failed safety check")
+                turn.set(source="unsafe")
                 return {"text": safe_message, "audio": None, "emotion": "caring"}
             
-            # Use the translation handler for proper language detection and processing
-            try:
-                english_text, detected_lang, original_text = await self.translator.process_message(message)
-                logger.debug(f"Translation result - English: '{english_text}', Detected lang: '{detected_lang}', Original: '{original_text}'")
-            except Exception as e:
-                logger.error(f"Translation error: {e}")
-                # Fallback to simple detection
-                detected_lang = "es" if any(word in message.lower() for word in ["hola", "gracias", "por favor", "cómo", "qué", "dónde", "cuándo", "por qué"]) else "en"
-                english_text = message
-                original_text = message
-                logger.debug(f"Using fallback detection - Lang: '{detected_lang}'")
+            if understanding is not None:
+                english_text, detected_lang = await understanding
+            else:
+                english_text, detected_lang = await self._understand(message, session)
+            bank_key = self.match_key(english_text)
+            response_text = self.responses.get(bank_key)
             
-            message_lower = english_text.lower()  # Use English version for keyword matching
-            response_text = None
+            turn.set(language=detected_lang, bank_only=bank_only)
+            turn.set(source="bank" if response_text else "completion")
             
-            # Check predefined responses using English version
-            for key, response in self.responses.items():
-                if key in message_lower:
-                    response_text = response
-                    logger.debug(f"Found predefined response for key: {key}")
-                    break
+            if response_text is None and (bank_only or self.chat_breaker.is_open):
+                turn_log.debug("Upstream unavailable, serving canned fallback")
+                response_text = FALLBACK_RESPONSE
+                turn.set(source="fallback")
             
+            # Only replies that passed the output check are reused for similar questions
+            approved = False
             if response_text is None:
                 try:
                     system_prompt = self.get_system_prompt()
-                    completion = await self.client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": english_text}  # Use English for processing
-                        ],
-                        max_tokens=150,
-                        temperature=0.8
-                    )
+                    route = router.route(english_text, "chat", default="gpt-4o")
+                    with span("completion", model=route.model, tier=route.tier):
+                        completion = await self.chat_breaker.call(router.tracked(route, lambda: self.client.chat.completions.create(
+                            model=route.model,
+                            messages=[
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": english_text}  # Use English for processing
+                            ],
+                            max_tokens=150,
+                            temperature=0.8
+                        )), model=route.model)
                     response_text = completion.choices[0].message.content
-                    response_text = await self.guardrails.check_output(response_text, english_text)
-                    logger.debug(f"Generated response: {response_text}")
+                    with span("guardrail_out"):
+                        response_text = await self.guardrails.check_output(response_text, english_text)
+                    approved = True
+                    turn_log.debug("Generated response: {}", response_text)
                     
+                except GuardrailUnavailable:
+                    logger.warning("Output guardrail unavailable, discarding unchecked response")
+                    response_text = FALLBACK_RESPONSE
                 except Exception as e:
                     logger.error(f"Error using OpenAI: {e}")
-                    response_text = "*adjusts glasses* Oh my! I got a little tangled in my medical notes. Could you please repeat that? 🐾"
+                    response_text = FALLBACK_RESPONSE
             
-            # Translate response to target language if needed
-            if detected_lang != "en":
+            # Bank replies come pre-translated in the FAQ pack
+            packed = None
+            if self.faq_pack is not None and bank_key is not None and detected_lang != "en":
+                packed = self.faq_pack.bank_reply(bank_key, detected_lang)
+            if packed is not None:
+                response_text = packed.text
+            # Translate response to target language if needed (never while the
+            # guardrail is down: a translated reply is no longer a bank reply)
+            elif detected_lang != "en" and not bank_only:
                 try:
-                    response_text = await self.translator.translate_response(response_text, detected_lang)
-                    logger.debug(f"Translated response: {response_text}")
+                    with span("translate_out"):
+                        response_text = await self.translator.translate_response(response_text, detected_lang)
+                    turn_log.debug("Translated response: {}", response_text)
                 except Exception as e:
                     logger.error(f"Translation error for response: {e}")
+                    approved = False
                     # Keep English version if translation fails
             
-            # Use language-appropriate text cleaning for TTS
-            try:
-                if detected_lang == "es":
-                    speech_text = self.clean_spanish_text_for_tts(response_text)
-                    logger.debug(f"Spanish TTS text: '{speech_text}'")
-                else:
-                    speech_text = self.clean_text_for_tts(response_text)
-                    logger.debug(f"English TTS text: '{speech_text}'")
-            except Exception as e:
-                logger.error(f"Text cleaning error: {e}")
-                speech_text = response_text  # Fallback to original
-            
-            # Generate audio
-            audio = None
-            if self.tts_enabled and speech_text:
-                try:
-                    logger.debug(f"Generating TTS for language '{detected_lang}' with text: '{speech_text}'")
-                    audio = await self.generate_speech(speech_text, detected_lang)
-                    if audio:
-                        logger.debug("TTS generation successful")
-                    else:
-                        logger.warning("TTS generation returned None")
-                except Exception as e:
-                    logger.error(f"TTS generation error: {e}")
-                    audio = None
-            
-            emotion = self.analyze_emotion(response_text)
-            logger.debug(f"Detected emotion: {emotion}")
-            
-            return {
-                "text": response_text,
-                "audio": audio,
-                "emotion": emotion
-            }
+            response_data = await self._finish(response_text, detected_lang, audio_format)
+            if approved and self.semantic_cache is not None:
+                self.semantic_cache.put(message, detected_lang, response_data["text"], response_data["emotion"])
+            return response_data
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return {
-                "text": "*adjusts glasses* Oh my! I got a little tangled in my medical notes. Could you please repeat that? 🐾",
+                "text": FALLBACK_RESPONSE,
                 "audio": None,
                 "emotion": "caring"
             }
 
-    async def generate_speech(self, text, language="en"):
+    async def _finish(self, response_text: str, detected_lang: str, audio_format: str,
+                      emotion: Optional[str] = None) -> dict:
+        """Speech and emotion for the final reply text."""
+        # Use language-appropriate text cleaning for TTS
+        try:
+            if detected_lang == "es":
+                speech_text = self.clean_spanish_text_for_tts(response_text)
+                tts_log.debug("Spanish TTS text: '{}'", speech_text)
+            else:
+                speech_text = self.clean_text_for_tts(response_text)
+                tts_log.debug("English TTS text: '{}'", speech_text)
+        except Exception as e:
+            logger.error(f"Text cleaning error: {e}")
+            speech_text = response_text  # Fallback to original
+        
+        # Generate audio (or, when degraded to text-first, only on request)
+        audio = None
+        speech_id = None
+        if self.tts_enabled and speech_text and degradation.active("text_first"):
+            speech_id = uuid.uuid4().hex[:12]
+            self.deferred_speech.put(speech_id, (speech_text, detected_lang))
+        elif self.tts_enabled and speech_text:
+            try:
+                tts_log.debug("Generating TTS for language '{}' with text: '{}'", detected_lang, speech_text)
+                with span("tts", format=audio_format):
+                    audio = await self.generate_speech(speech_text, detected_lang, audio_format)
+                if audio:
+                    tts_log.debug("TTS generation successful")
+                else:
+                    logger.warning("TTS generation returned None")
+            except Exception as e:
+                logger.error(f"TTS generation error: {e}")
+                audio = None
+        
+        emotion = emotion or self.analyze_emotion(response_text)
+        turn_log.debug("Detected emotion: {}", emotion)
+        
+        response_data = tag_format({
+            "text": response_text,
+            "audio": audio,
+            "emotion": emotion
+        }, audio_format)
+        if speech_id:
+            response_data["speech_id"] = speech_id
+        track = await self.lip_sync(speech_text, detected_lang, audio_format, audio)
+        if track is not None:
+            response_data["lipsync"] = track
+        return response_data
+
+    def _fused_eligible(self, message: str) -> bool:
+        """English response bank matches are served by the staged pipeline, which needs no generation."""
+        if self.translator.quick_detect(message) == "en" and self.match_response(message):
+            return False
+        return not get_breaker("fused").is_open
+
+    async def _fused_response(self, message: str, turn, audio_format: str, session: Optional[Session],
+                              on_text: Optional[Callable[[str], Awaitable[None]]]) -> Optional[dict]:
+        """One-call turn (fused_turn.py); None if the staged pipeline has to answer instead."""
+        previous_language = session.get("language", "en") if session else "en"
+        try:
+            with span("completion", model=FUSED_MODEL, fused=True):
+                # Unchecked text is only streamed to the client when no output check follows
+                result = await fused_turn(self.client, message, self.get_system_prompt(), previous_language,
+                                          None if self.fused_output_check else on_text)
+        except FusedTurnError as e:
+            logger.warning(f"Fused turn failed, using the staged pipeline: {e}")
+            return None
+        if session and result.language != previous_language:
+            session.set("language", result.language)
+        turn.set(language=result.language, bank_only=False, source="fused")
+        if not result.safe:
+            turn_log.debug("Message failed safety check")
+            turn.set(source="unsafe")
+            return {"text": UNSAFE_RESPONSE, "audio": None, "emotion": "caring"}
+        
+        response_text = result.reply
+        approved = False
+        if self.fused_output_check:
+            try:
+                with span("guardrail_out"):
+                    response_text = await self.guardrails.check_output(result.reply, message)
+                approved = True
+            except GuardrailUnavailable:
+                logger.warning("Output guardrail unavailable, discarding unchecked response")
+                response_text = FALLBACK_RESPONSE
+        turn_log.debug("Generated fused response: {}", response_text)
+        # A rewritten reply gets its emotion from the new text
+        emotion = result.emotion if response_text == result.reply else None
+        response_data = await self._finish(response_text, result.language, audio_format, emotion)
+        if approved and self.semantic_cache is not None:
+            self.semantic_cache.put(message, result.language, response_data["text"], response_data["emotion"])
+        return response_data
+
+    async def _semantic_response(self, message: str, turn, audio_format: str,
+                                 session: Optional[Session]) -> Optional[dict]:
+        """
+        The approved reply to a rephrasing of an earlier question, or None on a miss.
+        Unlike bank replies, cached replies are generated text: they are only
+        served after an input check, never while checks are skipped or the
+        guardrail is unavailable.
+        """
+        if degradation.active("bank_skip_checks"):
+            return None
+        language = self.translator.quick_detect(message) or (session.get("language", "en") if session else "en")
+        cached = self.semantic_cache.get(message, language)
+        if cached is None:
+            return None
+        try:
+            rejected = await self._check_approved_input(message, turn)
+        except GuardrailUnavailable:
+            logger.warning("Input guardrail unavailable, not serving a semantic cache hit")
+            return None
+        if rejected is not None:
+            return rejected
+        if session and session.get("language", "en") != language:
+            session.set("language", language)
+        turn_log.debug("Semantic cache hit ({:.3f}) for: {}", cached.similarity, cached.question)
+        turn.set(language=language, source="semantic_cache", similarity=round(cached.similarity, 3))
+        return await self._finish(cached.text, language, audio_format, cached.emotion)
+
+    async def _pack_response(self, message: str, turn, audio_format: str,
+                             session: Optional[Session]) -> Optional[dict]:
+        """The FAQ pack reply for a curated question (faq_pack.py), or None if it is not one."""
+        language = self.translator.quick_detect(message) or (session.get("language", "en") if session else "en")
+        match = self.faq_pack.match(message, language)
+        if match is None:
+            return None
+        # A curated question itself passed the input check when the pack was built; a rephrasing has not
+        if not match.exact:
+            try:
+                rejected = await self._check_approved_input(message, turn)
+            except GuardrailUnavailable:
+                logger.warning("Input guardrail unavailable, not serving a FAQ pack rephrasing")
+                return None
+            if rejected is not None:
+                return rejected
+        if session and session.get("language", "en") != language:
+            session.set("language", language)
+        turn_log.debug("FAQ pack hit ({:.3f}) for: {}", match.similarity, match.question)
+        turn.set(language=language, source="faq_pack", exact=match.exact, similarity=round(match.similarity, 3))
+        return await self._finish(match.text, language, audio_format, match.emotion)
+
+    async def _check_approved_input(self, message: str, turn) -> Optional[dict]:
+        """
+        Input check before serving approved text for a message that was not
+        itself approved (a rephrasing): the unsafe frame, or None to serve it.
+        The check always runs, under load too; GuardrailUnavailable propagates
+        and the caller must not serve the text.
+        """
+        with span("guardrail_in"):
+            is_safe, safe_message = await self.guardrails.check_input(message)
+        if is_safe:
+            return None
+        turn_log.debug("Message failed safety check")
+        turn.set(source="unsafe")
+        return {"text": safe_message, "audio": None, "emotion": "caring"}
+
+    async def _understand(self, message: str, session: Optional[Session] = None):
+        """Detect the language and get an English version of the message."""
+        try:
+            english_text, detected_lang, original_text = await self.translator.process_message(
+                message, session=session
+            )
+            turn_log.debug("Translation result - English: '{}', Detected lang: '{}', Original: '{}'",
+                           english_text, detected_lang, original_text)
+        except Exception as e:
+            logger.error(f"Translation error: {e}")
+            # Fallback to simple detection
+            detected_lang = "es" if any(word in message.lower() for word in ["hola", "gracias", "por favor", "cómo", "qué", "dónde", "cuándo", "por qué"]) else "en"
+            english_text = message
+            turn_log.debug("Using fallback detection - Lang: '{}'", detected_lang)
+        return english_text, detected_lang
+
+    async def speak(self, speech_id: str, audio_format: str = DEFAULT_FORMAT):
+        """Audio frame for a text-first response the child tapped, or None if it has expired."""
+        deferred = self.deferred_speech.get(speech_id)
+        if deferred is None:
+            return None
+        speech_text, language = deferred
+        with span("tts", format=audio_format, deferred=True):
+            audio = await self.generate_speech(speech_text, language, audio_format)
+        frame = tag_format({"type": "audio", "speech_id": speech_id, "audio": audio}, audio_format)
+        track = await self.lip_sync(speech_text, language, audio_format, audio)
+        if track is not None:
+            frame["lipsync"] = track
+        return frame
+
+    def match_response(self, english_text: str):
+        """Return the predefined response whose keyword appears in the message, if any."""
+        return self.responses.get(self.match_key(english_text))
+
+    def match_key(self, english_text: str) -> Optional[str]:
+        """The response bank keyword that appears in the message, if any."""
+        message_lower = english_text.lower()  # Use English version for keyword matching
+        for key in self.responses:
+            if key in message_lower:
+                turn_log.debug("Found predefined response for key: {}", key)
+                return key
+        return None
+
+    def speech_voice(self, language: str):
+        """(voice, speed) used to speak replies in `language`."""
+        # Better voice selection for Spanish: alloy handles Spanish better than nova
+        voice = "alloy" if language == "es" else "shimmer"
+        # Adjust speed based on language - Spanish needs normal speed
+        speed = 1.0 if language == "es" else 0.9
+        return voice, speed
+
+    async def lip_sync(self, speech_text: str, language: str, audio_format: str,
+                       audio: Optional[str]) -> Optional[dict]:
+        """Compact mouth track for a PCM/WAV speech clip (lipsync.py), analyzed once per clip."""
+        if not audio or not lipsync.supports(audio_format):
+            return None
+        voice, speed = self.speech_voice(language)
+        # The clip length tells tts-1 and tts-1-hd renderings of the same text apart
+        key = (voice, speed, audio_format, speech_text, len(audio))
+        cached = self.lipsync_cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        with span("lipsync", format=audio_format):
+            track = await lipsync.analyze_async(audio, audio_format)
+        if track is not None:
+            self.lipsync_cache.put(key, json.dumps(track))
+        return track
+
+    async def generate_speech(self, text, language="en", audio_format=DEFAULT_FORMAT):
         if not self.tts_enabled or not text:
-            logger.debug("TTS disabled or empty text")
+            tts_log.debug("TTS disabled or empty text")
             return None
         
         try:
-            logger.debug(f"Starting TTS generation - Language: {language}, Text length: {len(text)}")
+            tts_log.debug("Starting TTS generation - Language: {}, Text length: {}", language, len(text))
             
-            # Better voice selection for Spanish
-            if language == "es":
-                voice = "alloy"  # Alloy handles Spanish better than nova
-            else:
-                voice = "shimmer"
+            voice, speed = self.speech_voice(language)
+            tts_log.debug("Using voice: {}, speed: {}", voice, speed)
             
-            # Adjust speed based on language - Spanish needs normal speed
-            speed = 1.0 if language == "es" else 0.9
+            if self.faq_pack is not None:
+                packed = self.faq_pack.audio(text, voice, speed, audio_format)
+                if packed is not None:
+                    tts_log.debug("Serving FAQ pack TTS audio")
+                    return packed
             
-            logger.debug(f"Using voice: {voice}, speed: {speed}")
+            # Under load the faster tts-1 model is used, but HD audio is still served when cached
+            model = "tts-1" if degradation.active("tts_fast") else TTS_MODEL
+            for cached_model in dict.fromkeys((TTS_MODEL, model)):
+                cached = self.audio_cache.get((cached_model, voice, speed, audio_format, text))
+                if cached is not None:
+                    tts_log.debug("Serving cached TTS audio")
+                    return cached
+            cache_key = (model, voice, speed, audio_format, text)
             
             # Create speech with proper parameters
-            response = await self.client.audio.speech.create(
-                model="tts-1-hd",
+            response = await self.tts_breaker.call(lambda: self.client.audio.speech.create(
+                model=model,
                 voice=voice,
                 input=text,
-                speed=speed
-            )
+                speed=speed,
+                response_format=audio_format
+            ), retries=1, model=model)
             
-            logger.debug(f"TTS API response received, content length: {len(response.content) if response.content else 0}")
+            tts_log.debug("TTS API response received, content length: {}", len(response.content or b""))
             
             if response.content:
+                record_clip(audio_format, response.content)
                 audio_b64 = base64.b64encode(response.content).decode('utf-8')
-                logger.debug(f"Audio encoded to base64, length: {len(audio_b64)}")
+                tts_log.debug("Audio encoded to base64, length: {}", len(audio_b64))
+                self.audio_cache.put(cache_key, audio_b64)
                 return audio_b64
             else:
                 logger.warning("TTS API returned empty content")
                 return None
             
+        except CircuitOpenError:
+            tts_log.debug("TTS circuit open and no cached audio, sending text only")
+            return None
         except Exception as e:
             logger.error(f"TTS Error: {e}")
             return None
@@ -307,54 +625,150 @@ Keep your responses concise (2-3 sentences), friendly, and appropriate for child
     async def handle_chat(self, websocket: WebSocket):
         await websocket.accept()
         logger.info("WebSocket connection accepted")
-        
+        start_loop_lag_monitor()
+        degradation.start()
+        ACTIVE_CONNECTIONS.inc(endpoint="chat")
+        try:
+            await self._chat_session(websocket)
+        finally:
+            ACTIVE_CONNECTIONS.dec(endpoint="chat")
+
+    async def _chat_session(self, websocket: WebSocket):
+        # Clients may pick a TTS format up front with ?audio_format=opus, or later with a hello message
+        requested_format = websocket.query_params.get("audio_format")
+        audio_format = negotiate(requested_format)
+        if requested_format:
+            await websocket.send_text(json.dumps(hello_ack(audio_format)))
+        # Clients that send a session id get their state back after reconnecting anywhere
+        session = await open_session(session_id_from(websocket.query_params))
+        bind_session(session.session_id)
+        # Opt-in reply text deltas ({"type": "text_delta"}) ahead of the full frame
+        stream_text = wants_text_stream(websocket.query_params)
+        # Opt-in acknowledgement clips ({"type": "ack"}) while the answer is being made
+        ack = wants_ack(websocket.query_params)
+        if ack:
+            asyncio.ensure_future(self.ack_clips.warm(audio_format))
+
         try:
             greeting = random.choice(self.greetings)
-            logger.debug(f"Selected greeting: {greeting}")
+            socket_log.debug("Selected greeting: {}", greeting)
             
             # Test TTS with greeting
             greeting_speech_text = self.clean_text_for_tts(greeting)
-            logger.debug(f"Greeting speech text: '{greeting_speech_text}'")
+            socket_log.debug("Greeting speech text: '{}'", greeting_speech_text)
             
-            greeting_audio = await self.generate_speech(greeting_speech_text, "en")
-            logger.debug(f"Greeting audio generated: {greeting_audio is not None}")
+            greeting_audio = await self.generate_speech(greeting_speech_text, "en", audio_format)
+            socket_log.debug("Greeting audio generated: {}", greeting_audio is not None)
             
-            await websocket.send_text(json.dumps({
+            greeting_frame = tag_format({
                 "text": greeting,
                 "audio": greeting_audio,
                 "emotion": "happy"
-            }))
-            logger.debug("Greeting sent successfully")
+            }, audio_format)
+            greeting_track = await self.lip_sync(greeting_speech_text, "en", audio_format, greeting_audio)
+            if greeting_track is not None:
+                greeting_frame["lipsync"] = greeting_track
+            await websocket.send_text(json.dumps(greeting_frame))
+            socket_log.debug("Greeting sent successfully")
         except Exception as e:
             logger.error(f"Error sending greeting: {e}")
         
+        async def send_frame(frame: dict):
+            with span("encode"):
+                text = json.dumps(frame)
+            with span("send"):
+                await websocket.send_text(text)
+
+        # Turns run as tasks so heartbeats, cancels and corrections are read while one is answered
+        scheduler = TurnScheduler("chat", send_frame)
+
+        async def answer(turn: Turn, message: str, received_at: float, audio_format: str,
+                         session: Session, stream_text: bool, ack: bool):
+            async def send_delta(text: str):
+                await turn.send({"type": "text_delta", "text": text})
+
+            try:
+                with degradation.track_turn("chat"), start_trace("chat_turn", endpoint="chat"):
+                    reply = self.generate_response(message, audio_format, session,
+                                                   send_delta if stream_text else None)
+                    if ack:
+                        reply = self.ack_clips.answer(message, reply, turn.send, audio_format, received_at,
+                                                      "chat", session.get("language"))
+                    response_data = await reply
+                    turn_log.debug("Response: {} chars, emotion {}, audio {}", len(response_data.get("text") or ""),
+                                   response_data.get("emotion"), response_data.get("audio") is not None)
+                    TURN_TTFB_SECONDS.observe(time.perf_counter() - received_at, endpoint="chat")
+                    await turn.send(response_data)
+                    observe_answer_audio(response_data, received_at, "chat")
+                    TURN_SECONDS.observe(time.perf_counter() - received_at, endpoint="chat")
+                    await session.save()
+            except Exception as e:
+                logger.error(f"Error answering message: {e}")
+                await turn.send(TECHNICAL_DIFFICULTIES)
+
+        async def answer_speak(turn: Turn, speech_id: str, audio_format: str):
+            frame = await self.speak(speech_id, audio_format)
+            if frame is not None:
+                await turn.send(frame)
+
         try:
             while True:
                 message = await websocket.receive_text()
-                logger.info(f"Received message: {message}")
+                received_at = time.perf_counter()
                 
+                tagged = None
                 if message.startswith('{'):
                     try:
                         data = json.loads(message)
                         if data.get('type') == 'heartbeat':
+                            await scheduler.send({"type": "heartbeat"})
                             continue
                     except:
                         pass
+                    hello = parse_hello(message)
+                    if hello is not None:
+                        audio_format = negotiate(hello.get("audio_format"))
+                        logger.info("Client negotiated audio format: {}", audio_format)
+                        if session_id_from({}, hello):
+                            session = await open_session(session_id_from({}, hello))
+                            bind_session(session.session_id)
+                        stream_text = wants_text_stream(websocket.query_params, hello)
+                        ack = wants_ack(websocket.query_params, hello)
+                        if ack:
+                            asyncio.ensure_future(self.ack_clips.warm(audio_format))
+                        await scheduler.send(hello_ack(audio_format))
+                        continue
+                    speech_id = parse_speak(message)
+                    if speech_id is not None:
+                        scheduler.submit(lambda turn, args=(speech_id, audio_format): answer_speak(turn, *args))
+                        continue
+                    if handle_control(scheduler, message):
+                        continue
+                    tagged = parse_message(message)
                 
-                response_data = await self.generate_response(message)
-                logger.debug(f"Response data: {json.dumps({k: v if k != 'audio' else f'audio_present: {v is not None}' for k, v in response_data.items()})}")
-                await websocket.send_text(json.dumps(response_data))
+                if tagged is not None:
+                    message_id = str(tagged["id"]) if tagged.get("id") is not None else None
+                    logger.info("Received message {} ({} chars)", message_id, len(tagged["text"]))
+                    scheduler.submit(
+                        lambda turn, args=(tagged["text"], received_at, audio_format, session, stream_text, ack):
+                            answer(turn, *args),
+                        message_id, supersede=tagged.get("supersede", True) is not False,
+                    )
+                else:
+                    logger.info("Received message ({} chars)", len(message))
+                    scheduler.submit(
+                        lambda turn, args=(message, received_at, audio_format, session, stream_text, ack):
+                            answer(turn, *args)
+                    )
                 
         except Exception as e:
             logger.error(f"Error in handle_chat: {e}")
             try:
-                await websocket.send_text(json.dumps({
-                    "text": "*looks concerned* I'm having some technical difficulties. Could we try again? 🐾",
-                    "audio": None,
-                    "emotion": "caring"
-                }))
+                await websocket.send_text(json.dumps(TECHNICAL_DIFFICULTIES))
             except:
                 logger.error("Could not send error message")
+        finally:
+            await scheduler.close()
 
     async def test_tts(self) -> bool:
         try:
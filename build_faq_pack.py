@@ -0,0 +1,239 @@
+"""
+FAQ pack build step (see faq_pack.py).
+
+Runs every curated question in faq_questions.json, and every response bank
+reply, through the bot's own pipeline: the input check on each phrasing, the
+reply (completion and output check, or the bank text) and its translation in
+each language, then speech in each audio format. The acknowledgement clips
+(ack_clips.py) are rendered too. Jobs run concurrently on a bounded worker
+pool, and everything lands in one pack file:
+
+    python build_faq_pack.py --format mp3 --format opus --workers 8
+
+Needs OPENAI_API_KEY. Rebuilding is incremental: a reply is regenerated only
+when its first question, bank text, the system prompt or the chat model
+changed (or with --force), new phrasings are checked on their own, and speech
+is synthesized only when its text, voice, speed, model or format changed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import ack_clips
+import faq_pack
+from build_static import content_hash
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS_PATH = os.path.join(faq_pack.BASE_DIR, "faq_questions.json")
+LANGUAGES = ("en", "es")
+CHAT_MODEL = "gpt-4o"
+
+
+def digest(*parts) -> str:
+    return content_hash(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode())
+
+
+def load_entries(questions_path: str, responses: Dict[str, str]) -> List[dict]:
+    """The curated entries, then one entry per response bank keyword and per acknowledgement clip."""
+    with open(questions_path, encoding="utf-8") as f:
+        entries = json.load(f)
+    keys = [entry["key"] for entry in entries]
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"Duplicate keys in {questions_path}")
+    for entry in entries:
+        if entry.get("bank") is not None and entry["bank"] not in responses:
+            raise ValueError(f"Entry {entry['key']} names unknown response bank keyword {entry['bank']!r}")
+    return entries + [{"key": f"bank:{keyword}", "bank": keyword, "questions": {}} for keyword in responses] + [
+        {"key": f"ack:{intent}:{index}", "emotion": phrases["emotion"],
+         "texts": {language: phrases[language][index] for language in LANGUAGES}}
+        for intent, phrases in ack_clips.PHRASES.items() for index in range(len(phrases["en"]))
+    ]
+
+
+async def _pool(jobs: List[Callable[[], Awaitable]], workers: int) -> list:
+    """Run `jobs` with at most `workers` in flight; results (or exceptions) in order."""
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+
+
+class PackBuilder:
+    def __init__(self, bot, previous: Optional[faq_pack.FaqPack], formats: List[str], force: bool = False):
+        from bot import TTS_MODEL
+
+        self.bot = bot
+        self.previous = previous
+        self.formats = formats
+        self.force = force
+        self.tts_model = TTS_MODEL
+        self.clips: Dict[str, bytes] = {}
+        self.stats = {"replies_rendered": 0, "replies_reused": 0, "clips_synthesized": 0, "clips_reused": 0,
+                      "questions_rejected": 0, "failed": 0}
+
+    def _previous_reply(self, key: str, language: str) -> Optional[dict]:
+        if self.previous is None:
+            return None
+        return self.previous.entries.get(key, {}).get("replies", {}).get(language)
+
+    async def reply(self, entry: dict, language: str) -> Optional[dict]:
+        """The reply text for one entry and language, reusing the previous build's when its inputs are unchanged."""
+        from bot import FALLBACK_RESPONSE
+        from guardrails import UNSAFE_RESPONSE
+
+        bot = self.bot
+        fixed_text = entry.get("texts", {}).get(language)
+        if fixed_text is not None:
+            # Acknowledgement clips: fixed text in every language, only the speech is rendered
+            return {"questions": [], "source": digest(language, fixed_text), "text": fixed_text,
+                    "emotion": entry["emotion"], "speech": self._speech(fixed_text, language), "audio": {}}
+        questions = entry.get("questions", {}).get(language, [])
+        bank_text = bot.responses.get(entry.get("bank"))
+        if bank_text is None and not questions:
+            return None
+        source = digest(language, questions[:1], bank_text, bot.get_system_prompt(), CHAT_MODEL)
+        previous = self._previous_reply(entry["key"], language)
+        reuse = previous is not None and previous["source"] == source and not self.force
+        checked = set(previous["questions"]) if reuse else set()
+
+        approved = []
+        for question in questions:
+            if question not in checked:
+                safe, _ = await bot.guardrails.check_input(question)
+                if not safe:
+                    logger.warning(f"{entry['key']}: dropping question rejected by the input check: {question!r}")
+                    self.stats["questions_rejected"] += 1
+                    continue
+            approved.append(question)
+
+        if reuse:
+            text, emotion = previous["text"], previous["emotion"]
+            self.stats["replies_reused"] += 1
+        elif bank_text is not None:
+            text = await bot.translator.translate_response(bank_text, language)
+            emotion = bot.analyze_emotion(text)
+            self.stats["replies_rendered"] += 1
+        else:
+            if not approved or approved[0] != questions[0]:
+                raise ValueError(f"{entry['key']}: first {language} question was rejected by the input check")
+            response = await bot.generate_response(questions[0])
+            text, emotion = response["text"], response["emotion"]
+            if text in (FALLBACK_RESPONSE, UNSAFE_RESPONSE):
+                raise ValueError(f"{entry['key']}: no approved {language} reply")
+            if language != "en" and bot.translator.quick_detect(text) == "en":
+                raise ValueError(f"{entry['key']}: reply was not translated to {language}")
+            self.stats["replies_rendered"] += 1
+        return {"questions": approved, "source": source, "text": text, "emotion": emotion,
+                "speech": self._speech(text, language), "audio": {}}
+
+    def _speech(self, text: str, language: str) -> str:
+        if language == "es":
+            return self.bot.clean_spanish_text_for_tts(text)
+        return self.bot.clean_text_for_tts(text)
+
+    async def clip(self, key: str, language: str, reply: dict, audio_format: str):
+        """Speech for one reply and format, copied from the previous build when nothing about it changed."""
+        voice, speed = self.bot.speech_voice(language)
+        clip_id = digest(reply["speech"], voice, speed, self.tts_model, audio_format)
+        previous = self._previous_reply(key, language)
+        view = None
+        if previous is not None and previous.get("audio", {}).get(audio_format, {}).get("digest") == clip_id:
+            view = self.previous.audio_view(previous["speech"], voice, speed, audio_format)
+        if view is not None:
+            self.clips[clip_id] = bytes(view)
+            self.stats["clips_reused"] += 1
+        else:
+            audio = await self.bot.generate_speech(reply["speech"], language, audio_format)
+            if audio is None:
+                raise ValueError(f"{key}: no {language} {audio_format} speech")
+            self.clips[clip_id] = audio.encode("ascii")
+            self.stats["clips_synthesized"] += 1
+        reply["audio"][audio_format] = {"digest": clip_id, "voice": voice, "speed": speed,
+                                        "model": self.tts_model, "clip": clip_id}
+
+    async def build(self, entries: List[dict], workers: int) -> List[dict]:
+        bot = self.bot
+        # Text first, without speech: clips are synthesized per format afterwards
+        bot.tts_enabled = False
+        jobs = [(entry, language) for entry in entries for language in LANGUAGES]
+        replies = await _pool([lambda e=entry, l=language: self.reply(e, l) for entry, language in jobs], workers)
+        built: Dict[str, dict] = {}
+        for (entry, language), reply in zip(jobs, replies):
+            if isinstance(reply, Exception):
+                logger.error(f"Skipping {entry['key']} ({language}): {reply}")
+                self.stats["failed"] += 1
+            elif reply is not None:
+                built.setdefault(entry["key"], {"key": entry["key"], "bank": entry.get("bank"), "replies": {}})
+                built[entry["key"]]["replies"][language] = reply
+
+        bot.tts_enabled = True
+        clip_jobs = [(key, language, reply, audio_format)
+                     for key, packed in built.items()
+                     for language, reply in packed["replies"].items()
+                     for audio_format in self.formats]
+        results = await _pool([lambda job=job: self.clip(*job) for job in clip_jobs], workers)
+        for (key, language, reply, audio_format), result in zip(clip_jobs, results):
+            if isinstance(result, Exception):
+                # The reply is still served; its speech is synthesized live
+                logger.error(f"No {audio_format} clip for {key} ({language}): {result}")
+                self.stats["failed"] += 1
+        return list(built.values())
+
+
+def build(output: str = faq_pack.FAQ_PACK_PATH, questions_path: str = QUESTIONS_PATH,
+          formats: List[str] = ("mp3",), workers: int = 4, force: bool = False) -> dict:
+    """Build (or incrementally rebuild) the pack at `output`; returns the build statistics."""
+    from bot import DoctorSnowLeopardBot
+
+    try:
+        previous = faq_pack.FaqPack(output)
+    except FileNotFoundError:
+        previous = None
+    except ValueError as e:
+        logger.warning(f"Rebuilding from scratch: {e}")
+        previous = None
+
+    async def run():
+        bot = DoctorSnowLeopardBot()
+        # Every reply goes through the staged pipeline, never a cached or packed one
+        bot.faq_pack = None
+        bot.semantic_cache = None
+        bot.pipeline_mode = "staged"
+        builder = PackBuilder(bot, previous, list(formats), force)
+        try:
+            entries = await builder.build(load_entries(questions_path, bot.responses), workers)
+        finally:
+            await bot.client.close()
+        settings = {"built_at": time.time(), "formats": list(formats), "tts_model": builder.tts_model,
+                    "chat_model": CHAT_MODEL}
+        faq_pack.write(output, entries, builder.clips, settings)
+        return dict(builder.stats, entries=len(entries))
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    from audio_formats import MIME_TYPES
+
+    parser = argparse.ArgumentParser(description="Build the FAQ response pack (needs OPENAI_API_KEY)")
+    parser.add_argument("--questions", default=QUESTIONS_PATH, help="Curated questions (JSON)")
+    parser.add_argument("--output", default=faq_pack.FAQ_PACK_PATH)
+    parser.add_argument("--format", action="append", dest="formats", choices=sorted(MIME_TYPES),
+                        help="Audio format to pre-render (repeatable, default mp3)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent pipeline jobs")
+    parser.add_argument("--force", action="store_true", help="Regenerate every reply, not only changed ones")
+    args = parser.parse_args()
+
+    stats = build(args.output, args.questions, args.formats or ["mp3"], args.workers, args.force)
+    print(f"Wrote {args.output}: {os.path.getsize(args.output)} bytes, " +
+          ", ".join(f"{key} {value}" for key, value in stats.items()))
+    sys.exit(1 if stats["failed"] else 0)
@@ -0,0 +1,163 @@
+"""
+Static asset build step.
+
+Fingerprints the CSS/JS under static/ with content hashes, rewrites the
+references to them in the HTML pages, and pre-generates gzip (and brotli,
+when the `brotli` package is installed) variants of every text asset into
+static/dist/ with a manifest.json that static_assets.py serves from memory:
+
+    python build_static.py
+
+Without a build, static_assets.py runs the same steps in memory on first use.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIRNAME = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Assets whose URLs get a content hash (served immutable)
+FINGERPRINTED = (".css", ".js")
+# Pages that keep their URL and are revalidated by ETag
+PAGES = (".html",)
+MEDIA_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+# Compressing tiny files costs more in headers than it saves
+MIN_COMPRESS_BYTES = 256
+SKIP_DIRS = {DIST_DIRNAME, "assets"}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """Encoded variants worth serving, keyed by Content-Encoding."""
+    variants = {}
+    if len(data) < MIN_COMPRESS_BYTES:
+        return variants
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        variants["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            variants["br"] = br
+    return variants
+
+
+def collect_assets(static_dir: str = STATIC_DIR) -> Dict[str, dict]:
+    """
+    Build every servable text asset in memory.
+
+    Returns:
+        Map of URL path relative to /static (e.g. "css/main.3f2a9c1e0b7d.css", "index.html")
+        to {"source", "media_type", "etag", "immutable", "variants": {encoding: bytes}},
+        where variants always includes "identity".
+    """
+    sources = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if ext in FINGERPRINTED or ext in PAGES:
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    sources[rel_path] = f.read()
+
+    # Hash the leaf assets first so the pages can point at the hashed URLs
+    renames = {}
+    for rel_path, data in sources.items():
+        if os.path.splitext(rel_path)[1].lower() in FINGERPRINTED:
+            renames[rel_path] = fingerprinted_name(rel_path, content_hash(data))
+
+    assets = {}
+    for rel_path, data in sources.items():
+        ext = os.path.splitext(rel_path)[1].lower()
+        if ext in PAGES:
+            text = data.decode("utf-8")
+            for original, hashed in renames.items():
+                text = text.replace(f"/static/{original}", f"/static/{hashed}")
+            data = text.encode("utf-8")
+        url_path = renames.get(rel_path, rel_path)
+        assets[url_path] = {
+            "source": rel_path,
+            "media_type": MEDIA_TYPES[ext],
+            "etag": f'"{content_hash(data)}"',
+            "immutable": rel_path in renames,
+            "variants": {"identity": data, **compress(data)},
+        }
+    return assets
+
+
+def write_dist(assets: Dict[str, dict], static_dir: str = STATIC_DIR) -> str:
+    """Write the built assets and manifest to static/dist; returns the manifest path."""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = {}
+    suffixes = {"identity": "", "gzip": ".gz", "br": ".br"}
+    for url_path, asset in assets.items():
+        files = {}
+        for encoding, data in asset["variants"].items():
+            file_name = url_path + suffixes[encoding]
+            out_path = os.path.join(dist_dir, file_name)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(data)
+            files[encoding] = file_name
+        manifest[url_path] = {key: asset[key] for key in ("source", "media_type", "etag", "immutable")}
+        manifest[url_path]["files"] = files
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest_path
+
+
+def load_dist(static_dir: str = STATIC_DIR) -> Optional[Dict[str, dict]]:
+    """Read a previous build back into the collect_assets() shape, or None if there is none."""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assets = {}
+    for url_path, entry in manifest.items():
+        variants = {}
+        for encoding, file_name in entry["files"].items():
+            with open(os.path.join(dist_dir, file_name), "rb") as f:
+                variants[encoding] = f.read()
+        assets[url_path] = {key: entry[key] for key in ("source", "media_type", "etag", "immutable")}
+        assets[url_path]["variants"] = variants
+    return assets
+
+
+if __name__ == "__main__":
+    built = collect_assets()
+    manifest_file = write_dist(built)
+    for url, asset in sorted(built.items()):
+        sizes = ", ".join(f"{enc} {len(data)}" for enc, data in asset["variants"].items())
+        print(f"{url}: {sizes}")
+    if brotli is None:
+        print("brotli not installed; only gzip variants were generated")
+    print(f"Wrote {len(built)} assets to {manifest_file}")
@@ -0,0 +1,46 @@
+"""
+Small in-process caches used on the turn path (synthesized audio, canned replies).
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from metrics import CACHE_REQUESTS
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, name: str, max_entries: int = 256):
+        self.name = name
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if value is None:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        return list(self.entries.items())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
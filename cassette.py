@@ -0,0 +1,236 @@
+"""
+Transport-level record/replay ("cassette") mode for the OpenAI client.
+
+In record mode every request made through the shared client is forwarded
+upstream and captured -- status, headers, body (including audio) and the
+arrival time of each body chunk -- into a single indexed cassette file. In
+replay mode the cassette serves those responses offline, with the original
+latency scaled by a factor (1.0 exact, 0 instant).
+
+Configured with environment variables:
+    OPENAI_CASSETTE_MODE           record | replay (unset disables the cassette)
+    OPENAI_CASSETTE_PATH           cassette file (default: cassettes/openai.cassette)
+    OPENAI_CASSETTE_LATENCY_SCALE  replay latency multiplier (default: 1.0)
+
+File layout: b"SNOWCAS1", an 8-byte little-endian index length, a JSON
+index, then the concatenated response bodies the index points into.
+"""
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SNOWCAS1"
+DEFAULT_PATH = os.path.join("cassettes", "openai.cassette")
+# Response headers worth replaying; everything else is connection noise
+KEPT_HEADERS = ("content-type", "x-request-id", "openai-processing-ms")
+
+
+class CassetteMiss(httpx.TransportError):
+    """Raised in replay mode when the cassette holds nothing for a request."""
+
+
+def _body_model(body: bytes) -> str:
+    try:
+        return json.loads(body).get("model", "")
+    except (ValueError, AttributeError):
+        return ""
+
+
+def request_key(request: httpx.Request) -> str:
+    """Stable key for a request: method, path and a hash of the canonical body."""
+    body = request.content
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    else:
+        # Multipart boundaries are random per request
+        match = re.search(r"boundary=([^;]+)", content_type)
+        if match:
+            body = body.replace(match.group(1).encode(), b"BOUNDARY")
+    digest = hashlib.sha1(body).hexdigest()[:16]
+    return f"{request.method} {request.url.path} {digest}"
+
+
+def fallback_key(method: str, path: str, model: str) -> str:
+    return f"{method} {path} {model}"
+
+
+class Cassette:
+    """Recorded interactions plus the blob region holding their bodies."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: List[dict] = []
+        self.blob = bytearray()
+        self.by_key: Dict[str, List[dict]] = defaultdict(list)
+        self.by_fallback: Dict[str, List[dict]] = defaultdict(list)
+        self.cursors: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def load(cls, path: str, writable: bool = False) -> "Cassette":
+        cassette = cls(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:8] != MAGIC:
+            raise ValueError(f"{path} is not a cassette file")
+        (index_len,) = struct.unpack("<Q", data[8:16])
+        cassette.entries = json.loads(data[16:16 + index_len])
+        blob = memoryview(data)[16 + index_len:]
+        cassette.blob = bytearray(blob) if writable else blob
+        for entry in cassette.entries:
+            cassette._index(entry)
+        return cassette
+
+    def _index(self, entry: dict):
+        self.by_key[entry["key"]].append(entry)
+        self.by_fallback[fallback_key(entry["method"], entry["path"], entry["model"])].append(entry)
+
+    def add(self, request: httpx.Request, status: int, headers: dict, chunks: List[tuple], elapsed: float):
+        spans = []
+        for at, chunk in chunks:
+            spans.append([len(self.blob), len(chunk), round(at, 6)])
+            self.blob += chunk
+        entry = {
+            "key": request_key(request),
+            "method": request.method,
+            "path": request.url.path,
+            "model": _body_model(request.content),
+            "status": status,
+            "headers": headers,
+            "elapsed": round(elapsed, 6),
+            "chunks": spans,
+        }
+        self.entries.append(entry)
+        self._index(entry)
+
+    def lookup(self, request: httpx.Request) -> Optional[dict]:
+        """Exact match first, then any recording for the same endpoint and model, in recorded order."""
+        for key, table in (
+            (request_key(request), self.by_key),
+            (fallback_key(request.method, request.url.path, _body_model(request.content)), self.by_fallback),
+        ):
+            candidates = table.get(key)
+            if candidates:
+                cursor = self.cursors[key]
+                self.cursors[key] = cursor + 1
+                return candidates[cursor % len(candidates)]
+        return None
+
+    def body(self, entry: dict) -> List[tuple]:
+        return [(at, bytes(self.blob[offset:offset + length])) for offset, length, at in entry["chunks"]]
+
+    def save(self):
+        index = json.dumps(self.entries, separators=(",", ":")).encode()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(index)) + index)
+            f.write(self.blob)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(self.entries)} interactions to cassette {self.path}")
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[tuple], scale: float, started: float):
+        self.chunks = chunks
+        self.scale = scale
+        self.started = started
+
+    async def __aiter__(self):
+        for at, chunk in self.chunks:
+            delay = self.started + at * self.scale - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records through `inner` or replays from a cassette."""
+
+    def __init__(self, mode: str, path: str, latency_scale: float = 1.0,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.stats = {"requests": 0, "misses": 0}
+        if mode == "replay":
+            self.cassette = Cassette.load(path)
+        else:
+            self.cassette = Cassette.load(path, writable=True) if os.path.exists(path) else Cassette(path)
+            self.inner = inner or httpx.AsyncHTTPTransport()
+            atexit.register(self.cassette.save)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        await request.aread()
+        if self.mode == "replay":
+            return await self._replay(request)
+        return await self._record(request)
+
+    async def _record(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        chunks = []
+        try:
+            async for chunk in response.aiter_bytes():
+                chunks.append((time.monotonic() - started, chunk))
+        finally:
+            await response.aclose()
+        elapsed = time.monotonic() - started
+        headers = {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS}
+        self.cassette.add(request, response.status_code, headers, chunks, elapsed)
+        return httpx.Response(
+            response.status_code, headers=headers, content=b"".join(c for _, c in chunks), request=request
+        )
+
+    async def _replay(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        entry = self.cassette.lookup(request)
+        if entry is None:
+            self.stats["misses"] += 1
+            raise CassetteMiss(f"No cassette entry for {request.method} {request.url.path}", request=request)
+        chunks = self.cassette.body(entry)
+        if not chunks:
+            await asyncio.sleep(entry["elapsed"] * self.latency_scale)
+        return httpx.Response(
+            entry["status"], headers=entry["headers"],
+            stream=_ReplayStream(chunks, self.latency_scale, started), request=request,
+        )
+
+    async def aclose(self):
+        if self.mode == "record":
+            self.cassette.save()
+            await self.inner.aclose()
+
+
+def build_http_client() -> Optional[httpx.AsyncClient]:
+    """
+    HTTP client for AsyncOpenAI honoring OPENAI_CASSETTE_MODE.
+
+    Returns None when the cassette is disabled, so the OpenAI default client is used.
+    """
+    mode = os.getenv("OPENAI_CASSETTE_MODE")
+    if not mode:
+        return None
+    path = os.getenv("OPENAI_CASSETTE_PATH", DEFAULT_PATH)
+    scale = float(os.getenv("OPENAI_CASSETTE_LATENCY_SCALE", "1.0"))
+    logger.info(f"OpenAI cassette {mode} mode using {path}")
+    return httpx.AsyncClient(transport=CassetteTransport(mode, path, latency_scale=scale), timeout=None)
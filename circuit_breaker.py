@@ -0,0 +1,251 @@
+"""
+Circuit breakers and retry policy for upstream (OpenAI) calls.
+
+Each upstream endpoint (chat, guardrail, detect, translate, tts, ...) gets its
+own breaker. A breaker trips when too many recent calls failed or were slow,
+short-circuits calls while open so callers can fall back instantly, and lets a
+single probe through once the reset timeout has passed (half-open).
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from openai import APIConnectionError
+
+from metrics import UPSTREAM_CALLS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint call timeouts in seconds, overridable with BREAKER_TIMEOUT_<NAME>
+DEFAULT_TIMEOUTS = {
+    "chat": 15.0,
+    "fused": 15.0,
+    "guardrail": 6.0,
+    "detect": 4.0,
+    "translate": 8.0,
+    "tts": 15.0,
+    "transcribe": 30.0,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because its breaker is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+
+
+def backoff_delay(attempt: int, base: float = 0.2, cap: float = 2.0) -> float:
+    """Full-jitter exponential backoff delay for the given retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Only timeouts, connection problems, rate limits and 5xx are worth retrying."""
+    # APITimeoutError is an APIConnectionError; neither carries a status code
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, APIConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return False
+    return status in (408, 409, 429) or status >= 500
+
+
+def is_client_error(error: Exception) -> bool:
+    """A 4xx the upstream answered on purpose (bad request, auth, not found): not an outage."""
+    status = getattr(error, "status_code", None)
+    return status is not None and 400 <= status < 500 and not is_retryable(error)
+
+
+class CircuitBreaker:
+    """Error-rate and latency triggered circuit breaker with half-open probing."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        window: int = 20,
+        min_calls: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.outcomes = deque(maxlen=window)  # (failed, slow) per recent call
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be short-circuited."""
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        if self.state == self.HALF_OPEN:
+            return self.probes_in_flight >= self.half_open_probes
+        return False
+
+    def allow(self) -> bool:
+        """Decide whether a call may go upstream, moving open -> half-open when due."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit '{self.name}' half-open, probing upstream")
+        if self.probes_in_flight >= self.half_open_probes:
+            return False
+        self.probes_in_flight += 1
+        return True
+
+    def record_success(self, elapsed: float):
+        slow = elapsed >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if slow:
+                self._trip(f"slow probe ({elapsed:.2f}s)")
+                return
+            self.state = self.CLOSED
+            self.outcomes.clear()
+            logger.info(f"Circuit '{self.name}' closed")
+            return
+        self.outcomes.append((False, slow))
+        self._evaluate()
+
+    def record_failure(self, elapsed: float):
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self._trip("failed probe")
+            return
+        self.outcomes.append((True, elapsed >= self.slow_call_seconds))
+        self._evaluate()
+
+    def release(self):
+        """Give back a half-open probe slot when a call is cancelled mid-flight."""
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _evaluate(self):
+        total = len(self.outcomes)
+        if self.state != self.CLOSED or total < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self.outcomes if failed)
+        slow = sum(1 for _, was_slow in self.outcomes if was_slow)
+        if failures / total >= self.error_rate:
+            self._trip(f"error rate {failures}/{total}")
+        elif slow / total >= self.slow_call_rate:
+            self._trip(f"slow call rate {slow}/{total}")
+
+    def _trip(self, reason: str):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        logger.warning(f"Circuit '{self.name}' opened: {reason}")
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        retries: int = 0,
+        model: str = "",
+    ) -> Any:
+        """
+        Run an upstream call through the breaker.
+
+        Args:
+            factory: Zero-argument callable returning a fresh awaitable per attempt
+            retries: Extra attempts with jittered backoff; only use for idempotent calls
+            model: Model name, used only to label the upstream call metrics
+
+        Returns:
+            Whatever the awaitable returns
+
+        Raises:
+            CircuitOpenError: If the breaker is open (raised without waiting)
+        """
+        attempt = 0
+        while True:
+            if not self.allow():
+                UPSTREAM_CALLS.inc(endpoint=self.name, model=model, outcome="short_circuit")
+                raise CircuitOpenError(self.name)
+            start = time.monotonic()
+            try:
+                with span(f"upstream.{self.name}", model=model, attempt=attempt):
+                    result = await asyncio.wait_for(factory(), self.timeout)
+            except asyncio.CancelledError:
+                self.release()
+                UPSTREAM_CALLS.inc(endpoint=self.name, model=model, outcome="cancelled")
+                raise
+            except Exception as e:
+                if is_client_error(e):
+                    # The upstream is up and answered; a broken request must not trip the breaker
+                    self.record_success(time.monotonic() - start)
+                else:
+                    self.record_failure(time.monotonic() - start)
+                outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                UPSTREAM_CALLS.inc(endpoint=self.name, model=model, outcome=outcome)
+                if attempt >= retries or not is_retryable(e) or self.is_open:
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                logger.info(f"Retrying '{self.name}' call in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.record_success(time.monotonic() - start)
+            UPSTREAM_CALLS.inc(endpoint=self.name, model=model, outcome="ok")
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self.outcomes),
+            "recent_failures": sum(1 for failed, _ in self.outcomes if failed),
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, timeout: Optional[float] = None) -> CircuitBreaker:
+    """Return the process-wide breaker for an upstream endpoint, creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        env_timeout = os.getenv(f"BREAKER_TIMEOUT_{name.upper()}")
+        if env_timeout:
+            timeout = float(env_timeout)
+        elif timeout is None:
+            timeout = DEFAULT_TIMEOUTS.get(name, 10.0)
+        breaker = CircuitBreaker(
+            name,
+            timeout=timeout,
+            reset_timeout=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+            slow_call_seconds=float(os.getenv("BREAKER_SLOW_CALL_SECONDS", str(timeout / 2))),
+        )
+        _breakers[name] = breaker
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every breaker created so far, for health reporting."""
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
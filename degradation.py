@@ -0,0 +1,215 @@
+"""
+Load-aware degradation ladder.
+
+A background controller samples three load signals about once a second:
+in-flight turns, recent completion latency (from the stage histogram) and
+event-loop lag. Each is divided by its budget and the largest ratio is the
+load "pressure". Sustained pressure above DEGRADE_UP_PRESSURE steps one level
+down the ladder; sustained pressure below DEGRADE_DOWN_PRESSURE steps back up
+one level, so the service does not flap at the boundary.
+
+Levels are cumulative; each one keeps the cheaper behaviour of those before it:
+    tts_fast          synthesize with tts-1 instead of tts-1-hd
+    light_guardrails  run the safety checks on a lighter model
+    bank_skip_checks  understand the message while the input check runs, so a
+                      response-bank match (fixed text, no output check) costs
+                      one guardrail round-trip; the input check always runs
+    text_first        send text only, with a speech_id; the client asks for the
+                      audio with {"type": "speak", "speech_id": ...} when tapped
+
+The current level is exported at /metrics and in /health.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import EVENT_LOOP_LAG, IN_FLIGHT_TURNS, STAGE_SECONDS, Gauge
+
+logger = logging.getLogger(__name__)
+
+LADDER = ("tts_fast", "light_guardrails", "bank_skip_checks", "text_first")
+
+DEGRADATION_LEVEL = Gauge("snowpaws_degradation_level", "Current degradation level (0 = full quality)")
+DEGRADATION_PRESSURE = Gauge("snowpaws_degradation_pressure", "Load pressure driving the degradation level")
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class DegradationController:
+    """Steps through the configured levels with hysteresis as load rises and falls."""
+
+    def __init__(
+        self,
+        levels: Tuple[str, ...] = LADDER,
+        max_in_flight: float = 50,
+        upstream_budget: float = 4.0,
+        loop_lag_budget: float = 0.1,
+        up_pressure: float = 1.0,
+        down_pressure: float = 0.6,
+        up_after: int = 3,
+        down_after: int = 15,
+        interval: float = 1.0,
+    ):
+        unknown = set(levels) - set(LADDER)
+        if unknown:
+            raise ValueError(f"Unknown degradation levels: {', '.join(sorted(unknown))}")
+        self.levels = tuple(levels)
+        self.max_in_flight = max_in_flight
+        self.upstream_budget = upstream_budget
+        self.loop_lag_budget = loop_lag_budget
+        self.up_pressure = up_pressure
+        self.down_pressure = down_pressure
+        self.up_after = up_after
+        self.down_after = down_after
+        self.interval = interval
+
+        self.level = 0
+        self.forced_level: Optional[int] = None
+        self.pressure = 0.0
+        self.signals: Dict[str, float] = {}
+        self.changed_at = time.time()
+        self._above = 0
+        self._below = 0
+        self._last_completion = STAGE_SECONDS.totals(stage="completion")
+        self._last_loop_lag = EVENT_LOOP_LAG.totals()
+        self._task: Optional["asyncio.Task"] = None
+
+    @property
+    def current_level(self) -> int:
+        return self.forced_level if self.forced_level is not None else self.level
+
+    @property
+    def level_name(self) -> str:
+        level = self.current_level
+        return self.levels[level - 1] if level else "normal"
+
+    def active(self, name: str) -> bool:
+        """True when the named degradation applies at the current level."""
+        return name in self.levels[:self.current_level]
+
+    def force(self, level: Optional[int]):
+        """Pin a level (e.g. for drills); None returns control to the load signals."""
+        self.forced_level = None if level is None else max(0, min(level, len(self.levels)))
+
+    @staticmethod
+    def _recent_mean(histogram_totals: Tuple[int, float], last: Tuple[int, float]) -> Optional[float]:
+        count = histogram_totals[0] - last[0]
+        return (histogram_totals[1] - last[1]) / count if count > 0 else None
+
+    def sample(self) -> float:
+        """Read the load signals since the last sample and return the pressure."""
+        in_flight = sum(IN_FLIGHT_TURNS.values.values())
+        completion = STAGE_SECONDS.totals(stage="completion")
+        loop_lag = EVENT_LOOP_LAG.totals()
+        upstream = self._recent_mean(completion, self._last_completion)
+        lag = self._recent_mean(loop_lag, self._last_loop_lag)
+        self._last_completion, self._last_loop_lag = completion, loop_lag
+
+        self.signals = {"in_flight_turns": in_flight}
+        ratios = [in_flight / self.max_in_flight]
+        if upstream is not None:
+            self.signals["completion_seconds"] = round(upstream, 4)
+            ratios.append(upstream / self.upstream_budget)
+        if lag is not None:
+            self.signals["event_loop_lag_seconds"] = round(lag, 4)
+            ratios.append(lag / self.loop_lag_budget)
+        return max(ratios)
+
+    def evaluate(self, pressure: float):
+        """Apply one pressure sample to the ladder."""
+        self.pressure = pressure
+        DEGRADATION_PRESSURE.set(pressure)
+        if pressure >= self.up_pressure:
+            self._above += 1
+            self._below = 0
+        elif pressure <= self.down_pressure:
+            self._below += 1
+            self._above = 0
+        else:
+            self._above = self._below = 0
+
+        if self._above >= self.up_after and self.level < len(self.levels):
+            self._set_level(self.level + 1)
+        elif self._below >= self.down_after and self.level > 0:
+            self._set_level(self.level - 1)
+        DEGRADATION_LEVEL.set(self.current_level)
+
+    def _set_level(self, level: int):
+        previous = self.level_name
+        self.level = level
+        self.changed_at = time.time()
+        self._above = self._below = 0
+        logger.warning(f"Degradation level {previous} -> {self.level_name} (pressure {self.pressure:.2f})")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.evaluate(self.sample())
+            except Exception as e:
+                logger.error(f"Degradation controller error: {e}")
+
+    def start(self):
+        """Start the controller once per process; safe to call on every connection."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def snapshot(self) -> dict:
+        return {
+            "level": self.current_level,
+            "name": self.level_name,
+            "forced": self.forced_level is not None,
+            "pressure": round(self.pressure, 3),
+            "signals": self.signals,
+            "since": self.changed_at,
+        }
+
+    @contextlib.contextmanager
+    def track_turn(self, endpoint: str):
+        """Count a turn as in flight while the block runs."""
+        IN_FLIGHT_TURNS.inc(endpoint=endpoint)
+        try:
+            yield
+        finally:
+            IN_FLIGHT_TURNS.dec(endpoint=endpoint)
+
+
+def parse_speak(message: str) -> Optional[str]:
+    """The speech_id if `message` is a {"type": "speak"} request for deferred audio, else None."""
+    if not message.startswith("{") or '"speak"' not in message:
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get("type") == "speak" and isinstance(data.get("speech_id"), str):
+        return data["speech_id"]
+    return None
+
+
+def _from_env() -> DegradationController:
+    levels = tuple(name.strip() for name in os.getenv("DEGRADE_LEVELS", ",".join(LADDER)).split(",") if name.strip())
+    controller = DegradationController(
+        levels=levels,
+        max_in_flight=_env_float("DEGRADE_MAX_IN_FLIGHT", 50),
+        upstream_budget=_env_float("DEGRADE_UPSTREAM_SECONDS", 4.0),
+        loop_lag_budget=_env_float("DEGRADE_LOOP_LAG_SECONDS", 0.1),
+        up_pressure=_env_float("DEGRADE_UP_PRESSURE", 1.0),
+        down_pressure=_env_float("DEGRADE_DOWN_PRESSURE", 0.6),
+        up_after=int(os.getenv("DEGRADE_UP_AFTER", "3")),
+        down_after=int(os.getenv("DEGRADE_DOWN_AFTER", "15")),
+    )
+    forced = os.getenv("DEGRADE_FORCE_LEVEL")
+    if forced:
+        controller.force(int(forced))
+    DEGRADATION_LEVEL.set(controller.current_level)
+    return controller
+
+
+controller = _from_env()
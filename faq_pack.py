@@ -0,0 +1,183 @@
+"""
+FAQ response pack: pre-rendered replies and speech, memory-mapped at startup.
+
+build_faq_pack.py runs a curated list of pediatric questions (faq_questions.json)
+and the response bank through the full pipeline offline and writes one file:
+
+    header   magic, format version, index offset, index length
+    audio    base64 speech clips, the form the reply frames carry
+    index    JSON: per entry and language the questions, reply text, emotion,
+             and per audio format the voice/speed/model and clip location
+
+The server maps the file read-only (the page cache is shared by every worker)
+and keeps only the small index in memory. A message that is one of the curated
+questions, after folding case and punctuation, is answered from the pack with
+no upstream call at all: the question passed the input check when the pack was
+built. A close rephrasing (FAQ_PACK_THRESHOLD, the semantic cache's default)
+is answered after the input check, unless the model router would treat it as
+risky (semantic_cache.cacheable): the extra words are what make it risky. Any reply whose speech is in the pack (response bank replies included)
+gets its audio as a slice of the mapping instead of a TTS call.
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import CACHE_REQUESTS
+from semantic_cache import THRESHOLD as SEMANTIC_THRESHOLD, cacheable, embed
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FAQ_PACK_PATH = os.getenv("FAQ_PACK_PATH", os.path.join(BASE_DIR, "faq_pack.bin"))
+THRESHOLD = float(os.getenv("FAQ_PACK_THRESHOLD", str(SEMANTIC_THRESHOLD)))
+
+MAGIC = b"SNOWFAQ1"
+VERSION = 1
+# magic, version, index offset, index length
+_HEADER = struct.Struct("<8sIQQ")
+HEADER_SIZE = 64
+
+_WORD = re.compile(r"[^\W_]+")
+
+_loaded: Dict[str, Optional["FaqPack"]] = {}
+
+
+def normalize_question(text: str) -> str:
+    """Case, punctuation and spacing folded away: "Will the shot hurt?" -> "will the shot hurt"."""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+@dataclass
+class FaqMatch:
+    key: str
+    language: str
+    text: str
+    emotion: str
+    question: str
+    similarity: float
+    exact: bool
+
+
+class FaqPack:
+    """Read-only view of a pack file; lookups never copy audio out of the mapping until it is served."""
+
+    def __init__(self, path: str, threshold: float = THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_offset, index_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} FAQ pack")
+        self.index = json.loads(self._map[index_offset:index_offset + index_length])
+        self.entries: Dict[str, dict] = {entry["key"]: entry for entry in self.index["entries"]}
+
+        self._exact: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        questions: Dict[str, List[Tuple[str, str]]] = {}
+        self._audio: Dict[Tuple[str, float, str, str], Tuple[int, int]] = {}
+        for key, entry in self.entries.items():
+            for language, reply in entry["replies"].items():
+                for question in reply.get("questions", ()):
+                    self._exact.setdefault((language, normalize_question(question)), (key, question))
+                    questions.setdefault(language, []).append((key, question))
+                for audio_format, clip in reply.get("audio", {}).items():
+                    self._audio[(clip["voice"], clip["speed"], audio_format, reply["speech"])] = (
+                        clip["offset"], clip["length"])
+        # One unit-length embedding per question and language, for rephrasings
+        self._questions = {
+            language: (np.stack([embed(question) for _, question in items]), items)
+            for language, items in questions.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _match(self, key: str, language: str, question: str, similarity: float, exact: bool) -> FaqMatch:
+        reply = self.entries[key]["replies"][language]
+        return FaqMatch(key, language, reply["text"], reply["emotion"], question, similarity, exact)
+
+    def match(self, message: str, language: str) -> Optional[FaqMatch]:
+        """The packed reply for a curated question `message` is (or closely rephrases) in `language`."""
+        hit = None
+        exact = self._exact.get((language, normalize_question(message)))
+        if exact is not None:
+            hit = self._match(exact[0], language, exact[1], 1.0, True)
+        elif language in self._questions and cacheable(message):
+            vectors, items = self._questions[language]
+            scores = vectors @ embed(message)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                key, question = items[best]
+                hit = self._match(key, language, question, float(scores[best]), False)
+        CACHE_REQUESTS.inc(cache="faq_pack", result="hit" if hit else "miss")
+        return hit
+
+    def bank_reply(self, bank_key: str, language: str) -> Optional[FaqMatch]:
+        """The response bank reply for `bank_key`, already rendered in `language`."""
+        reply = self.entries.get(f"bank:{bank_key}", {}).get("replies", {}).get(language)
+        if reply is None:
+            return None
+        return FaqMatch(f"bank:{bank_key}", language, reply["text"], reply["emotion"], bank_key, 1.0, True)
+
+    def audio_view(self, speech: str, voice: str, speed: float, audio_format: str) -> Optional[memoryview]:
+        """The packed base64 clip for exactly this speech text and voice, as a view into the mapping."""
+        location = self._audio.get((voice, speed, audio_format, speech))
+        if location is None:
+            return None
+        offset, length = location
+        return memoryview(self._map)[offset:offset + length]
+
+    def audio(self, speech: str, voice: str, speed: float, audio_format: str) -> Optional[str]:
+        """The packed clip as the base64 string a reply frame carries, or None."""
+        view = self.audio_view(speech, voice, speed, audio_format)
+        CACHE_REQUESTS.inc(cache="faq_pack_audio", result="hit" if view is not None else "miss")
+        return None if view is None else str(view, "ascii")
+
+
+def load(path: str = FAQ_PACK_PATH) -> Optional[FaqPack]:
+    """The pack at `path`, mapped once per process; None if there is no usable pack."""
+    if path not in _loaded:
+        pack = None
+        try:
+            pack = FaqPack(path)
+            logger.info(f"Mapped FAQ pack {path}: {len(pack)} entries")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable FAQ pack {path}: {e}")
+        _loaded[path] = pack
+    return _loaded[path]
+
+
+def write(path: str, entries: List[dict], clips: Dict[str, bytes], settings: dict):
+    """
+    Write a pack atomically. `entries` are index entries whose audio clips name
+    a `clip` id in `clips` (base64 bytes); offsets are filled in here.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        placed: Dict[str, Tuple[int, int]] = {}
+        for entry in entries:
+            for reply in entry["replies"].values():
+                for clip in reply.get("audio", {}).values():
+                    clip_id = clip.pop("clip")
+                    if clip_id not in placed:
+                        placed[clip_id] = (f.tell(), len(clips[clip_id]))
+                        f.write(clips[clip_id])
+                    clip["offset"], clip["length"] = placed[clip_id]
+        index = json.dumps({"settings": settings, "entries": entries}, ensure_ascii=False).encode()
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, index_offset, len(index)))
+    os.replace(tmp_path, path)
+    _loaded.pop(path, None)
@@ -0,0 +1,207 @@
+"""
+Single-call turn mode: safety verdict, language, reply and emotion from one completion.
+
+The staged pipeline in bot.py makes up to six sequential calls for a Spanish
+turn (input check, language detection, translation in, completion, output
+check, translation out). With PIPELINE_MODE=fused one streamed completion
+returns a JSON object whose fields arrive in a fixed order:
+
+    {"safe": true, "language": "es", "emotion": "caring", "reply": "¡Hola! ..."}
+
+so the verdict is known from the first few tokens (an unsafe turn stops
+reading right there) and the reply, written natively in the child's
+language, can be forwarded as it streams once the verdict has said it is
+safe (until then it is held back). The output check stays a separate
+stage (FUSED_OUTPUT_CHECK); while it is on, no reply text leaves the server
+before it has passed.
+"""
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from circuit_breaker import get_breaker
+
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "staged").lower()
+FUSED_MODEL = os.getenv("FUSED_MODEL", "gpt-4o")
+FUSED_OUTPUT_CHECK = os.getenv("FUSED_OUTPUT_CHECK", "true").lower() == "true"
+
+LANGUAGES = ("en", "es")
+EMOTIONS = ("neutral", "happy", "caring", "listening")
+
+FUSED_INSTRUCTIONS = """
+
+Before answering, act as a content safety filter for a children's medical chatbot: the child's message is
+unsafe if it contains inappropriate content, adult themes, requests for harmful instructions or personal
+information.
+
+Reply with a JSON object only, with exactly these keys in this order:
+{"safe": true or false,
+ "language": "en" or "es" (the language the child wrote in),
+ "emotion": one of "neutral", "happy", "caring", "listening" (how Doctor Snow Paws feels while answering),
+ "reply": your answer, written directly in the child's language ("" when the message is not safe)}"""
+
+logger = logging.getLogger(__name__)
+
+_FIELD_PATTERNS = {
+    "safe": re.compile(r'"safe"\s*:\s*(true|false)'),
+    "language": re.compile(r'"language"\s*:\s*"([a-z]{2})"'),
+    "emotion": re.compile(r'"emotion"\s*:\s*"([a-z]+)"'),
+}
+_REPLY_START = re.compile(r'"reply"\s*:\s*"')
+
+
+class FusedTurnError(Exception):
+    """Raised when the fused call failed or its reply could not be used; the caller falls back to the staged pipeline."""
+
+
+@dataclass
+class FusedResult:
+    safe: bool
+    language: str
+    emotion: Optional[str]
+    reply: str
+
+
+class FusedTurnParser:
+    """Incremental parser for the streamed JSON object; `feed` returns the reply text decoded so far."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.reply = ""
+        self.reply_done = False
+        self._reply_at: Optional[int] = None
+
+    @property
+    def safe(self) -> Optional[bool]:
+        return self.fields.get("safe")
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of the stream; returns the reply text that became available with it."""
+        self.buffer += chunk
+        for name, pattern in _FIELD_PATTERNS.items():
+            if name not in self.fields:
+                match = pattern.search(self.buffer)
+                if match:
+                    self.fields[name] = match.group(1) == "true" if name == "safe" else match.group(1)
+        if self._reply_at is None:
+            match = _REPLY_START.search(self.buffer)
+            if match is None:
+                return ""
+            self._reply_at = match.end()
+        return self._decode_reply()
+
+    def _decode_reply(self) -> str:
+        start = len(self.reply)
+        position = self._reply_at
+        while position < len(self.buffer) and not self.reply_done:
+            char = self.buffer[position]
+            if char == '"':
+                self.reply_done = True
+                break
+            if char != "\\":
+                self.reply += char
+                position += 1
+                continue
+            # Escapes may be split across chunks; wait for the rest
+            length = 6 if self.buffer[position + 1:position + 2] == "u" else 2
+            escape = self.buffer[position:position + length]
+            if len(escape) < length:
+                break
+            if length == 6 and 0xD800 <= int(escape[2:], 16) <= 0xDBFF:
+                # High surrogate: decode together with its pair
+                escape = self.buffer[position:position + 12]
+                if len(escape) < 12:
+                    break
+                length = 12
+            try:
+                self.reply += json.loads(f'"{escape}"')
+            except ValueError:
+                raise FusedTurnError(f"Bad escape in fused reply: {escape!r}")
+            position += length
+        self._reply_at = position
+        return self.reply[start:]
+
+    def result(self) -> FusedResult:
+        """The final fields, validated; raises FusedTurnError if the object is unusable."""
+        try:
+            data = json.loads(self.buffer)
+        except ValueError:
+            # Truncated after the reply closed (e.g. max_tokens): the streamed fields are still good
+            data = dict(self.fields, reply=self.reply) if self.reply_done else None
+        if not isinstance(data, dict) or not isinstance(data.get("safe"), bool):
+            raise FusedTurnError("Fused reply has no safety verdict")
+        reply = data.get("reply")
+        if data["safe"] and (not isinstance(reply, str) or not reply.strip()):
+            raise FusedTurnError("Fused reply has no text")
+        language = data.get("language")
+        emotion = data.get("emotion")
+        return FusedResult(
+            safe=data["safe"],
+            language=language if language in LANGUAGES else "en",
+            emotion=emotion if emotion in EMOTIONS else None,
+            reply=reply if data["safe"] else "",
+        )
+
+
+async def fused_turn(client, message: str, system_prompt: str, previous_language: str = "en",
+                     on_text: Optional[Callable[[str], Awaitable[None]]] = None) -> FusedResult:
+    """
+    Run one turn as a single streamed completion.
+
+    `on_text` receives reply text as it streams; only pass it when the reply is
+    not checked afterwards. Raises FusedTurnError on any failure.
+    """
+    parser = FusedTurnParser()
+    hint = "" if previous_language == "en" else f"\nThe child's previous message was in '{previous_language}'."
+
+    async def consume():
+        stream = await client.chat.completions.create(
+            model=FUSED_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt + FUSED_INSTRUCTIONS + hint},
+                {"role": "user", "content": message},
+            ],
+            max_tokens=400,
+            temperature=0.8,
+            response_format={"type": "json_object"},
+            stream=True,
+        )
+        # Reply text held back until the verdict is known (a model may write "reply" before "safe")
+        pending = ""
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                pending += parser.feed(chunk.choices[0].delta.content or "")
+                if parser.safe is False:
+                    # Unsafe: nothing more is needed from this stream
+                    break
+                if pending and parser.safe is True and on_text is not None:
+                    text, pending = pending, ""
+                    await on_text(text)
+        finally:
+            await stream.close()
+
+    try:
+        # Never retried: part of the reply may already have been forwarded
+        await get_breaker("fused").call(consume, model=FUSED_MODEL)
+    except FusedTurnError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in fused turn: {e}")
+        raise FusedTurnError(str(e)) from e
+    if parser.safe is False:
+        language = parser.fields.get("language")
+        return FusedResult(safe=False, language=language if language in LANGUAGES else "en", emotion="caring", reply="")
+    return parser.result()
+
+
+def wants_text_stream(query_params, hello: Optional[dict] = None) -> bool:
+    """Whether the client asked for reply text deltas, on the socket URL (?stream_text=1) or in its hello."""
+    if hello is not None and "stream_text" in hello:
+        return bool(hello["stream_text"])
+    return query_params.get("stream_text", "").lower() in ("1", "true")
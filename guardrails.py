@@ -1,16 +1,56 @@
 from openai import AsyncOpenAI
 import logging
+import os
+from circuit_breaker import get_breaker
+from degradation import controller as degradation
+from guardrail_batcher import BATCH_WINDOW, GuardrailBatcher
+from model_router import Route, router
+
+# Used for both checks while the service is degraded under load
+LIGHT_MODEL = os.getenv("GUARDRAIL_LIGHT_MODEL", "gpt-4o-mini")
+
+UNSAFE_RESPONSE = "*adjusts glasses* I'm sorry, but I can't answer that kind of question. Let's talk about something else! 🐾"
+
+
+class GuardrailUnavailable(Exception):
+    """Raised when a safety check could not be completed (upstream error or open breaker)."""
+
 
 class DrSnowPawsGuardrails:
     def __init__(self, client: AsyncOpenAI):
         self.client = client
         self.logger = logging.getLogger(__name__)
+        self.breaker = get_breaker("guardrail")
+        # Concurrent input checks share one request when GUARDRAIL_BATCH_WINDOW_MS is set
+        self.batcher = GuardrailBatcher(self) if BATCH_WINDOW > 0 else None
+
+    def route(self, *texts: str) -> Route:
+        """Model for the safety checks on `texts` at the current degradation level."""
+        if degradation.active("light_guardrails"):
+            return Route("guardrail", "light", LIGHT_MODEL, "degraded")
+        return router.route_all(texts, "guardrail", default="gpt-4")
         
     async def check_input(self, text: str) -> tuple[bool, str]:
-        """Check if input is safe and appropriate for children."""
+        """
+        Check if input is safe and appropriate for children.
+
+        Raises:
+            GuardrailUnavailable: If the check could not run. Callers must not
+                treat this as a pass; only the fixed response bank may be served.
+        """
+        safe = await (self.batcher.check(text) if self.batcher else self.is_safe(text))
+        if safe:
+            return True, text
+        else:
+            return False, UNSAFE_RESPONSE
+
+    async def is_safe(self, text: str) -> bool:
+        """Run the input check for one text on its own request."""
+        route = self.route(text)
+        model = route.model
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4",
+            response = await self.breaker.call(router.tracked(route, lambda: self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {"role": "system", "content": """You are a content safety filter for a children's medical chatbot.
                     Analyze the input for:
@@ -25,24 +65,26 @@ class DrSnowPawsGuardrails:
                 ],
                 temperature=0,
                 max_tokens=100
-            )
-            
-            result = response.choices[0].message.content.strip()
-            
-            if result.startswith("SAFE:"):
-                return True, text
-            else:
-                return False, "*adjusts glasses* I'm sorry, but I can't answer that kind of question. Let's talk about something else! 🐾"
-                
+            )), retries=1, model=model)
         except Exception as e:
             self.logger.error(f"Error in input check: {e}")
-            return True, text  # Default to allowing if check fails
-            
+            raise GuardrailUnavailable(str(e)) from e
+
+        return response.choices[0].message.content.strip().startswith("SAFE:")
+
     async def check_output(self, response: str, original_input: str) -> str:
-        """Ensure the output is appropriate and child-friendly."""
+        """
+        Ensure the output is appropriate and child-friendly.
+
+        Raises:
+            GuardrailUnavailable: If the check could not run; the unchecked
+                response must not be shown.
+        """
+        route = self.route(original_input, response)
+        model = route.model
         try:
-            check = await self.client.chat.completions.create(
-                model="gpt-4",
+            check = await self.breaker.call(router.tracked(route, lambda: self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {"role": "system", "content": """You are a content safety filter for a children's medical chatbot.
                     Analyze the output for:
@@ -57,18 +99,17 @@ class DrSnowPawsGuardrails:
                 ],
                 temperature=0,
                 max_tokens=200
-            )
-            
-            result = check.choices[0].message.content.strip()
-            
-            if result.startswith("SAFE:"):
-                return response
-            else:
-                return result
-                
+            )), retries=1, model=model)
         except Exception as e:
             self.logger.error(f"Error in output check: {e}")
-            return response  # Return original if check fails
+            raise GuardrailUnavailable(str(e)) from e
+
+        result = check.choices[0].message.content.strip()
+
+        if result.startswith("SAFE:"):
+            return response
+        else:
+            return result
 
     def handle_emergency(self, user_input: str) -> str:
         """
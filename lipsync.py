@@ -0,0 +1,153 @@
+"""
+Lip-sync analysis of TTS speech: a time-aligned mouth track per clip.
+
+Works on PCM and WAV speech (the formats clients doing their own lip-sync
+negotiate); compressed formats would need a decoder and get no track. Vectorized
+with NumPy, per FRAME_MS frame (a window twice that long, Hann-weighted):
+
+- mouth openness from frame loudness relative to the clip's loud frames,
+  opening at once and closing over a couple of frames;
+- a viseme from the spectrum: band energies and spectral centroid pick rest,
+  closed lips, wide open, spread, rounded or teeth (fricatives).
+
+Sent with the audio frame in compact form:
+
+    "lipsync": {"fps": 50, "mouth": "<base64, one byte (0-255) per frame>", "visemes": "XXMAAAEEOS..."}
+
+Visemes: X rest, M closed lips (m/b/p), A open (a), E spread (e/i), O rounded
+(o/u), S teeth (s/f/sh).
+"""
+import asyncio
+import base64
+import os
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import numpy as np
+
+import vad
+from audio_formats import MIME_TYPES
+
+LIPSYNC_ENABLED = os.getenv("LIPSYNC_ENABLED", "true").lower() == "true"
+FRAME_MS = int(os.getenv("LIPSYNC_FRAME_MS", "20"))
+FORMATS = ("pcm", "wav")
+
+# Openness spans this many dB below the clip's loud frames
+RANGE_DB = 30.0
+# Quieter than this (relative to the loud frames, or absolute dBFS) is rest
+SILENCE_DB = -35.0
+MIN_SPEECH_DBFS = vad.MIN_SPEECH_DBFS
+# Each frame keeps this much of the previous frame's openness (mouths close slower than they open)
+RELEASE = 0.6
+
+# Band edges in Hz: rounded vowels sit low, open vowels around F1, spread vowels around F2, fricatives high
+LOW_HZ, F1_HZ, F2_HZ, HIGH_HZ, TOP_HZ = 600, 1200, 3000, 4000, 8000
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LIPSYNC_WORKERS", "2")), thread_name_prefix="lipsync")
+
+
+@dataclass
+class LipSyncTrack:
+    fps: float
+    mouth: np.ndarray
+    visemes: str
+
+    @property
+    def seconds(self) -> float:
+        return len(self.mouth) / self.fps
+
+    def to_dict(self) -> dict:
+        return {
+            "fps": self.fps,
+            "mouth": base64.b64encode(self.mouth.tobytes()).decode("ascii"),
+            "visemes": self.visemes,
+        }
+
+
+def analyze_samples(mono: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> LipSyncTrack:
+    """The mouth track of mono float samples."""
+    hop = max(1, sample_rate * frame_ms // 1000)
+    fps = sample_rate / hop
+    n_frames = len(mono) // hop
+    if n_frames == 0:
+        return LipSyncTrack(fps, np.zeros(0, dtype=np.uint8), "")
+    window = 2 * hop
+    padded = np.concatenate((np.zeros(hop // 2, dtype=np.float32), mono.astype(np.float32, copy=False),
+                             np.zeros(window, dtype=np.float32)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, window)[::hop][:n_frames]
+
+    # Loudness relative to the loud frames of the clip, so quiet and loud voices move the mouth alike
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    level_db = 20.0 * np.log10(rms)
+    quiet = level_db < MIN_SPEECH_DBFS
+    level_db -= np.percentile(level_db, 95)
+    openness = np.clip((level_db + RANGE_DB) / RANGE_DB, 0.0, 1.0)
+
+    power = np.abs(np.fft.rfft(frames * np.hanning(window).astype(np.float32), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(window, 1.0 / sample_rate)
+    cumulative = np.cumsum(power, axis=1)
+
+    def band(lo: float, hi: float) -> np.ndarray:
+        lo_bin, hi_bin = np.searchsorted(freqs, (lo, min(hi, freqs[-1])))
+        return cumulative[:, hi_bin] - (cumulative[:, lo_bin - 1] if lo_bin else 0.0)
+
+    total = band(0, TOP_HZ) + 1e-12
+    voiced = band(0, HIGH_HZ) + 1e-12
+    low = band(0, LOW_HZ) / voiced
+    second = band(F1_HZ, F2_HZ) / voiced
+    high = band(HIGH_HZ, TOP_HZ) / total
+    centroid = (power @ freqs) / (cumulative[:, -1] + 1e-12)
+
+    silent = (level_db < SILENCE_DB) | quiet
+    fricative = (high > 0.45) | (centroid > HIGH_HZ)
+    closed = openness < 0.2
+    rounded = (low > 0.75) & (centroid < LOW_HZ + 300)
+    spread = second > 0.3
+    codes = np.select([silent, fricative, closed, rounded, spread], [0, 5, 1, 4, 3], default=2).astype(np.int8)
+    # A one-frame viseme is a flicker, not a mouth shape: hold the previous one
+    if len(codes) > 2:
+        flicker = (codes[1:-1] != codes[:-2]) & (codes[1:-1] != codes[2:])
+        codes[1:-1][flicker] = codes[:-2][flicker]
+
+    # Fricatives barely open the mouth; rest closes it
+    openness = np.where(codes == 5, np.minimum(openness, 0.3), openness)
+    openness = np.where(silent, 0.0, openness)
+    released = np.concatenate(([0.0], openness[:-1] * RELEASE))
+    openness = np.maximum(openness, released)
+    openness = np.convolve(openness, (0.25, 0.5, 0.25), mode="same")
+
+    mouth = np.round(openness * 255).astype(np.uint8)
+    visemes = np.frombuffer(b"XMAEOS", dtype=np.uint8)[codes].tobytes().decode("ascii")
+    return LipSyncTrack(fps, mouth, visemes)
+
+
+def analyze(audio: bytes, audio_format: str = "pcm") -> LipSyncTrack:
+    """The mouth track of a PCM (24 kHz 16-bit mono) or WAV clip."""
+    samples, rate = vad.decode(audio, MIME_TYPES["pcm"] if audio_format == "pcm" else "audio/wav")
+    return analyze_samples(samples.mean(axis=1), rate)
+
+
+def supports(audio_format: str) -> bool:
+    return LIPSYNC_ENABLED and audio_format in FORMATS
+
+
+def _analyze_clip(audio: Union[bytes, str], audio_format: str) -> dict:
+    if isinstance(audio, str):
+        audio = base64.b64decode(audio)
+    return analyze(audio, audio_format).to_dict()
+
+
+async def analyze_async(audio: Union[bytes, str], audio_format: str) -> Optional[dict]:
+    """
+    The compact track for a clip (raw or base64, as reply frames carry it),
+    computed on the lip-sync worker pool; None if the format is unsupported.
+    """
+    if not supports(audio_format) or not audio:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, _analyze_clip, audio, audio_format)
+    except (ValueError, wave.Error, EOFError):
+        return None
@@ -0,0 +1,149 @@
+"""
+Logging pipeline: non-blocking sinks, structured records and sampled hot-path DEBUG.
+
+Every record, from loguru (bot.py, server.py) or the standard logging module
+(everything else, intercepted), goes to one loguru sink on stderr:
+
+- The sink is enqueued (LOG_ENQUEUE): the caller only puts the record on a
+  queue and a background thread does the write, so a slow or blocked stderr
+  never stalls the event loop.
+- Records carry the current turn id and session id (tracing.py) and are written as text or, with LOG_FORMAT=json, one JSON
+  object per line.
+- Hot-path DEBUG events go through per-category loggers (`hot("turn")`) that
+  are sampled (LOG_SAMPLE, e.g. "turn=0.1") and rate limited per second
+  (LOG_RATE_LIMIT, e.g. "*=20,tts=5") before a record is even built. Messages
+  use "{}" placeholders so nothing is formatted for a dropped or filtered
+  event. Dropped records are counted in snowpaws_log_records_dropped_total.
+
+`configure()` is idempotent; bot.py calls it on import and the apps on startup.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict
+
+from loguru import logger
+
+from metrics import Counter
+from tracing import current_session_id, current_turn_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "true").lower() == "true"
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "turn={extra[turn_id]} session={extra[session_id]} | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+LOG_RECORDS_DROPPED = Counter("snowpaws_log_records_dropped_total", "Hot-path log records not written",
+                              ("category", "reason"))
+
+_configured = False
+_min_level_no = logger.level(LOG_LEVEL).no
+
+
+def _rates(value: str) -> Dict[str, float]:
+    """Parse "turn=0.1,tts=0.5" (with "*" as the default for other categories)."""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            category, rate = item.split("=", 1)
+            rates[category.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _rates(os.getenv("LOG_SAMPLE", ""))
+RATE_LIMITS = _rates(os.getenv("LOG_RATE_LIMIT", "*=20"))
+
+
+def _patch(record):
+    extra = record["extra"]
+    if "turn_id" not in extra:
+        extra["turn_id"] = current_turn_id() or "-"
+    if "session_id" not in extra:
+        extra["session_id"] = current_session_id() or "-"
+
+
+class InterceptHandler(logging.Handler):
+    """Forward standard library records into the loguru pipeline."""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Report the caller of logging.*, not this handler
+        frame, depth = sys._getframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+class HotLogger:
+    """DEBUG logging for a per-turn category, sampled and rate limited before any formatting."""
+
+    def __init__(self, category: str):
+        self.category = category
+        self.sample_rate = SAMPLE_RATES.get(category, SAMPLE_RATES.get("*", 1.0))
+        self.rate_limit = RATE_LIMITS.get(category, RATE_LIMITS.get("*", 0.0))
+        self._logger = logger.bind(category=category)
+        self._tokens = self.rate_limit
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        """Whether the next DEBUG record would be written; consumes a rate-limit token if so."""
+        if _min_level_no > 10:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            LOG_RECORDS_DROPPED.inc(category=self.category, reason="sampled")
+            return False
+        if self.rate_limit > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1.0:
+                    LOG_RECORDS_DROPPED.inc(category=self.category, reason="rate_limited")
+                    return False
+                self._tokens -= 1.0
+        return True
+
+    def debug(self, message: str, *args, **kwargs):
+        """Log `message` with "{}" placeholders, formatted only if the record is written."""
+        if self.enabled():
+            self._logger.opt(depth=1).debug(message, *args, **kwargs)
+
+
+_hot: Dict[str, HotLogger] = {}
+
+
+def hot(category: str) -> HotLogger:
+    """The shared sampled logger for `category`."""
+    if category not in _hot:
+        _hot[category] = HotLogger(category)
+    return _hot[category]
+
+
+def configure(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, enqueue: bool = LOG_ENQUEUE, sink=None,
+              force: bool = False):
+    """
+    Install the pipeline: one (enqueued) loguru sink, with standard logging
+    routed into it. Library loggers (openai, httpx, ...) stay at INFO or above.
+    """
+    global _configured, _min_level_no
+    if _configured and not force:
+        return
+    logger.remove()
+    logger.configure(patcher=_patch, extra={"category": "-"})
+    logger.add(sink or sys.stderr, level=level, enqueue=enqueue, serialize=fmt == "json",
+               format=TEXT_FORMAT, backtrace=False, diagnose=False)
+    _min_level_no = logger.level(level).no
+    logging.basicConfig(handlers=[InterceptHandler()], level=max(_min_level_no, logging.INFO), force=True)
+    _configured = True
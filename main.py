@@ -1,19 +1,23 @@
 import os
-import uvicorn
 import logging
 import json
+import threading
+import asyncio
 from fastapi import FastAPI, WebSocket, Request, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from bot import DoctorSnowLeopardBot
 from mangum import Mangum
+from ops_routes import router as ops_router
+from degradation import controller as degradation
+from model_router import router
+from static_assets import StaticAssets
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.include_router(ops_router)
 
 # Add CORS middleware
 app.add_middleware(
@@ -43,31 +47,63 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"message": "Internal server error", "detail": str(exc)},
     )
 
-# Create bot instance
-try:
-    logger.info("Initializing Dr. Snow Paws bot...")
-    bot = DoctorSnowLeopardBot()
-    logger.info("Bot initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing bot: {str(e)}", exc_info=True)
-    bot = None
+# The bot (and the OpenAI SDK behind it) is created on first use, so a
+# serverless cold start only pays for it when a chat actually arrives
+bot = None
+bot_error = None
+_bot_lock = threading.Lock()
+
+def get_bot():
+    """Create the bot on first call; returns None if initialization failed."""
+    global bot, bot_error
+    if bot is None and bot_error is None:
+        with _bot_lock:
+            if bot is None and bot_error is None:
+                try:
+                    logger.info("Initializing Dr. Snow Paws bot...")
+                    from bot import DoctorSnowLeopardBot
+                    bot = DoctorSnowLeopardBot()
+                    logger.info("Bot initialized successfully")
+                except Exception as e:
+                    logger.error(f"Error initializing bot: {str(e)}", exc_info=True)
+                    bot_error = str(e)
+    return bot
+
+async def load_bot():
+    """get_bot() from the event loop: the build (or the wait for a preload holding the lock) runs on a thread."""
+    if bot is not None or bot_error is not None:
+        return bot
+    return await asyncio.get_running_loop().run_in_executor(None, get_bot)
+
+@app.on_event("startup")
+async def configure_logging():
+    # Non-blocking log pipeline (logging_setup.py); imported here to keep cold imports cheap
+    import logging_setup
+    logging_setup.configure()
+
+@app.on_event("startup")
+async def preload_bot():
+    # Long-running servers warm the bot in the background instead of on the first chat
+    if os.getenv("PRELOAD_BOT", "false").lower() == "true":
+        asyncio.get_running_loop().run_in_executor(None, get_bot)
+        # Static assets too, so the first page view doesn't wait for them to be compressed
+        asyncio.ensure_future(static_assets.load())
 
 # Determine the static directory path
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 logger.info(f"Static directory: {static_dir}")
 
-# Mount static files with absolute path
-try:
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-    logger.info("Static files mounted successfully")
-except Exception as e:
-    logger.error(f"Error mounting static files: {str(e)}", exc_info=True)
+# Mount static files with absolute path; CSS/JS/HTML are served precompressed from memory,
+# loaded on a worker thread on the first static request (or at startup with PRELOAD_BOT)
+static_assets = StaticAssets(static_dir)
+app.mount("/static", static_assets, name="static")
 
 # Add the bot's chat endpoint
 @app.websocket("/chat")
 async def chat_endpoint(websocket: WebSocket):
     try:
         logger.info("WebSocket connection attempt")
+        bot = await load_bot()
         
         if bot is None:
             await websocket.accept()
@@ -91,8 +127,11 @@ async def chat_endpoint(websocket: WebSocket):
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     try:
+        response = await static_assets.page("index.html", request)
+        if response:
+            return response
         return FileResponse(os.path.join(static_dir, "index.html"))
     except Exception as e:
         logger.error(f"Error serving index.html: {str(e)}", exc_info=True)
@@ -104,17 +143,25 @@ async def root():
 # Add a health check endpoint
 @app.get("/health")
 async def health_check():
+    # Health checks don't force the bot to load; "bot_loaded" is false until the first chat
     status = {
         "status": "ok",
+        "bot_loaded": bot is not None or bot_error is not None,
         "bot_initialized": bot is not None,
+        "bot_error": bot_error,
         "tts_enabled": bot.tts_enabled if bot else False,
-        "openai_available": bot.client is not None if bot else False
+        "openai_available": bot.client is not None if bot else False,
+        "degradation": degradation.snapshot(),
+        "model_routing": router.snapshot()
     }
     return status
 
 @app.get("/websocket-test")
-async def websocket_test():
+async def websocket_test(request: Request):
     try:
+        response = await static_assets.page("websocket-test.html", request)
+        if response:
+            return response
         return FileResponse(os.path.join(static_dir, "websocket-test.html"))
     except Exception as e:
         logger.error(f"Error serving websocket-test.html: {str(e)}", exc_info=True)
@@ -127,6 +174,8 @@ async def websocket_test():
 handler = Mangum(app)
 
 if __name__ == "__main__":
+    import uvicorn
+
     # Get port from environment variable or use 8000 as default
     port = int(os.environ.get("PORT", 8000))
     logger.info(f"Starting server on port {port}")
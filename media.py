@@ -0,0 +1,245 @@
+"""
+Cache-validating, range-aware file responses for the avatar videos.
+
+Serves a file with a strong content-hash ETag, conditional 304s
+(If-None-Match / If-Modified-Since), If-Range, and RFC 9110 byte ranges
+including suffix ranges, multi-range multipart/byteranges bodies and 416s.
+Bodies go through the ASGI "http.response.pathsend" extension when the server
+offers it (zero-copy sendfile); otherwise they are read with os.pread in large
+blocks on the threadpool, so the event loop never blocks on disk.
+"""
+import hashlib
+import logging
+import os
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = int(os.getenv("MEDIA_READ_BLOCK_SIZE", str(1024 * 1024)))
+# More ranges than this in one request is treated as abuse and answered with the full file
+MAX_RANGES = 16
+
+# path -> (size, mtime_ns, etag)
+_etag_cache: Dict[str, Tuple[int, int, str]] = {}
+
+
+class RangeNotSatisfiable(Exception):
+    """No requested range overlaps the file."""
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(READ_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def file_etag(path: str, st: os.stat_result) -> str:
+    """Strong ETag from the file contents, recomputed only when size or mtime change."""
+    cached = _etag_cache.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    etag = f'"{await run_in_threadpool(_hash_file, path)}"'
+    _etag_cache[path] = (st.st_size, st.st_mtime_ns, etag)
+    return etag
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a Range header into sorted, merged inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (not a bytes range, malformed,
+    or too many ranges), and raises RangeNotSatisfiable when no range overlaps.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length < 0:
+                    return None
+                if length == 0:
+                    continue
+                ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        if end < start:
+            return None
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class MediaFileResponse(Response):
+    """Range-aware file response; build it with `media_response`."""
+
+    def __init__(self, path: str, size: int, ranges: Optional[List[Tuple[int, int]]],
+                 headers: Dict[str, str], media_type: str, send_body: bool = True):
+        super().__init__(status_code=206 if ranges else 200, headers=headers)
+        self.path = path
+        self.size = size
+        self.ranges = ranges
+        self.send_body = send_body
+        self.parts: List[Tuple[bytes, int, int]] = []
+
+        if ranges and len(ranges) > 1:
+            boundary = secrets.token_hex(12)
+            self.boundary_end = f"\r\n--{boundary}--\r\n".encode()
+            length = len(self.boundary_end)
+            for start, end in ranges:
+                part_header = (
+                    f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode()
+                self.parts.append((part_header, start, end))
+                length += len(part_header) + end - start + 1
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        else:
+            self.headers["content-type"] = media_type
+            if ranges:
+                start, end = ranges[0]
+                self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+                length = end - start + 1
+            else:
+                length = size
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if not self.ranges and "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        try:
+            if not self.ranges:
+                await self._send_span(send, fd, 0, self.size - 1, more=False)
+            elif not self.parts:
+                start, end = self.ranges[0]
+                await self._send_span(send, fd, start, end, more=False)
+            else:
+                for part_header, start, end in self.parts:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                    await self._send_span(send, fd, start, end, more=True)
+                await send({"type": "http.response.body", "body": self.boundary_end, "more_body": False})
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    async def _send_span(send: Send, fd: int, start: int, end: int, more: bool):
+        offset = start
+        remaining = end - start + 1
+        if remaining <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": more})
+            return
+        while remaining > 0:
+            block = await run_in_threadpool(os.pread, fd, min(READ_BLOCK_SIZE, remaining), offset)
+            if not block:
+                raise RuntimeError("File shrank while being served")
+            offset += len(block)
+            remaining -= len(block)
+            await send({"type": "http.response.body", "body": block, "more_body": more or remaining > 0})
+
+
+async def media_response(path: str, request_headers: Headers, media_type: str,
+                         extra_headers: Optional[Dict[str, str]] = None, method: str = "GET") -> Response:
+    """
+    Response for `path` honoring conditional and range request headers.
+
+    Args:
+        path: File to serve; must exist.
+        request_headers: The incoming request's headers.
+        media_type: Content-Type for the file.
+        extra_headers: Caching/CORS headers added to every response.
+        method: HEAD responses carry the headers without a body.
+
+    Returns:
+        A 200/206 MediaFileResponse, a 304, or a 416.
+    """
+    st = await run_in_threadpool(os.stat, path)
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(path)
+    size = st.st_size
+    etag = await file_etag(path, st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    headers = dict(extra_headers or {})
+    headers.update({"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"})
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        since = request_headers.get("if-modified-since")
+        not_modified = since is not None and _not_modified_since(since, st.st_mtime)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request_headers.get("range")
+    if range_header and method in ("GET", "HEAD"):
+        if_range = request_headers.get("if-range")
+        # If-Range uses strong comparison for ETags and an exact match for dates
+        if if_range is None or if_range.strip() in (etag, last_modified):
+            try:
+                ranges = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+            if ranges == [(0, size - 1)]:
+                ranges = None
+
+    return MediaFileResponse(path, size, ranges, headers, media_type, send_body=method != "HEAD")
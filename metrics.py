@@ -0,0 +1,255 @@
+"""
+Minimal Prometheus-style metrics for the turn pipeline.
+
+Everything here is plain in-process counters updated from the event loop, so
+recording a sample costs a dict lookup and a bisect. `render()` produces the
+Prometheus text exposition format for the /metrics endpoint.
+"""
+import asyncio
+import os
+import resource
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for a 50ms - 20s upstream-bound pipeline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+
+# Pipeline stages; spans with these names (see tracing.span) feed STAGE_SECONDS
+STAGES = (
+    "guardrail_in", "guardrail_out", "detect", "translate_in", "translate_out",
+    "completion", "tts", "lipsync", "encode", "send", "vad", "session_load", "session_save",
+)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Compute the values lazily at scrape time instead of on every update."""
+        self.function = function
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        values = self.function() if self.function else self.values
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self.values.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def totals(self, **labels) -> Tuple[int, float]:
+        """(observation count, sum of observed values) for one label set."""
+        series = self.values.get(self._key(labels))
+        return (int(sum(series[:-1])), series[-1]) if series else (0, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram(
+    "snowpaws_stage_seconds", "Time spent in each turn pipeline stage", ["stage"]
+)
+TURN_TTFB_SECONDS = Histogram(
+    "snowpaws_turn_ttfb_seconds", "Time from message received to first byte sent", ["endpoint"]
+)
+TURN_SECONDS = Histogram(
+    "snowpaws_turn_seconds", "Total turn latency from message received to last frame sent", ["endpoint"]
+)
+TURN_FIRST_AUDIO_SECONDS = Histogram(
+    "snowpaws_turn_first_audio_seconds",
+    "Perceived latency: message received to first audio sent (acknowledgement clip or answer)",
+    ["endpoint", "source"]
+)
+ACTIVE_CONNECTIONS = Gauge(
+    "snowpaws_active_connections", "Open chat WebSocket connections", ["endpoint"]
+)
+IN_FLIGHT_TURNS = Gauge(
+    "snowpaws_in_flight_turns", "Turns currently being answered", ["endpoint"]
+)
+UPSTREAM_CALLS = Counter(
+    "snowpaws_upstream_calls_total", "Upstream API calls by endpoint, model and outcome",
+    ["endpoint", "model", "outcome"],
+)
+CACHE_REQUESTS = Counter(
+    "snowpaws_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+CACHE_HIT_RATIO = Gauge("snowpaws_cache_hit_ratio", "Cache hit ratio since start", ["cache"])
+VAD_AUDIO_BYTES = Counter(
+    "snowpaws_vad_audio_bytes_total", "Recording bytes before and after silence trimming", ["direction"]
+)
+VAD_AUDIO_SECONDS = Counter(
+    "snowpaws_vad_audio_seconds_total", "Recording duration before and after silence trimming", ["direction"]
+)
+
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.values.items():
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_total[1] += value
+        if result == "hit":
+            hits_and_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratios)
+
+TTS_AUDIO_BYTES = Counter(
+    "snowpaws_tts_audio_bytes_total", "Synthesized speech bytes by audio format", ["format"]
+)
+TTS_AUDIO_SECONDS = Counter(
+    "snowpaws_tts_audio_seconds_total", "Synthesized speech duration by audio format", ["format"]
+)
+TTS_BYTES_PER_SECOND = Gauge(
+    "snowpaws_tts_bytes_per_speech_second", "Synthesized bytes per second of speech by audio format", ["format"]
+)
+
+
+def _tts_bytes_per_second() -> Dict[Tuple[str, ...], float]:
+    return {
+        key: TTS_AUDIO_BYTES.values[key] / seconds
+        for key, seconds in TTS_AUDIO_SECONDS.values.items() if seconds and key in TTS_AUDIO_BYTES.values
+    }
+
+
+TTS_BYTES_PER_SECOND.set_function(_tts_bytes_per_second)
+
+EVENT_LOOP_LAG = Histogram(
+    "snowpaws_event_loop_lag_seconds", "Delay of a periodic timer on the event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PROCESS_RSS = Gauge("snowpaws_process_resident_memory_bytes", "Resident memory of this process")
+
+
+def _resident_memory() -> Dict[Tuple[str, ...], float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return {(): float(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))}
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS, but better than nothing off Linux
+        return {(): float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)}
+
+
+PROCESS_RSS.set_function(_resident_memory)
+
+_loop_lag_task: Optional["asyncio.Task"] = None
+
+
+async def _monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled - interval))
+
+
+def start_loop_lag_monitor(interval: float = 0.25):
+    """Start the event-loop lag sampler once per process; safe to call on every connection."""
+    global _loop_lag_task
+    if _loop_lag_task is None or _loop_lag_task.done():
+        _loop_lag_task = asyncio.get_running_loop().create_task(_monitor_loop_lag(interval))
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
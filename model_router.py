@@ -0,0 +1,238 @@
+"""
+Model-tier routing for chat completions and safety checks.
+
+Each turn is classified locally (no upstream call) by length, intent and risk
+and sent to a tier from the MODEL_TIERS table:
+
+    light     short small talk ("I like dogs")
+    standard  medical questions, long messages, anything unclassified
+    heavy     risky topics (surgery, medicine doses, emergencies, self-harm)
+
+The router keeps a moving average of latency and error rate per purpose and
+tier. A tier that is slower than MODEL_ROUTER_SLOW_SECONDS_<PURPOSE> or
+failing is skipped in favour of the next healthy one in FAILOVER, and gets
+one probe request every MODEL_ROUTER_PROBE_SECONDS so it can recover.
+Routing is off unless MODEL_ROUTING=true; call sites then keep their model.
+The routing mix and per-tier statistics are exported at /metrics and /health.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("light", "standard", "heavy")
+DEFAULT_TIERS = "light=gpt-4o-mini,standard=gpt-4o,heavy=gpt-4"
+# Where a tier's traffic goes while it is unhealthy, in order of preference
+FAILOVER = {
+    "light": ("standard", "heavy"),
+    "standard": ("heavy", "light"),
+    "heavy": ("standard",),
+}
+SLOW_SECONDS = {"chat": 4.0, "guardrail": 2.0}
+
+RISK_WORDS = (
+    "surgery", "operation", "blood", "bleeding", "emergency", "overdose", "dose", "pills", "poison",
+    "allergic", "can't breathe", "unconscious", "suicide", "kill myself", "hurt myself", "die", "abuse",
+    "cirugía", "operación", "sangre", "emergencia", "sobredosis", "pastillas", "veneno", "alérgico", "morir",
+)
+MEDICAL_WORDS = (
+    "doctor", "sick", "pain", "hurt", "fever", "cough", "tummy", "stomach", "throat", "ear", "rash",
+    "dizzy", "medicine", "shot", "vaccine", "broken", "cast", "hospital", "nurse",
+    "enfermo", "dolor", "duele", "fiebre", "tos", "barriga", "garganta", "medicina", "vacuna", "hospital",
+)
+SHORT_WORDS = 8
+LONG_WORDS = 25
+
+ROUTES = Counter("snowpaws_model_routes_total", "Requests routed per purpose, tier and reason",
+                 ("purpose", "tier", "reason"))
+TIER_LATENCY = Gauge("snowpaws_model_tier_latency_seconds", "Moving average latency per purpose and tier",
+                     ("purpose", "tier"))
+TIER_ERROR_RATE = Gauge("snowpaws_model_tier_error_rate", "Moving average error rate per purpose and tier",
+                        ("purpose", "tier"))
+
+_WORD = re.compile(r"\w+(?:'\w+)?")
+
+
+def _word_pattern(words: Iterable[str]) -> "re.Pattern":
+    return re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b")
+
+
+_RISK = _word_pattern(RISK_WORDS)
+_MEDICAL = _word_pattern(MEDICAL_WORDS)
+
+
+def classify(text: str) -> Tuple[str, str]:
+    """(tier, reason) for a message, from its length, intent and risk."""
+    lower = text.lower()
+    if _RISK.search(lower):
+        return "heavy", "risk"
+    words = len(_WORD.findall(lower))
+    if words >= LONG_WORDS:
+        return "standard", "long"
+    if _MEDICAL.search(lower):
+        return "standard", "medical"
+    if words <= SHORT_WORDS:
+        return "light", "small_talk"
+    return "standard", "default"
+
+
+@dataclass
+class Route:
+    purpose: str
+    tier: str
+    model: str
+    reason: str
+
+
+class TierStats:
+    """Exponentially weighted latency and error rate of one purpose/tier."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.last_call = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        self.calls += 1
+        self.last_call = time.monotonic()
+
+
+class ModelRouter:
+    """Picks a model tier per request and fails over when a tier is slow or failing."""
+
+    def __init__(self, tiers: Dict[str, str], enabled: bool = True, guardrail_min_tier: str = "standard",
+                 slow_seconds: Optional[Dict[str, float]] = None, max_error_rate: float = 0.5,
+                 probe_seconds: float = 30.0):
+        unknown = (set(tiers) | {guardrail_min_tier}) - set(TIERS)
+        if unknown:
+            raise ValueError(f"Unknown model tiers: {', '.join(sorted(unknown))}")
+        self.tiers = tiers
+        self.enabled = enabled
+        self.guardrail_min_tier = guardrail_min_tier
+        self.slow_seconds = dict(SLOW_SECONDS, **(slow_seconds or {}))
+        self.max_error_rate = max_error_rate
+        self.probe_seconds = probe_seconds
+        self.stats: Dict[Tuple[str, str], TierStats] = {}
+        TIER_LATENCY.set_function(lambda: {key: s.latency for key, s in self.stats.items() if s.latency is not None})
+        TIER_ERROR_RATE.set_function(lambda: {key: s.error_rate for key, s in self.stats.items()})
+
+    def degraded(self, purpose: str, tier: str) -> bool:
+        """True while the tier's recent calls are slow or failing."""
+        stats = self.stats.get((purpose, tier))
+        if stats is None or stats.latency is None:
+            return False
+        return stats.latency > self.slow_seconds.get(purpose, 4.0) or stats.error_rate >= self.max_error_rate
+
+    def _available(self, purpose: str, tier: str) -> bool:
+        if not self.degraded(purpose, tier):
+            return True
+        stats = self.stats[(purpose, tier)]
+        if time.monotonic() - stats.last_call >= self.probe_seconds:
+            # Let one request through so a recovered tier is noticed
+            stats.last_call = time.monotonic()
+            return True
+        return False
+
+    def route(self, text: str, purpose: str, default: str) -> Route:
+        """The model for `text`; `default` is the call site's model, used when routing is off."""
+        return self.route_all((text,), purpose, default)
+
+    def route_all(self, texts: Iterable[str], purpose: str, default: str) -> Route:
+        """One route for a request covering several texts: the heaviest tier any of them needs."""
+        if not self.enabled:
+            route = Route(purpose, "fixed", default, "disabled")
+        else:
+            tier, reason = max((classify(text) for text in texts), key=lambda c: TIERS.index(c[0]))
+            if purpose == "guardrail" and TIERS.index(tier) < TIERS.index(self.guardrail_min_tier):
+                tier = self.guardrail_min_tier
+            if not self._available(purpose, tier):
+                candidates = FAILOVER[tier]
+                if purpose == "guardrail":
+                    # Failover never takes safety checks below their minimum tier
+                    candidates = [t for t in candidates if TIERS.index(t) >= TIERS.index(self.guardrail_min_tier)]
+                fallback = next((t for t in candidates if t in self.tiers and self._available(purpose, t)), None)
+                if fallback is not None:
+                    logger.info(f"Model tier {tier} unhealthy for {purpose}, routing to {fallback}")
+                    tier, reason = fallback, "failover"
+            route = Route(purpose, tier, self.tiers.get(tier, default), reason)
+        ROUTES.inc(purpose=purpose, tier=route.tier, reason=route.reason)
+        return route
+
+    @contextlib.contextmanager
+    def track(self, route: Route):
+        """
+        Record the latency and outcome of the upstream call made for `route`.
+        A cancelled call (barge-in, disconnect) says nothing about the tier and is not recorded.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(route, start, ok=False)
+            raise
+        self._record(route, start, ok=True)
+
+    def _record(self, route: Route, start: float, ok: bool):
+        self.stats.setdefault((route.purpose, route.tier), TierStats()).record(time.perf_counter() - start, ok)
+
+    def tracked(self, route: Route, factory: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        """Wrap an upstream call factory so every attempt is recorded for `route`."""
+        async def call():
+            with self.track(route):
+                return await factory()
+        return call
+
+    def snapshot(self) -> dict:
+        mix = {}
+        for (purpose, tier, reason), count in ROUTES.values.items():
+            mix.setdefault(purpose, {}).setdefault(tier, 0)
+            mix[purpose][tier] += int(count)
+        return {
+            "enabled": self.enabled,
+            "tiers": self.tiers,
+            "mix": mix,
+            "stats": {
+                f"{purpose}/{tier}": {
+                    "latency_seconds": round(s.latency, 4) if s.latency is not None else None,
+                    "error_rate": round(s.error_rate, 3),
+                    "calls": s.calls,
+                    "degraded": self.degraded(purpose, tier),
+                }
+                for (purpose, tier), s in self.stats.items()
+            },
+        }
+
+
+def _from_env() -> ModelRouter:
+    tiers = dict(
+        item.strip().split("=", 1) for item in os.getenv("MODEL_TIERS", DEFAULT_TIERS).split(",") if "=" in item
+    )
+    slow_seconds = {
+        purpose: float(os.getenv(f"MODEL_ROUTER_SLOW_SECONDS_{purpose.upper()}", str(default)))
+        for purpose, default in SLOW_SECONDS.items()
+    }
+    return ModelRouter(
+        {tier.strip(): model.strip() for tier, model in tiers.items()},
+        enabled=os.getenv("MODEL_ROUTING", "false").lower() == "true",
+        guardrail_min_tier=os.getenv("MODEL_ROUTER_GUARDRAIL_MIN_TIER", "standard"),
+        slow_seconds=slow_seconds,
+        max_error_rate=float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.5")),
+        probe_seconds=float(os.getenv("MODEL_ROUTER_PROBE_SECONDS", "30")),
+    )
+
+
+router = _from_env()
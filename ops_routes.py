@@ -0,0 +1,48 @@
+"""
+Operational endpoints shared by the FastAPI entry points (main.py, server.py, simple_app.py).
+
+The /debug routes are admin-only: they are disabled unless ADMIN_TOKEN is set,
+and require it in the X-Admin-Token header.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+import metrics
+from profiling import profile_process
+from tracing import export_traces
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    metrics.start_loop_lag_monitor()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/traces", dependencies=[Depends(require_admin)])
+async def traces_endpoint(limit: int = 50, turn_id: Optional[str] = None):
+    """Recent per-turn traces as JSON, newest first."""
+    return {"traces": export_traces(limit=limit, turn_id=turn_id)}
+
+
+@router.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def profile_endpoint(seconds: float = 5.0, interval_ms: float = 5.0, top: int = 25):
+    """Time-boxed sampling CPU profile of the event loop plus a tracemalloc snapshot."""
+    try:
+        return await profile_process(seconds=seconds, interval=interval_ms / 1000, top=top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,104 @@
+"""
+On-demand profiling of the live process.
+
+`profile_process` samples the event-loop thread's Python stack from a helper
+thread for a bounded time (so it sees exactly what is blocking the loop) and
+takes a tracemalloc snapshot at the end.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict
+
+MAX_PROFILE_SECONDS = float(os.getenv("MAX_PROFILE_SECONDS", "30"))
+# Shorter intervals would have the sampler thread spin on the serving process
+MIN_PROFILE_INTERVAL = 0.001
+
+# Frames that mean the loop is idle, waiting in the selector
+_IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "_run_once"}
+
+_profile_lock = asyncio.Lock()
+
+
+def _collapse(frame, max_depth: int = 40) -> str:
+    """Render a frame stack as 'file:function:line;...' from outermost to innermost."""
+    parts = []
+    while frame is not None and len(parts) < max_depth:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> Dict[str, Any]:
+    """Sample one thread's stack every `interval` seconds; runs off the sampled thread."""
+    stacks: Counter = Counter()
+    samples = busy = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            if frame.f_code.co_name not in _IDLE_FUNCTIONS:
+                busy += 1
+                stacks[_collapse(frame)] += 1
+        time.sleep(interval)
+    return {"samples": samples, "busy_samples": busy, "stacks": stacks}
+
+
+async def profile_process(seconds: float = 5.0, interval: float = 0.005, top: int = 25) -> Dict[str, Any]:
+    """
+    Run a time-boxed sampling CPU profile of the event loop plus a tracemalloc snapshot.
+
+    Args:
+        seconds: Profile duration, capped at MAX_PROFILE_SECONDS
+        interval: Sampling interval in seconds, at least MIN_PROFILE_INTERVAL
+        top: Number of stacks and allocation sites to return
+
+    Returns:
+        dict with the busiest loop stacks and the largest allocation sites
+
+    Raises:
+        ValueError: If the interval is shorter than MIN_PROFILE_INTERVAL (or not a number)
+    """
+    if not interval >= MIN_PROFILE_INTERVAL:
+        raise ValueError(f"Sampling interval must be at least {MIN_PROFILE_INTERVAL * 1000:g} ms")
+    seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+    async with _profile_lock:
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(10)
+        try:
+            loop_thread = threading.get_ident()
+            result = await asyncio.to_thread(sample_stacks, loop_thread, seconds, interval)
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+    samples = result["samples"] or 1
+    stats = snapshot.statistics("lineno")
+    return {
+        "duration_seconds": seconds,
+        "interval_seconds": interval,
+        "samples": result["samples"],
+        "loop_busy_ratio": result["busy_samples"] / samples,
+        "stacks": [
+            {"stack": stack, "samples": count, "ratio": count / samples}
+            for stack, count in result["stacks"].most_common(top)
+        ],
+        "tracemalloc": {
+            # Allocations are only tracked while tracing, so a fresh start
+            # reports what was allocated during the profile window
+            "tracing_since_start": not started_tracemalloc,
+            "total_bytes": sum(stat.size for stat in stats),
+            "top": [
+                {"site": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                for stat in stats[:top]
+            ],
+        },
+    }
@@ -0,0 +1,268 @@
+"""
+Near-duplicate response cache: previously approved replies for rephrased questions.
+
+Children ask the same few dozen things in endless phrasings ("will the shot
+hurt", "does the needle hurt", "is the shot gonna hurt?"). Approved replies
+are stored against their question, embedded locally with a hashing
+vectorizer (word unigrams and bigrams plus character n-grams, after folding
+common kid synonyms like needle -> shot), and looked up with a NumPy cosine
+search. A question scoring at least SEMANTIC_CACHE_THRESHOLD against a stored
+one gets its reply without the completion, output check or translation.
+Questions the model router sends to its heavy tier for risk (medicine doses,
+emergencies, self-harm) are never stored or answered from the cache: one
+extra word there changes what a safe answer is.
+
+Entries are partitioned by language, expire after SEMANTIC_CACHE_TTL_SECONDS
+and, with SEMANTIC_CACHE_MAX_HITS, are regenerated after being served that
+many times. Only the reply text and emotion are kept: the audio comes from the
+audio cache, which is keyed by the exact reply text.
+"""
+import logging
+import os
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from metrics import CACHE_REQUESTS, Gauge, Histogram
+from model_router import classify
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_HITS = int(os.getenv("SEMANTIC_CACHE_MAX_HITS", "0"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+
+SEMANTIC_LOOKUP_SECONDS = Histogram(
+    "snowpaws_semantic_cache_lookup_seconds", "Semantic cache lookup time, vectorizing included",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+SEMANTIC_ENTRIES = Gauge("snowpaws_semantic_cache_entries", "Semantic cache entries per language", ("language",))
+
+# Words children use interchangeably, folded before hashing
+SYNONYMS = {
+    "needle": "shot", "injection": "shot", "jab": "shot", "vaccine": "shot", "gonna": "going",
+    "tummy": "stomach", "belly": "stomach", "hurts": "hurt", "hurting": "hurt", "painful": "hurt", "ouch": "hurt",
+    "sting": "hurt", "doc": "doctor", "pill": "medicine", "scary": "scared", "afraid": "scared",
+    "frightened": "scared", "nervous": "scared", "yucky": "bad", "gross": "bad", "yuck": "bad",
+    "kitty": "cat", "puppy": "dog", "doggy": "dog",
+    "inyección": "vacuna", "inyeccion": "vacuna", "aguja": "vacuna", "pinchazo": "vacuna",
+    "barriga": "estómago", "panza": "estómago", "pancita": "estómago", "duele": "doler", "dolerá": "doler",
+    "dolor": "doler", "miedo": "asustado", "asustada": "asustado",
+}
+# Multi-word spellings, folded before tokenizing
+PHRASES = (
+    (re.compile(r"\bx[- ]?rays?\b"), "xray"),
+    (re.compile(r"\bhow come\b"), "why"),
+    (re.compile(r"\bpor qu[eé]\b"), "porqué"),
+)
+# Kept, but they say less about the topic than content words
+QUESTION_WORDS = {"why", "what", "how", "when", "where", "who", "porqué", "qué", "cómo", "cuándo", "dónde"}
+STOPWORDS = {
+    "the", "a", "an", "is", "are", "am", "was", "it", "will", "would", "does", "do", "did", "to", "be", "going",
+    "i", "me", "my", "you", "your", "we", "our", "us", "they", "this", "that", "these", "those", "there", "of",
+    "and", "or", "so", "on", "in", "for", "at", "with", "from", "about", "have", "has", "had", "need", "get",
+    "got", "can", "could", "should", "make", "feel", "really", "very", "lot", "much", "just", "please", "kid",
+    "hey", "um", "uh", "thing", "mean", "happen", "work", "around",
+    "el", "la", "los", "las", "un", "una", "mi", "tu", "es", "va", "de", "y", "o", "muy", "mucho", "por",
+    "favor", "que", "se", "lo", "le", "me", "te",
+}
+# Numbers are kept: "a fever of 105" is not "a fever"
+_TOKEN = re.compile(r"[^\W_]+")
+_CONTRACTION = re.compile(r"'(?:s|m|re|ll|ve|d)\b")
+
+
+def _normalize(word: str) -> str:
+    word = SYNONYMS.get(word, word)
+    # Plurals and verb -s: shots -> shot, hands -> hand, vacunas -> vacuna
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = SYNONYMS.get(word[:-1], word[:-1])
+    return word
+
+
+def features(text: str) -> Dict[str, float]:
+    """Weighted features of a question: content words, adjacent pairs and character n-grams."""
+    text = _CONTRACTION.sub("", text.lower().replace("\u2019", "'"))
+    for pattern, replacement in PHRASES:
+        text = pattern.sub(replacement, text)
+    tokens = _TOKEN.findall(text)
+    # Stopwords go before stemming, which would turn them into content words ("does" -> "doe")
+    content = [word for word in (_normalize(token) for token in tokens if token not in STOPWORDS)
+               if word not in STOPWORDS]
+    content = content or [_normalize(token) for token in tokens]
+    weights: Dict[str, float] = {}
+    for word in content:
+        weight = 0.5 if word in QUESTION_WORDS else 1.0
+        weights["w:" + word] = weights.get("w:" + word, 0.0) + weight
+        if len(word) >= 5:
+            # Character n-grams catch misspellings ("stomache") and inflections
+            padded = f"<{word}>"
+            for i in range(len(padded) - 3):
+                weights["c:" + padded[i:i + 4]] = weights.get("c:" + padded[i:i + 4], 0.0) + 0.1 * weight
+    topical = [word for word in content if word not in QUESTION_WORDS]
+    for first, second in zip(topical, topical[1:]):
+        weights[f"b:{first} {second}"] = weights.get(f"b:{first} {second}", 0.0) + 0.5
+    return weights
+
+
+def cacheable(question: str) -> bool:
+    """Whether a question may be stored or answered from the cache (not a risky one)."""
+    return classify(question) != ("heavy", "risk")
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """Unit-length hashed embedding of `text` (stable across processes)."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in features(text).items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+@dataclass
+class CachedReply:
+    text: str
+    emotion: str
+    language: str
+    question: str
+    similarity: float
+
+
+class _Partition:
+    """
+    Embeddings and replies for one language, in growable preallocated arrays.
+
+    Embeddings are stored one row per hashed dimension, so a search only reads
+    the rows where the (sparse) query is non-zero instead of the whole matrix.
+    """
+
+    def __init__(self, dim: int, max_entries: int):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.vectors = np.zeros((dim, 0), dtype=np.float32)
+        self.created = np.zeros(0)  # 0 marks a free slot
+        self.last_used = np.zeros(0)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.values: List[Optional[tuple]] = []
+        self.size = 0
+        self.free: List[int] = []
+
+    def __len__(self) -> int:
+        return self.size - len(self.free)
+
+    def valid(self, now: float, ttl: float, max_hits: int) -> np.ndarray:
+        created = self.created[:self.size]
+        mask = (created > 0) & (created > now - ttl)
+        if max_hits:
+            mask &= self.hits[:self.size] < max_hits
+        return mask
+
+    def best(self, vector: np.ndarray, mask: np.ndarray):
+        if not mask.any():
+            return None, -1.0
+        dims = np.flatnonzero(vector)
+        scores = vector[dims] @ self.vectors[dims, :self.size]
+        scores[~mask] = -1.0
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def _grow(self):
+        capacity = min(self.max_entries, max(64, len(self.values) * 2))
+        extra = capacity - len(self.values)
+        self.vectors = np.hstack([self.vectors, np.zeros((self.dim, extra), dtype=np.float32)])
+        self.created = np.concatenate([self.created, np.zeros(extra)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra)])
+        self.hits = np.concatenate([self.hits, np.zeros(extra, dtype=np.int64)])
+        self.values.extend([None] * extra)
+
+    def slot(self, now: float, ttl: float, max_hits: int) -> int:
+        """A slot for a new entry, reclaiming stale ones or evicting the least recently used when full."""
+        if self.free:
+            return self.free.pop()
+        if self.size < len(self.values):
+            self.size += 1
+            return self.size - 1
+        if len(self.values) < self.max_entries:
+            self._grow()
+            self.size += 1
+            return self.size - 1
+        stale = np.flatnonzero(~self.valid(now, ttl, max_hits))
+        if len(stale):
+            for index in stale[1:]:
+                self.release(int(index))
+            return int(stale[0])
+        return int(np.argmin(self.last_used[:self.size]))
+
+    def release(self, index: int):
+        self.created[index] = 0
+        self.values[index] = None
+        self.free.append(index)
+
+
+class SemanticCache:
+    """Approved replies looked up by question similarity, one partition per language."""
+
+    def __init__(self, threshold: float = THRESHOLD, ttl: float = TTL_SECONDS, max_hits: int = MAX_HITS,
+                 max_entries: int = MAX_ENTRIES, dim: int = DIM):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_hits = max_hits
+        self.max_entries = max_entries
+        self.dim = dim
+        self.partitions: Dict[str, _Partition] = {}
+        SEMANTIC_ENTRIES.set_function(lambda: {(language,): len(p) for language, p in self.partitions.items()})
+
+    def get(self, question: str, language: str) -> Optional[CachedReply]:
+        """The stored reply for the most similar question in `language`, if similar enough."""
+        start = time.perf_counter()
+        partition = self.partitions.get(language)
+        hit = None
+        if partition is not None and partition.size and cacheable(question):
+            now = time.time()
+            index, score = partition.best(embed(question, self.dim), partition.valid(now, self.ttl, self.max_hits))
+            if index is not None and score >= self.threshold:
+                partition.hits[index] += 1
+                partition.last_used[index] = now
+                text, emotion, stored_question = partition.values[index]
+                hit = CachedReply(text, emotion, language, stored_question, score)
+        SEMANTIC_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        CACHE_REQUESTS.inc(cache="semantic", result="hit" if hit else "miss")
+        return hit
+
+    def put(self, question: str, language: str, text: str, emotion: str, dedupe: bool = True):
+        """
+        Store an approved reply. A near-identical stored question is replaced
+        rather than duplicated; bulk loads can skip that search with dedupe=False.
+        """
+        if not question.strip() or not text or not cacheable(question):
+            return
+        partition = self.partitions.get(language)
+        if partition is None:
+            partition = self.partitions[language] = _Partition(self.dim, self.max_entries)
+        now = time.time()
+        vector = embed(question, self.dim)
+        index, score = partition.best(vector, partition.valid(now, self.ttl, self.max_hits)) if dedupe else (None, 0.0)
+        if index is None or score < 0.98:
+            index = partition.slot(now, self.ttl, self.max_hits)
+        partition.vectors[:, index] = vector
+        partition.created[index] = now
+        partition.last_used[index] = now
+        partition.hits[index] = 0
+        partition.values[index] = (text, emotion, question)
+
+    def clear(self, language: Optional[str] = None):
+        """Drop every entry, or those of one language (e.g. after a prompt change)."""
+        if language is None:
+            self.partitions.clear()
+        else:
+            self.partitions.pop(language, None)
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self.partitions.values())
@@ -1,17 +1,27 @@
 import os
-from fastapi import FastAPI, WebSocket, HTTPException, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import logging
 import json
-from loguru import logger
+import asyncio
 from bot import DoctorSnowLeopardBot
-import base64
-import tempfile
+from ops_routes import router as ops_router
+from audio_formats import hello_ack, negotiate, parse_hello
+from degradation import controller as degradation, parse_speak
+from barge_in import Turn, TurnScheduler, handle_control, parse_message
+from ack_clips import observe_answer_audio, wants_ack
+from session_store import Session, open_session, session_id_from
+from fused_turn import wants_text_stream
+from transcription import TranscriptionError, get_transcription_service
+from tracing import bind_session, span, start_trace
+from metrics import start_loop_lag_monitor, ACTIVE_CONNECTIONS, TURN_TTFB_SECONDS, TURN_SECONDS
+import time
 
 app = FastAPI()
+app.include_router(ops_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,39 +42,127 @@ logger = logging.getLogger(__name__)
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    start_loop_lag_monitor()
+    degradation.start()
+    ACTIVE_CONNECTIONS.inc(endpoint="ws")
+    # Clients may pick a TTS format up front with ?audio_format=opus, or later with a hello message
+    requested_format = websocket.query_params.get("audio_format")
+    audio_format = negotiate(requested_format)
+    async def send_frame(frame: dict):
+        with span("encode"):
+            text = json.dumps(frame)
+        with span("send"):
+            await websocket.send_text(text)
+
+    # Turns run as tasks so heartbeats, cancels and corrections are read while one is answered
+    scheduler = TurnScheduler("ws", send_frame)
+
+    async def answer(turn: Turn, message: str, received_at: float, audio_format: str,
+                     session: Session, stream_text: bool, ack: bool):
+        async def send_delta(text: str):
+            await turn.send({"type": "text_delta", "text": text})
+
+        try:
+            with degradation.track_turn("ws"), start_trace("ws_turn", endpoint="ws"):
+                reply = bot.generate_response(message, audio_format, session,
+                                              send_delta if stream_text else None)
+                # Acknowledgement clip first if the answer takes a while
+                if ack:
+                    reply = bot.ack_clips.answer(message, reply, turn.send, audio_format, received_at,
+                                                 "ws", session.get("language"))
+                response = await reply
+                
+                # Send response to client
+                TURN_TTFB_SECONDS.observe(time.perf_counter() - received_at, endpoint="ws")
+                await turn.send(response)
+                observe_answer_audio(response, received_at, "ws")
+                TURN_SECONDS.observe(time.perf_counter() - received_at, endpoint="ws")
+                await session.save()
+            logger.info("Response sent successfully")
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+            error_response = {
+                "text": "*adjusts glasses* Oh my! I got a little tangled in my medical notes. Could you please repeat that? 🐾",
+                "audio": None,
+                "emotion": "caring"
+            }
+            await turn.send(error_response)
+
+    async def answer_speak(turn: Turn, speech_id: str, audio_format: str):
+        frame = await bot.speak(speech_id, audio_format)
+        if frame is not None:
+            await turn.send(frame)
+
     try:
+        if requested_format:
+            await scheduler.send(hello_ack(audio_format))
+        session = await open_session(session_id_from(websocket.query_params))
+        bind_session(session.session_id)
+        # Opt-in reply text deltas ({"type": "text_delta"}) ahead of the full frame
+        stream_text = wants_text_stream(websocket.query_params)
+        # Opt-in acknowledgement clips ({"type": "ack"}) while the answer is being made
+        ack = wants_ack(websocket.query_params)
+        if ack:
+            asyncio.ensure_future(bot.ack_clips.warm(audio_format))
+
         while True:
             # Receive message
             message = await websocket.receive_text()
-            logger.info(f"Received message: {message}")
+            received_at = time.perf_counter()
             
-            try:
-                # Handle heartbeat messages
-                if message.strip() == '{"type":"heartbeat"}':
-                    await websocket.send_json({"type": "heartbeat"})
-                    continue
-                
-                # Generate response using the bot
-                response = await bot.generate_response(message)
-                
-                # Send response to client
-                await websocket.send_json(response)
-                logger.info("Response sent successfully")
-                
-            except Exception as e:
-                logger.error(f"Error processing message: {e}", exc_info=True)
-                error_response = {
-                    "text": "*adjusts glasses* Oh my! I got a little tangled in my medical notes. Could you please repeat that? 🐾",
-                    "audio": None,
-                    "emotion": "caring"
-                }
-                await websocket.send_json(error_response)
+            # Handle heartbeat messages, even while a turn is being answered
+            if message.strip() == '{"type":"heartbeat"}':
+                await scheduler.send({"type": "heartbeat"})
+                continue
+            
+            hello = parse_hello(message)
+            if hello is not None:
+                audio_format = negotiate(hello.get("audio_format"))
+                if session_id_from({}, hello):
+                    session = await open_session(session_id_from({}, hello))
+                    bind_session(session.session_id)
+                stream_text = wants_text_stream(websocket.query_params, hello)
+                ack = wants_ack(websocket.query_params, hello)
+                if ack:
+                    asyncio.ensure_future(bot.ack_clips.warm(audio_format))
+                await scheduler.send(hello_ack(audio_format))
+                continue
+            
+            # Audio for a text-first response the child tapped
+            speech_id = parse_speak(message)
+            if speech_id is not None:
+                scheduler.submit(lambda turn, args=(speech_id, audio_format): answer_speak(turn, *args))
+                continue
+            
+            # Cancel frames, and messages tagged with an id that supersede the turn in flight
+            if handle_control(scheduler, message):
+                continue
+            tagged = parse_message(message)
+            if tagged is not None:
+                message_id = str(tagged["id"]) if tagged.get("id") is not None else None
+                logger.info("Received message %s (%d chars)", message_id, len(tagged["text"]))
+                scheduler.submit(
+                    lambda turn, args=(tagged["text"], received_at, audio_format, session, stream_text, ack):
+                        answer(turn, *args),
+                    message_id, supersede=tagged.get("supersede", True) is not False,
+                )
+                continue
+            
+            # Generate response using the bot
+            logger.info("Received message (%d chars)", len(message))
+            scheduler.submit(
+                lambda turn, args=(message, received_at, audio_format, session, stream_text, ack):
+                    answer(turn, *args)
+            )
                 
     except WebSocketDisconnect:
         logger.info("Client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}", exc_info=True)
         await websocket.close()
+    finally:
+        await scheduler.close()
+        ACTIVE_CONNECTIONS.dec(endpoint="ws")
 
 @app.get("/")
 async def root():
@@ -72,41 +170,23 @@ async def root():
 
 @app.post("/transcribe")
 async def transcribe_audio(request: Request):
-    """Endpoint to transcribe audio using Whisper API"""
+    """
+    Endpoint to transcribe audio using Whisper API.
+
+    Accepts a raw audio body (e.g. Content-Type: audio/webm), a multipart upload
+    (field "file" or "audio"), or the legacy JSON {"audio": "<base64 data URL>"}.
+    """
     try:
-        # Get the audio data from the request
-        data = await request.json()
-        audio_base64 = data.get("audio")
-        
-        if not audio_base64:
-            raise HTTPException(status_code=400, detail="No audio data provided")
-            
-        # Decode base64 audio
-        audio_bytes = base64.b64decode(audio_base64.split(",")[1])
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-            temp_file.write(audio_bytes)
-            temp_path = temp_file.name
-        
-        try:
-            # Transcribe using Whisper API
-            with open(temp_path, "rb") as audio_file:
-                transcript = await bot.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
-            
-            return JSONResponse({
-                "success": True,
-                "text": transcript
-            })
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
+        transcript = await get_transcription_service(bot.client).handle(request)
+        return JSONResponse({
+            "success": True,
+            "text": transcript
+        })
+    except TranscriptionError as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=e.status_code)
     except Exception as e:
         logger.error(f"Transcription error: {e}")
         return JSONResponse({
@@ -0,0 +1,381 @@
+"""
+Session state that survives reconnects to another instance.
+
+A session holds what a conversation needs between turns: the child's language,
+the recent conversation history and the last avatar state. Clients opt in by
+sending a stable id (`?session_id=...` on the socket URL or "session_id" in the
+hello message); connections without one keep their state in memory as before.
+
+Backends, picked with SESSION_STORE:
+    memory                     in-process (the default; single instance only)
+    sqlite:///path/sessions.db one host, shared by all its workers
+    redis://host:6379/0        any RESP key-value server, shared by all instances
+
+Each turn does at most one batched read (on connect) and one batched write
+(only the fields that changed), so the backend costs one round trip per turn.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+# Messages of conversation history kept per session
+MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "20"))
+
+
+class SessionStoreError(Exception):
+    """The backend could not be reached or returned an error."""
+
+
+class SessionStore:
+    """Batched key/value access to JSON-serializable session values."""
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """Values for the keys that exist; missing and expired keys are left out."""
+        raise NotImplementedError
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = SESSION_TTL_SECONDS):
+        raise NotImplementedError
+
+    async def delete(self, keys: Sequence[str]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self.values: Dict[str, tuple] = {}
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        now = time.time()
+        found = {}
+        for key in keys:
+            entry = self.values.get(key)
+            if entry is None:
+                continue
+            if entry[1] is not None and entry[1] <= now:
+                del self.values[key]
+                continue
+            # Copy like the other backends do, so callers can't share mutable state by accident
+            found[key] = json.loads(entry[0])
+        return found
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = SESSION_TTL_SECONDS):
+        expires_at = time.time() + ttl if ttl else None
+        for key, value in items.items():
+            self.values[key] = (json.dumps(value), expires_at)
+
+    async def delete(self, keys: Sequence[str]):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """One SQLite file in WAL mode; queries run on a worker thread to keep the loop free."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, value FROM sessions WHERE key IN ({placeholders}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (*keys, time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _set_many(self, items: Dict[str, Any], ttl: Optional[float]):
+        expires_at = time.time() + ttl if ttl else None
+        rows = [(key, json.dumps(value), expires_at) for key, value in items.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _delete(self, keys: Sequence[str]):
+        with self._lock:
+            self._db.executemany("DELETE FROM sessions WHERE key = ?", [(key,) for key in keys])
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        try:
+            return await asyncio.to_thread(self._get_many, keys)
+        except sqlite3.Error as e:
+            raise SessionStoreError(str(e)) from e
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = SESSION_TTL_SECONDS):
+        if not items:
+            return
+        try:
+            await asyncio.to_thread(self._set_many, items, ttl)
+        except sqlite3.Error as e:
+            raise SessionStoreError(str(e)) from e
+
+    async def delete(self, keys: Sequence[str]):
+        await asyncio.to_thread(self._delete, keys)
+
+    async def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class _RESPConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the session store")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise SessionStoreError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [await self.read_reply() for _ in range(count)]
+        raise SessionStoreError(f"Unexpected reply from the session store: {line!r}")
+
+    async def pipeline(self, commands: List[tuple]) -> List[Any]:
+        self.writer.write(b"".join(_encode_command(*command) for command in commands))
+        await self.writer.drain()
+        replies = []
+        error = None
+        # Read every reply even after an error so the connection stays in sync
+        for _ in commands:
+            try:
+                replies.append(await self.read_reply())
+            except SessionStoreError as e:
+                error = error or e
+        if error:
+            raise error
+        return replies
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (OSError, ConnectionError):
+            pass
+
+
+class RESPSessionStore(SessionStore):
+    """
+    Client for a Redis-compatible server speaking RESP2.
+
+    Only MGET, SET and DEL are used. Batched writes are pipelined, so a turn's
+    save is a single round trip whatever the number of fields. Up to
+    `pool_size` connections are opened as concurrent turns need them.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 2.0, pool_size: int = 8):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle: List[_RESPConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "RESPSessionStore":
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        pool_size = int(os.getenv("SESSION_STORE_POOL_SIZE", "8"))
+        return cls(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, parsed.password, pool_size=pool_size)
+
+    async def _connect(self) -> _RESPConnection:
+        connection = _RESPConnection(*await asyncio.open_connection(self.host, self.port))
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await connection.pipeline(setup)
+        return connection
+
+    async def _execute(self, commands: List[tuple]) -> List[Any]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            for attempt in range(2):
+                connection = self._idle.pop() if self._idle else None
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(self._connect(), self.timeout)
+                    replies = await asyncio.wait_for(connection.pipeline(commands), self.timeout)
+                except SessionStoreError:
+                    # An error reply; the connection itself is still in sync
+                    self._idle.append(connection)
+                    raise
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    # Drop the connection; one reconnect covers a server restart or an idle timeout
+                    if connection is not None:
+                        await connection.close()
+                    if attempt:
+                        raise SessionStoreError(f"Session store unavailable: {e}") from e
+                    continue
+                self._idle.append(connection)
+                return replies
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        (values,) = await self._execute([("MGET", *keys)])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = SESSION_TTL_SECONDS):
+        if not items:
+            return
+        expiry = ("PX", int(ttl * 1000)) if ttl else ()
+        await self._execute([("SET", key, json.dumps(value), *expiry) for key, value in items.items()])
+
+    async def delete(self, keys: Sequence[str]):
+        if keys:
+            await self._execute([("DEL", *keys)])
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+
+class Session:
+    """One conversation's state, read in one batch and written back in one batch."""
+
+    FIELDS = ("language", "history", "avatar")
+
+    def __init__(self, store: SessionStore, session_id: Optional[str]):
+        self.store = store
+        self.session_id = session_id
+        self.values: Dict[str, Any] = {}
+        self.dirty: set = set()
+
+    @property
+    def persistent(self) -> bool:
+        return self.session_id is not None
+
+    def _key(self, field: str) -> str:
+        return f"session:{self.session_id}:{field}"
+
+    async def load(self, fields: Sequence[str] = FIELDS):
+        if not self.persistent:
+            return
+        try:
+            with span("session_load"):
+                found = await self.store.get_many([self._key(field) for field in fields])
+        except SessionStoreError as e:
+            logger.warning(f"Could not load session {self.session_id}: {e}")
+            return
+        for field in fields:
+            if self._key(field) in found:
+                self.values[field] = found[self._key(field)]
+
+    def get(self, field: str, default: Any = None) -> Any:
+        return self.values.get(field, default)
+
+    def set(self, field: str, value: Any):
+        self.values[field] = value
+        self.dirty.add(field)
+
+    def append_history(self, message: dict):
+        history = self.values.get("history") or []
+        history.append(message)
+        self.set("history", history[-MAX_HISTORY:])
+
+    async def save(self):
+        """Write the changed fields; a failing store only costs the persistence, never the turn."""
+        if not self.persistent or not self.dirty:
+            return
+        items = {self._key(field): self.values[field] for field in self.dirty}
+        self.dirty = set()
+        try:
+            with span("session_save"):
+                await self.store.set_many(items)
+        except SessionStoreError as e:
+            logger.warning(f"Could not save session {self.session_id}: {e}")
+
+
+def create_store(spec: str) -> SessionStore:
+    """A store from a SESSION_STORE value: memory, sqlite:///path or redis://host:port/db."""
+    if not spec or spec == "memory":
+        return MemorySessionStore()
+    if spec.startswith("sqlite:///"):
+        return SQLiteSessionStore(spec[len("sqlite:///"):])
+    if spec.startswith(("redis://", "resp://")):
+        return RESPSessionStore.from_url(spec)
+    raise ValueError(f"Unknown SESSION_STORE: {spec}")
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        _store = create_store(os.getenv("SESSION_STORE", "memory"))
+    return _store
+
+
+def session_id_from(query_params, hello: Optional[dict] = None) -> Optional[str]:
+    """The client's session id from the hello message or the socket URL, if it sent one."""
+    session_id = (hello or {}).get("session_id") or query_params.get("session_id")
+    if isinstance(session_id, str) and 0 < len(session_id) <= 128:
+        return session_id
+    return None
+
+
+async def open_session(session_id: Optional[str]) -> Session:
+    session = Session(get_session_store(), session_id)
+    await session.load()
+    return session
@@ -0,0 +1,385 @@
+"""
+Cross-worker cache on a memory-mapped, append-only file.
+
+With several uvicorn workers every in-process cache is duplicated N times and
+warmed N times. A SharedCache keeps entries in one file that every worker maps:
+
+    header   magic, generation, tail offset, slot count, used slots, stale flag
+    index    open-addressing hash table of (key hash, record offset) slots
+    data     append-only records: key length, value length, type, key, value
+
+Appends take an exclusive flock on a side lock file; a record is fully written
+before its index slot is published (offset first, then hash), so readers need
+no lock and get bytes values as a memoryview straight into the mapping (str
+values, such as the bot's base64 TTS audio, are decoded, which copies: what the
+audio cache saves is the per-worker duplicate, not the copy on read). When the
+data area or the index fills up, the writer compacts: the newest entries that
+fit in half the capacity are copied into a fresh file, which atomically
+replaces the old one. The same happens, empty, when a process opens the file
+with a different capacity. Either way the old file is flagged stale (with the
+next generation in the new one) and readers remap on their next lookup, taking
+the layout from the new file's header; their existing views stay valid because
+the old mapping is never rewritten. Eviction is therefore oldest-written first.
+
+Enable it for the TTS audio cache with SHARED_CACHE_PATH (e.g. /dev/shm/snowpaws.cache).
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import weakref
+from typing import Any, Hashable, Iterator, List, Optional, Tuple, Union
+
+from metrics import CACHE_REQUESTS, Gauge
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SNOWSHM1"
+# magic, generation, tail, slots, used slots, stale flag
+_HEADER = struct.Struct("<8sQQQQQ")
+HEADER_SIZE = 4096
+_SLOT = struct.Struct("<QQ")
+_RECORD = struct.Struct("<IIB3x")
+_TAIL_OFFSET = 16
+_USED_OFFSET = 32
+_STALE_OFFSET = 40
+MAX_LOAD = 0.7
+KEEP_RATIO = 0.5
+
+_BYTES, _STR = 0, 1
+
+SHARED_CACHE_BYTES = Gauge(
+    "snowpaws_shared_cache_bytes", "Bytes of live and superseded records in the shared cache file", ["path"]
+)
+_open_caches: "weakref.WeakSet[SharedCache]" = weakref.WeakSet()
+
+
+def _shared_cache_bytes():
+    return {(cache.path,): float(cache.used_bytes()) for cache in list(_open_caches)}
+
+
+SHARED_CACHE_BYTES.set_function(_shared_cache_bytes)
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _key_hash(key: bytes) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def encode_key(namespace: str, key: Hashable) -> bytes:
+    """Stable bytes for a cache key; tuples of str/int/float, as the bot uses, are supported."""
+    return json.dumps([namespace, key], separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class SharedCache:
+    """A memory-mapped key/value store shared by every process that opens the same path."""
+
+    def __init__(self, path: str, capacity: int = 64 * 1024 * 1024, slots: Optional[int] = None):
+        self.path = path
+        self.capacity = capacity
+        # Audio clips are tens of KB; one slot per 4 KB of data leaves room for short entries too
+        self.slots = slots or max(4096, 1 << (capacity // 4096 - 1).bit_length())
+        self.file_size = HEADER_SIZE + self.slots * _SLOT.size + capacity
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._mm: Optional[mmap.mmap] = None
+        self.compactions = 0
+        with self._exclusive():
+            if not self._valid(path):
+                self._replace_layout(path)
+            self._map()
+        _open_caches.add(self)
+
+    # File management
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Writer lock: the flock serializes processes, the thread lock threads sharing our descriptor."""
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _valid(self, path: str) -> bool:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        if len(header) < _HEADER.size:
+            return False
+        magic, _, _, slots, _, stale = _HEADER.unpack(header)
+        return magic == MAGIC and not stale and slots == self.slots and size == self.file_size
+
+    def _replace_layout(self, path: str):
+        """Start an empty file in our layout, flagging any existing one stale for the processes mapping it."""
+        generation = 0
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                if os.fstat(fd).st_size >= HEADER_SIZE:
+                    with mmap.mmap(fd, HEADER_SIZE) as mm:
+                        magic, old_generation = _HEADER.unpack_from(mm, 0)[:2]
+                        if magic == MAGIC:
+                            generation = old_generation + 1
+                            struct.pack_into("<Q", mm, _STALE_OFFSET, 1)
+            finally:
+                os.close(fd)
+        self._create(path, [], generation)
+
+    def _create(self, path: str, records: List[Tuple[bytes, int, bytes]], generation: int = 0):
+        """Write a fresh file holding `records` and atomically move it into place."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, self.file_size)
+            with mmap.mmap(fd, self.file_size) as mm:
+                tail = used = 0
+                for key, kind, value in records:
+                    offset = tail
+                    tail += self._write_record(mm, offset, key, kind, value)
+                    used += self._publish(mm, key, offset)
+                _HEADER.pack_into(mm, 0, MAGIC, generation, tail, self.slots, used, 0)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+
+    def _map(self):
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            # The previous mapping is left to the garbage collector: readers may still hold views into it
+            mm = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        # Follow the file's layout: another process may have recreated it with a different capacity
+        self.slots = _HEADER.unpack_from(mm, 0)[3]
+        self.file_size = len(mm)
+        self.capacity = self.file_size - HEADER_SIZE - self.slots * _SLOT.size
+        self._mm = mm
+
+    def _current(self) -> mmap.mmap:
+        if _HEADER.unpack_from(self._mm, 0)[5]:
+            self._map()
+        return self._mm
+
+    # Records and index
+
+    def _data_offset(self, offset: int) -> int:
+        return HEADER_SIZE + self.slots * _SLOT.size + offset
+
+    def _write_record(self, mm: mmap.mmap, offset: int, key: bytes, kind: int, value: bytes) -> int:
+        start = self._data_offset(offset)
+        _RECORD.pack_into(mm, start, len(key), len(value), kind)
+        body = start + _RECORD.size
+        mm[body:body + len(key)] = key
+        mm[body + len(key):body + len(key) + len(value)] = value
+        return _align(_RECORD.size + len(key) + len(value))
+
+    def _record(self, mm: mmap.mmap, offset: int) -> Tuple[bytes, int, int, int]:
+        """(key, type, value start, value length) of the record at a data offset."""
+        start = self._data_offset(offset)
+        key_len, value_len, kind = _RECORD.unpack_from(mm, start)
+        body = start + _RECORD.size
+        return mm[body:body + key_len], kind, body + key_len, value_len
+
+    def _probe(self, mm: mmap.mmap, key: bytes) -> Iterator[Tuple[int, int, int]]:
+        """(slot position, slot hash, record offset) along the key's probe sequence."""
+        key_hash = _key_hash(key)
+        mask = self.slots - 1
+        index = key_hash & mask
+        for _ in range(self.slots):
+            position = HEADER_SIZE + index * _SLOT.size
+            slot_hash, offset = _SLOT.unpack_from(mm, position)
+            yield position, slot_hash, offset
+            if slot_hash == 0:
+                return
+            index = (index + 1) & mask
+
+    def _find(self, mm: mmap.mmap, key: bytes) -> Optional[int]:
+        key_hash = _key_hash(key)
+        for _, slot_hash, offset in self._probe(mm, key):
+            if slot_hash == 0:
+                return None
+            if slot_hash == key_hash and self._record(mm, offset)[0] == key:
+                return offset
+        return None
+
+    def _publish(self, mm: mmap.mmap, key: bytes, offset: int) -> int:
+        """Point the key's slot at a record; returns 1 if a new slot was used."""
+        key_hash = _key_hash(key)
+        for position, slot_hash, old_offset in self._probe(mm, key):
+            if slot_hash == 0:
+                # Offset before hash: a reader never sees a hash without its record
+                struct.pack_into("<Q", mm, position + 8, offset)
+                struct.pack_into("<Q", mm, position, key_hash)
+                return 1
+            if slot_hash == key_hash and self._record(mm, old_offset)[0] == key:
+                struct.pack_into("<Q", mm, position + 8, offset)
+                return 0
+        raise RuntimeError("Shared cache index is full")
+
+    def _live_records(self, mm: mmap.mmap) -> List[Tuple[int, bytes, int, int, int]]:
+        """(offset, key, type, value start, value length) of every indexed record, oldest first."""
+        records = []
+        for index in range(self.slots):
+            slot_hash, offset = _SLOT.unpack_from(mm, HEADER_SIZE + index * _SLOT.size)
+            if slot_hash:
+                records.append((offset, *self._record(mm, offset)))
+        records.sort()
+        return records
+
+    def _compact(self, mm: mmap.mmap, incoming: int):
+        """Rewrite the newest entries that fit in half the capacity into a fresh file."""
+        budget = int(self.capacity * KEEP_RATIO) - incoming
+        max_slots = int(self.slots * KEEP_RATIO)
+        kept = []
+        for offset, key, kind, start, length in reversed(self._live_records(mm)):
+            value = mm[start:start + length]
+            size = _align(_RECORD.size + len(key) + len(value))
+            if size > budget or len(kept) >= max_slots:
+                break
+            budget -= size
+            kept.append((key, kind, value))
+        kept.reverse()
+        generation = _HEADER.unpack_from(mm, 0)[1] + 1
+        self._create(self.path, kept, generation)
+        # Tell the other workers (and our own readers) to remap
+        struct.pack_into("<Q", mm, _STALE_OFFSET, 1)
+        self._map()
+        self.compactions += 1
+        logger.info(f"Compacted shared cache {self.path}: kept {len(kept)} entries, generation {generation}")
+
+    # Public API
+
+    def view(self, key: bytes) -> Optional[memoryview]:
+        """Zero-copy view of a value, or None; valid even if the cache is compacted meanwhile."""
+        mm = self._current()
+        offset = self._find(mm, key)
+        if offset is None:
+            return None
+        _, _, start, length = self._record(mm, offset)
+        return memoryview(mm)[start:start + length]
+
+    def get(self, key: bytes) -> Union[None, memoryview, str]:
+        """A bytes value as a zero-copy view (see `view`), a str value decoded, or None."""
+        mm = self._current()
+        offset = self._find(mm, key)
+        if offset is None:
+            return None
+        _, kind, start, length = self._record(mm, offset)
+        if kind == _STR:
+            return mm[start:start + length].decode()
+        return memoryview(mm)[start:start + length]
+
+    def put(self, key: bytes, value: Union[bytes, str]):
+        kind = _STR if isinstance(value, str) else _BYTES
+        data = value.encode() if kind == _STR else bytes(value)
+        size = _align(_RECORD.size + len(key) + len(data))
+        if size > self.capacity * KEEP_RATIO:
+            logger.debug(f"Value of {len(data)} bytes is too large for the shared cache")
+            return
+        with self._exclusive():
+            mm = self._current()
+            _, _, tail, _, used, _ = _HEADER.unpack_from(mm, 0)
+            if tail + size > self.capacity or used + 1 > self.slots * MAX_LOAD:
+                self._compact(mm, size)
+                mm = self._mm
+                _, _, tail, _, used, _ = _HEADER.unpack_from(mm, 0)
+            self._write_record(mm, tail, key, kind, data)
+            # Publish the tail after the record, then the slot
+            struct.pack_into("<Q", mm, _TAIL_OFFSET, tail + size)
+            struct.pack_into("<Q", mm, _USED_OFFSET, used + self._publish(mm, key, tail))
+
+    def __contains__(self, key: bytes) -> bool:
+        return self._find(self._current(), key) is not None
+
+    def __len__(self) -> int:
+        return _HEADER.unpack_from(self._current(), 0)[4]
+
+    def used_bytes(self) -> int:
+        return _HEADER.unpack_from(self._current(), 0)[2]
+
+    def keys(self) -> List[bytes]:
+        return [record[1] for record in self._live_records(self._current())]
+
+    def items(self) -> List[Tuple[bytes, Union[bytes, str]]]:
+        mm = self._current()
+        items = []
+        for _, key, kind, start, length in self._live_records(mm):
+            value = mm[start:start + length]
+            items.append((key, value.decode() if kind == _STR else value))
+        return items
+
+
+class SharedLRUCache:
+    """LRUCache-compatible view of one namespace in a SharedCache."""
+
+    def __init__(self, name: str, shared: SharedCache):
+        self.name = name
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.shared.get(encode_key(self.name, key))
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return None
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if value is None:
+            return
+        self.shared.put(encode_key(self.name, key), value)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return encode_key(self.name, key) in self.shared
+
+    def _owns(self, raw_key: bytes) -> bool:
+        return json.loads(raw_key)[0] == self.name
+
+    def __len__(self) -> int:
+        return sum(1 for raw_key in self.shared.keys() if self._owns(raw_key))
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        items = []
+        for raw_key, value in self.shared.items():
+            namespace, key = json.loads(raw_key)
+            if namespace == self.name:
+                items.append((tuple(key) if isinstance(key, list) else key, value))
+        return items
+
+
+_shared: Optional[SharedCache] = None
+
+
+def cache_for(name: str, max_entries: int = 256):
+    """The named cache: shared across workers when SHARED_CACHE_PATH is set, else in-process."""
+    global _shared
+    path = os.getenv("SHARED_CACHE_PATH")
+    if not path:
+        from cache import LRUCache
+
+        return LRUCache(name, max_entries=max_entries)
+    if _shared is None or _shared.path != path:
+        capacity = int(os.getenv("SHARED_CACHE_BYTES", str(64 * 1024 * 1024)))
+        _shared = SharedCache(path, capacity)
+    return SharedLRUCache(name, _shared)
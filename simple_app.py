@@ -1,19 +1,27 @@
 import os
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
-from openai import OpenAI
 import json
 import logging
 import re
 from dotenv import load_dotenv
-import uvicorn
 import socket
 import sys
 import base64
 import asyncio
+import time
+from ops_routes import router as ops_router
+from media import media_response
+from audio_formats import DEFAULT_FORMAT, hello_ack, negotiate, parse_hello, record_clip, tag_format
+from static_assets import StaticAssets
+from degradation import controller as degradation
+from model_router import router
+from session_store import MAX_HISTORY, open_session, session_id_from
+from tracing import bind_session, span, start_trace
+from metrics import start_loop_lag_monitor, ACTIVE_CONNECTIONS, TURN_TTFB_SECONDS, TURN_SECONDS
+import story_mode
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,23 +33,29 @@ logger.info("Attempting to load .env file...")
 load_dotenv(override=True)
 
 app = FastAPI()
+app.include_router(ops_router)
 
-# Initialize OpenAI client with API key from .env
+# OpenAI client with API key from .env; the SDK is imported on first use to keep cold starts short
 api_key = os.getenv("OPENAI_API_KEY")
 logger.info("API Key loaded: %s", "Found" if api_key else "Not found")
-use_openai = True
+use_openai = bool(api_key)
 client = None
+if not use_openai:
+    logger.warning("OPENAI_API_KEY not found in environment variables. Using predefined responses only.")
 
-try:
-    if api_key:
-        client = OpenAI(api_key=api_key)
-        logger.info("OpenAI client initialized successfully")
-    else:
-        use_openai = False
-        logger.warning("OPENAI_API_KEY not found in environment variables. Using predefined responses only.")
-except Exception as e:
-    use_openai = False
-    logger.error(f"Error initializing OpenAI client: {e}")
+def get_client():
+    """The OpenAI client, created on first call; None when OpenAI is unavailable."""
+    global client, use_openai
+    if client is None and use_openai:
+        try:
+            from openai import AsyncOpenAI
+            from cassette import build_http_client
+            client = AsyncOpenAI(api_key=api_key, http_client=build_http_client())
+            logger.info("OpenAI client initialized successfully")
+        except Exception as e:
+            use_openai = False
+            logger.error(f"Error initializing OpenAI client: {e}")
+    return client
 
 # System message to ensure kid-friendly responses
 SYSTEM_MESSAGE = """You are Dr. Snow Paws, a friendly and caring snow leopard who helps children feel better.
@@ -128,20 +142,29 @@ RESPONSES = {
     }
 }
 
-# Ensure static directory exists with all required subdirectories
+# Static directory with all required subdirectories
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "static"))
 assets_dir = os.path.join(static_dir, "assets")
 videos_dir = os.path.join(assets_dir, "videos")
 css_dir = os.path.join(static_dir, "css")
 
-# Create all required directories
-for directory in [static_dir, assets_dir, videos_dir, css_dir]:
-    if not os.path.exists(directory):
-        logger.info(f"Creating directory: {directory}")
-        os.makedirs(directory, exist_ok=True)
+@app.on_event("startup")
+async def configure_logging():
+    # Non-blocking log pipeline (logging_setup.py); imported here to keep cold imports cheap
+    import logging_setup
+    logging_setup.configure()
+
+@app.on_event("startup")
+async def ensure_directories():
+    # Created at startup rather than import so importing the app has no side effects
+    for directory in [static_dir, assets_dir, videos_dir, css_dir]:
+        if not os.path.exists(directory):
+            logger.info(f"Creating directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
 
-# Mount the static directory
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Mount the static directory; CSS/JS/HTML are served precompressed from memory
+static_assets = StaticAssets(static_dir)
+app.mount("/static", static_assets, name="static")
 
 # Add CORS middleware with more specific configuration
 app.add_middleware(
@@ -168,11 +191,11 @@ def detect_language(text):
             return 'es'
     return 'en'
 
-def get_chat_response(message: str) -> tuple[str, str]:
+async def get_chat_response(message: str) -> tuple[str, str]:
     try:
         # Detect language
         language = detect_language(message)
-        logger.info(f"Detected language: {language}")
+        logger.info("Detected language: %s", language)
         
         # Check for predefined responses first
         data_lower = message.lower().strip()
@@ -181,23 +204,26 @@ def get_chat_response(message: str) -> tuple[str, str]:
                 return value[f"text{'_es' if language == 'es' else ''}"], value["emotion"]
         
         # If OpenAI is available, use it for dynamic responses
-        if use_openai and client:
+        client = get_client()
+        if client:
             # Update system message with language preference
             current_system_message = SYSTEM_MESSAGE + f"\nRespond in {'Spanish' if language == 'es' else 'English'} only."
             
             # Call OpenAI with strict content filtering
-            response = client.chat.completions.create(
-                model="gpt-4",  # Using GPT-4 for better content understanding and safety
-                messages=[
-                    {"role": "system", "content": current_system_message},
-                    {"role": "user", "content": message}
-                ],
-                temperature=0.7,
-                max_tokens=150,  # Keep responses concise
-                presence_penalty=0.6,  # Encourage varied responses
-                frequency_penalty=0.2,
-                response_format={ "type": "text" }
-            )
+            route = router.route(message, "chat", default="gpt-4")  # GPT-4 unless routing picks a tier
+            with router.track(route):
+                response = await client.chat.completions.create(
+                    model=route.model,
+                    messages=[
+                        {"role": "system", "content": current_system_message},
+                        {"role": "user", "content": message}
+                    ],
+                    temperature=0.7,
+                    max_tokens=150,  # Keep responses concise
+                    presence_penalty=0.6,  # Encourage varied responses
+                    frequency_penalty=0.2,
+                    response_format={ "type": "text" }
+                )
             
             # Extract the response
             response_text = response.choices[0].message.content
@@ -225,8 +251,11 @@ def get_chat_response(message: str) -> tuple[str, str]:
         return default[f"text{'_es' if language == 'es' else ''}"], default["emotion"]
 
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     try:
+        response = await static_assets.page("index.html", request)
+        if response:
+            return response
         index_path = os.path.join(static_dir, "index.html")
         if not os.path.exists(index_path):
             logger.error(f"index.html not found at {index_path}")
@@ -237,83 +266,38 @@ async def read_root():
         logger.error(f"Error serving index.html: {e}")
         return {"error": str(e)}
 
-@app.get("/video/{video_name}")
+@app.api_route("/video/{video_name}", methods=["GET", "HEAD"])
 async def video_endpoint(video_name: str, request: Request):
-    video_path = os.path.join(static_dir, "assets", "videos", video_name)
-    print(f"Attempting to serve video from: {os.path.abspath(video_path)}")
-    
-    if not os.path.exists(video_path):
-        print(f"Video not found at {video_path}")
-        return {"error": f"Video not found at {video_path}"}, 404
-        
-    file_size = os.path.getsize(video_path)
-    
+    video_path = os.path.realpath(os.path.join(videos_dir, video_name))
+    if os.path.dirname(video_path) != os.path.realpath(videos_dir):
+        return JSONResponse({"error": "Video not found"}, status_code=404)
+
     # Set cache headers and CORS for video streaming
     headers = {
         'Cache-Control': 'public, max-age=86400',
         'Expires': (datetime.utcnow() + timedelta(days=1)).strftime('%a, %d %b %Y %H:%M:%S GMT'),
-        'Content-Type': 'video/mp4',
-        'Accept-Ranges': 'bytes',
-        'Content-Length': str(file_size),
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS',
         'Cross-Origin-Resource-Policy': 'cross-origin'
     }
-    
-    # Handle range requests (important for mobile)
-    range_header = request.headers.get('range')
-    if range_header:
-        try:
-            start, end = range_header.replace('bytes=', '').split('-')
-            start = int(start)
-            end = int(end) if end else min(start + 1024*1024, file_size - 1)  # Limit chunk size for mobile
-            
-            # Ensure we don't exceed file size
-            if end >= file_size:
-                end = file_size - 1
-            if start >= file_size:
-                return {"error": "Requested range not satisfiable"}, 416
-                
-            # Calculate content length
-            content_length = end - start + 1
-            headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-            headers['Content-Length'] = str(content_length)
-            
-            # Return specific range of bytes
-            async def range_iterator():
-                with open(video_path, "rb") as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        data = f.read(chunk_size)
-                        if not data:
-                            break
-                        remaining -= len(data)
-                        yield data
-                        
-            return StreamingResponse(range_iterator(), status_code=206, headers=headers)
-            
-        except Exception as e:
-            print(f"Range request error: {e}")
-            
-    # If no range request, return entire file
-    async def iterfile():
-        with open(video_path, "rb") as f:
-            while chunk := f.read(8192):
-                yield chunk
-                
-    return StreamingResponse(iterfile(), headers=headers)
+
+    try:
+        return await media_response(video_path, request.headers, "video/mp4", headers, method=request.method)
+    except FileNotFoundError:
+        logger.warning(f"Video not found at {video_path}")
+        return JSONResponse({"error": "Video not found"}, status_code=404)
 
 @app.get("/health")
 async def health_check():
     return {
         "status": "ok",
         "static_dir": static_dir,
-        "index_exists": os.path.exists(os.path.join(static_dir, "index.html"))
+        "index_exists": os.path.exists(os.path.join(static_dir, "index.html")),
+        "degradation": degradation.snapshot(),
+        "model_routing": router.snapshot()
     }
 
-async def generate_speech(text: str, language="en") -> str:
+async def generate_speech(text: str, language="en", audio_format=DEFAULT_FORMAT) -> str:
     """Generate speech from text using OpenAI TTS API"""
     try:
         # Clean text for TTS by removing actions and emojis
@@ -339,13 +323,14 @@ async def generate_speech(text: str, language="en") -> str:
             text = text.replace('¡ ', '¡ , ')
             text = text.replace('¿ ', '¿ , ')
         
-        # Use optimized TTS settings
+        # Use optimized TTS settings; the faster tts-1 model under heavy load
+        model = "tts-1" if degradation.active("tts_fast") else "tts-1-hd"
         params = {
-            "model": "tts-1-hd",  # Use HD model for better quality
+            "model": model,  # Use HD model for better quality
             "voice": voice,
             "input": text.strip(),
             "speed": 0.92 if language == "es" else 0.95,  # Slightly slower for Spanish
-            "response_format": "mp3"  # Ensure consistent audio format
+            "response_format": audio_format  # Negotiated per connection, MP3 by default
         }
         
         # Add instructions for consistent volume
@@ -353,7 +338,9 @@ async def generate_speech(text: str, language="en") -> str:
             params["instructions"] = instructions
         
         # Generate speech
-        response = client.audio.speech.create(**params)
+        with span("tts", model=model, voice=voice, format=audio_format):
+            response = await get_client().audio.speech.create(**params)
+        record_clip(audio_format, response.content)
         
         # Get the binary audio data and convert to base64
         return base64.b64encode(response.content).decode('utf-8')
@@ -361,23 +348,196 @@ async def generate_speech(text: str, language="en") -> str:
         logger.error(f"TTS Error: {e}")
         return None
 
+async def add_lipsync(frame: dict, audio_data, audio_format: str):
+    """Mouth track for clients doing their own lip-sync (PCM/WAV only); NumPy is imported on first use."""
+    if audio_data and audio_format in ("pcm", "wav"):
+        import lipsync
+        with span("lipsync", format=audio_format):
+            track = await lipsync.analyze_async(audio_data, audio_format)
+        if track is not None:
+            frame["lipsync"] = track
+
+async def send_reply(websocket: WebSocket, frame: dict, received_at: float):
+    with span("encode"):
+        frame = json.dumps(frame)
+    TURN_TTFB_SECONDS.observe(time.perf_counter() - received_at, endpoint="simple_chat")
+    with span("send"):
+        await websocket.send_text(frame)
+    TURN_SECONDS.observe(time.perf_counter() - received_at, endpoint="simple_chat")
+
+async def complete_story(messages: list, language: str) -> str:
+    """Write one story segment (story_mode.py) from its chat messages."""
+    messages[0]["content"] += f"\nRespond in {'Spanish' if language == 'es' else 'English'} only."
+    route = router.route(messages[-1]["content"], "chat", default="gpt-4")
+    with span("completion", model=route.model, tier=route.tier, story=True), router.track(route):
+        response = await get_client().chat.completions.create(
+            model=route.model,
+            messages=messages,
+            temperature=0.8,
+            max_tokens=story_mode.STORY_SEGMENT_TOKENS,
+            presence_penalty=0.6,
+            timeout=15.0
+        )
+    return response.choices[0].message.content
+
+async def render_story_segment(text: str, language: str, audio_format: str) -> dict:
+    audio_data = await generate_speech(text, language, audio_format)
+    frame = tag_format({"text": text, "emotion": "happy", "audio": audio_data}, audio_format)
+    await add_lipsync(frame, audio_data, audio_format)
+    return frame
+
+async def process_story_turn(websocket: WebSocket, conversation_history: list, story: story_mode.Story,
+                             data: str, received_at: float, steer: bool) -> bool:
+    """Tell the next segment of `story`; False if it could not be written (the message gets a normal turn)."""
+    try:
+        frame = await story.next(data, received_at, steer)
+    except Exception as e:
+        logger.error(f"Error telling story segment: {e}")
+        return False
+    await send_reply(websocket, frame, received_at)
+    conversation_history.append({"role": "user", "content": data})
+    conversation_history.append({"role": "assistant", "content": frame["text"]})
+    return True
+
+async def process_turn(websocket: WebSocket, conversation_history: list, data: str, received_at: float,
+                       audio_format: str = DEFAULT_FORMAT):
+    """Answer one child message on the /chat socket and record it in the history."""
+    # Add user message to history
+    conversation_history.append({"role": "user", "content": data})
+
+    # Detect language
+    with span("detect"):
+        language = detect_language(data)
+    logger.info("Detected language: %s", language)
+
+    # If OpenAI is available, use it for dynamic responses
+    client = get_client()
+    if not client:
+        # Use default response if OpenAI is not available
+        default_response = RESPONSES["default"]
+        response_text = default_response[f"text{'_es' if language == 'es' else ''}"]
+        emotion = default_response["emotion"]
+        audio_data = await generate_speech(response_text, language, audio_format)
+
+        await websocket.send_json(tag_format({
+            "text": response_text,
+            "emotion": emotion,
+            "audio": audio_data
+        }, audio_format))
+        conversation_history.append({"role": "assistant", "content": response_text})
+        return
+
+    try:
+        # Update system message with language preference
+        conversation_history[0]["content"] = SYSTEM_MESSAGE + f"\nRespond in {'Spanish' if language == 'es' else 'English'} only."
+
+        # Trim conversation history to prevent token overflow
+        # Keep system message, last 2 user messages, and last 2 assistant messages
+        trimmed_history = [conversation_history[0]]  # System message
+        user_messages = [msg for msg in conversation_history[-4:] if msg["role"] == "user"][-2:]
+        assistant_messages = [msg for msg in conversation_history[-4:] if msg["role"] == "assistant"][-2:]
+        trimmed_history.extend(user_messages + assistant_messages)
+
+        # Add current message
+        trimmed_history.append({"role": "user", "content": data})
+
+        # Call OpenAI with trimmed history
+        route = router.route(data, "chat", default="gpt-4")
+        with span("completion", model=route.model, tier=route.tier), router.track(route):
+            response = await client.chat.completions.create(
+                model=route.model,
+                messages=trimmed_history,
+                temperature=0.7,
+                max_tokens=150,
+                presence_penalty=0.6,
+                frequency_penalty=0.2,
+                response_format={ "type": "text" },
+                timeout=15.0  # Set timeout to 15 seconds
+            )
+
+        # Extract the response
+        response_text = response.choices[0].message.content
+
+        # Generate speech in parallel with emotion detection
+        audio_task = asyncio.create_task(generate_speech(response_text, language, audio_format))
+
+        # Determine emotion
+        emotion = "happy"  # Default emotion
+        if any(word in data.lower() for word in ["hurt", "pain", "sick", "ill", "scared", "afraid", "ouch", "duele", "enfermo"]):
+            emotion = "caring"
+        elif any(word in data.lower() for word in ["how", "what", "why", "when", "where", "?", "¿"]):
+            emotion = "listening"
+        elif any(word in response_text.lower() for word in ["great job", "well done", "brave", "excellent", "amazing", "fantastic", "muy bien", "excelente", "valiente", "fantástico"]):
+            emotion = "happy"
+
+        # Wait for audio generation
+        audio_data = await audio_task
+        frame = tag_format({
+            "text": response_text,
+            "emotion": emotion,
+            "audio": audio_data
+        }, audio_format)
+
+        await add_lipsync(frame, audio_data, audio_format)
+
+        # Send response
+        await send_reply(websocket, frame, received_at)
+
+        # Add assistant response to history
+        conversation_history.append({"role": "assistant", "content": response_text})
+
+    except asyncio.TimeoutError:
+        # Handle timeout gracefully
+        timeout_msg = "Lo siento, necesito un momento para pensar..." if language == 'es' else "I need a moment to think..."
+        await websocket.send_json(tag_format({
+            "text": timeout_msg,
+            "emotion": "listening",
+            "audio": await generate_speech(timeout_msg, language, audio_format)
+        }, audio_format))
+    except Exception as e:
+        logger.error(f"Error in chat response: {e}")
+        error_msg = "Lo siento, hubo un error." if language == 'es' else "I'm sorry, there was an error."
+        await websocket.send_json(tag_format({
+            "text": error_msg,
+            "emotion": "caring",
+            "audio": await generate_speech(error_msg, language, audio_format)
+        }, audio_format))
+
 @app.websocket("/chat")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    start_loop_lag_monitor()
+    degradation.start()
+    ACTIVE_CONNECTIONS.inc(endpoint="simple_chat")
     # Initialize conversation history for this connection
     conversation_history = [
         {"role": "system", "content": SYSTEM_MESSAGE}
     ]
     
+    # Clients may pick a TTS format up front with ?audio_format=opus, or later with a hello message
+    requested_format = websocket.query_params.get("audio_format")
+    audio_format = negotiate(requested_format)
+    # The story being told on this socket, if any (story_mode.py); segments are rendered in the current format
+    story = None
+    render_segment = lambda text, language: render_story_segment(text, language, audio_format)
+    
     try:
+        if requested_format:
+            await websocket.send_json(hello_ack(audio_format))
+        
+        # A reconnecting client that sends its session id picks up the conversation where it left off
+        session = await open_session(session_id_from(websocket.query_params))
+        bind_session(session.session_id)
+        conversation_history.extend(session.get("history", []))
+        
         # Send initial greeting
         initial_greeting = "*adjusts stethoscope* Hello! I'm Dr. Snow Paws! How are you feeling today? 🐾"
-        initial_audio = await generate_speech(initial_greeting)
-        await websocket.send_json({
+        initial_audio = await generate_speech(initial_greeting, "en", audio_format)
+        await websocket.send_json(tag_format({
             "text": initial_greeting,
             "emotion": "happy",
             "audio": initial_audio
-        })
+        }, audio_format))
         conversation_history.append({"role": "assistant", "content": initial_greeting})
         
         # Wait for and process messages
@@ -389,103 +549,41 @@ async def websocket_endpoint(websocket: WebSocket):
                 if data == "heartbeat":
                     continue
                 
-                # Process actual messages
-                if not data.strip():
+                hello = parse_hello(data)
+                if hello is not None:
+                    audio_format = negotiate(hello.get("audio_format"))
+                    if session_id_from({}, hello):
+                        session = await open_session(session_id_from({}, hello))
+                        bind_session(session.session_id)
+                        conversation_history[1:] = session.get("history", []) + conversation_history[1:]
+                    await websocket.send_json(hello_ack(audio_format))
                     continue
-                    
-                # Add user message to history
-                conversation_history.append({"role": "user", "content": data})
                 
-                # Detect language
-                language = detect_language(data)
-                logger.info(f"Detected language: {language}")
-                
-                # If OpenAI is available, use it for dynamic responses
-                if not use_openai or not client:
-                    # Use default response if OpenAI is not available
-                    default_response = RESPONSES["default"]
-                    response_text = default_response[f"text{'_es' if language == 'es' else ''}"]
-                    emotion = default_response["emotion"]
-                    audio_data = await generate_speech(response_text, language)
-                    
-                    await websocket.send_json({
-                        "text": response_text,
-                        "emotion": emotion,
-                        "audio": audio_data
-                    })
-                    conversation_history.append({"role": "assistant", "content": response_text})
+                # Process actual messages
+                if not data.strip():
                     continue
-
-                try:
-                    # Update system message with language preference
-                    conversation_history[0]["content"] = SYSTEM_MESSAGE + f"\nRespond in {'Spanish' if language == 'es' else 'English'} only."
-                    
-                    # Trim conversation history to prevent token overflow
-                    # Keep system message, last 2 user messages, and last 2 assistant messages
-                    trimmed_history = [conversation_history[0]]  # System message
-                    user_messages = [msg for msg in conversation_history[-4:] if msg["role"] == "user"][-2:]
-                    assistant_messages = [msg for msg in conversation_history[-4:] if msg["role"] == "assistant"][-2:]
-                    trimmed_history.extend(user_messages + assistant_messages)
+                received_at = time.perf_counter()
                     
-                    # Add current message
-                    trimmed_history.append({"role": "user", "content": data})
-                    
-                    # Call OpenAI with trimmed history
-                    response = await client.chat.completions.create(
-                        model="gpt-4",
-                        messages=trimmed_history,
-                        temperature=0.7,
-                        max_tokens=150,
-                        presence_penalty=0.6,
-                        frequency_penalty=0.2,
-                        response_format={ "type": "text" },
-                        timeout=15.0  # Set timeout to 15 seconds
-                    )
-                    
-                    # Extract the response
-                    response_text = response.choices[0].message.content
-                    
-                    # Generate speech in parallel with emotion detection
-                    audio_task = asyncio.create_task(generate_speech(response_text, language))
-                    
-                    # Determine emotion
-                    emotion = "happy"  # Default emotion
-                    if any(word in data.lower() for word in ["hurt", "pain", "sick", "ill", "scared", "afraid", "ouch", "duele", "enfermo"]):
-                        emotion = "caring"
-                    elif any(word in data.lower() for word in ["how", "what", "why", "when", "where", "?", "¿"]):
-                        emotion = "listening"
-                    elif any(word in response_text.lower() for word in ["great job", "well done", "brave", "excellent", "amazing", "fantastic", "muy bien", "excelente", "valiente", "fantástico"]):
-                        emotion = "happy"
-                    
-                    # Wait for audio generation
-                    audio_data = await audio_task
-                    
-                    # Send response
-                    await websocket.send_json({
-                        "text": response_text,
-                        "emotion": emotion,
-                        "audio": audio_data
-                    })
-                    
-                    # Add assistant response to history
-                    conversation_history.append({"role": "assistant", "content": response_text})
-                    
-                except asyncio.TimeoutError:
-                    # Handle timeout gracefully
-                    timeout_msg = "Lo siento, necesito un momento para pensar..." if language == 'es' else "I need a moment to think..."
-                    await websocket.send_json({
-                        "text": timeout_msg,
-                        "emotion": "listening",
-                        "audio": await generate_speech(timeout_msg, language)
-                    })
-                except Exception as e:
-                    logger.error(f"Error in chat response: {e}")
-                    error_msg = "Lo siento, hubo un error." if language == 'es' else "I'm sorry, there was an error."
-                    await websocket.send_json({
-                        "text": error_msg,
-                        "emotion": "caring",
-                        "audio": await generate_speech(error_msg, language)
-                    })
+                with degradation.track_turn("simple_chat"), start_trace("simple_app_turn", endpoint="simple_chat"):
+                    steer = True
+                    if story is not None:
+                        action = story_mode.classify(data)
+                        steer = action == "steer"
+                        if action == "exit":
+                            story.close()
+                            story = None
+                    elif story_mode.wants_story(data) and get_client():
+                        story = story_mode.Story(complete_story, render_segment, detect_language(data), SYSTEM_MESSAGE)
+                    told = story is not None and await process_story_turn(
+                        websocket, conversation_history, story, data, received_at, steer)
+                    if story is not None and (not told or story.finished):
+                        story.close()
+                        story = None
+                    if not told:
+                        await process_turn(websocket, conversation_history, data, received_at, audio_format)
+                    if session.persistent:
+                        session.set("history", conversation_history[1:][-MAX_HISTORY:])
+                        await session.save()
             
             except WebSocketDisconnect:
                 logger.info("Client disconnected")
@@ -497,8 +595,14 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         await websocket.close()
+    finally:
+        if story is not None:
+            story.close()
+        ACTIVE_CONNECTIONS.dec(endpoint="simple_chat")
 
 if __name__ == "__main__":
+    import uvicorn
+
     def find_available_port(start_port, max_attempts=5):
         """Try to find an available port starting from start_port"""
         for port in range(start_port, start_port + max_attempts):
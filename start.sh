@@ -4,4 +4,4 @@
 PORT=${PORT:-8080}
 
 # Start the application with the correct port
-uvicorn main:app --host 0.0.0.0 --port $PORT 
\ No newline at end of file
+PRELOAD_BOT=${PRELOAD_BOT:-true} uvicorn main:app --host 0.0.0.0 --port $PORT 
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Startup snapshot: precomputed assets that load with a single file read.
+
+A cold start otherwise pays for reading (or, without a build, compressing)
+every static asset, and the first visitor waits for the greeting to be
+synthesized. The snapshot bundles the compressed static assets and,
+optionally, the greeting audio into one pickle:
+
+    python startup_snapshot.py                          # static assets only
+    python startup_snapshot.py --greetings --format mp3 --format opus
+
+Greeting audio needs OPENAI_API_KEY at build time. The snapshot is ignored
+when it is missing, from another version, or older than the static sources.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import pickle
+import time
+from typing import Any, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(BASE_DIR, "snapshot.bin"))
+MAGIC = b"SNOWPAWS-SNAPSHOT-1\n"
+
+_loaded: Dict[str, Dict[str, Any]] = {}
+
+
+def load(path: str = SNAPSHOT_PATH) -> Dict[str, Any]:
+    """The snapshot contents, read once per process; empty if there is no usable snapshot."""
+    if path not in _loaded:
+        snapshot: Dict[str, Any] = {}
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if data.startswith(MAGIC):
+                snapshot = pickle.loads(memoryview(data)[len(MAGIC):])
+            else:
+                logger.warning(f"Ignoring snapshot {path} from another version")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        _loaded[path] = snapshot
+    return _loaded[path]
+
+
+def cached_audio(path: str = SNAPSHOT_PATH) -> List[Tuple[Hashable, str]]:
+    """(audio cache key, base64 audio) pairs to seed the bot's audio cache with."""
+    return load(path).get("audio", [])
+
+
+async def _greeting_audio(formats: List[str]) -> List[Tuple[Hashable, str]]:
+    from bot import DoctorSnowLeopardBot
+
+    bot = DoctorSnowLeopardBot()
+    for audio_format in formats:
+        for greeting in bot.greetings:
+            await bot.generate_speech(bot.clean_text_for_tts(greeting), "en", audio_format)
+    # A shared cache may hand back memoryviews, which pickle rejects
+    return [(key, bytes(audio) if isinstance(audio, memoryview) else audio)
+            for key, audio in bot.audio_cache.items()]
+
+
+def build(path: str = SNAPSHOT_PATH, static_dir: str = os.path.join(BASE_DIR, "static"),
+          greeting_formats: List[str] = ()) -> Dict[str, Any]:
+    """Write a snapshot of the static assets (and greeting audio in `greeting_formats`)."""
+    from build_static import collect_assets
+
+    snapshot = {
+        "built_at": time.time(),
+        "static_dir": os.path.realpath(static_dir),
+        "static": collect_assets(static_dir),
+        "audio": asyncio.run(_greeting_audio(list(greeting_formats))) if greeting_formats else [],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    _loaded.pop(path, None)
+    return snapshot
+
+
+if __name__ == "__main__":
+    from audio_formats import MIME_TYPES
+
+    parser = argparse.ArgumentParser(description="Build the startup snapshot")
+    parser.add_argument("--output", default=SNAPSHOT_PATH)
+    parser.add_argument("--greetings", action="store_true", help="Synthesize the greetings (needs OPENAI_API_KEY)")
+    parser.add_argument("--format", action="append", dest="formats", choices=sorted(MIME_TYPES),
+                        help="Greeting audio format (default mp3)")
+    args = parser.parse_args()
+
+    built = build(args.output, greeting_formats=(args.formats or ["mp3"]) if args.greetings else [])
+    print(f"Wrote {args.output}: {len(built['static'])} static assets, "
+          f"{len(built['audio'])} greeting clips, {os.path.getsize(args.output)} bytes")
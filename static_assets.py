@@ -0,0 +1,179 @@
+"""
+In-memory static asset layer with precompressed variants.
+
+Serves the CSS/JS/HTML built by build_static.py from memory, picking the best
+encoding the client accepts (br, then gzip, then identity). Content-hashed URLs
+are cached as immutable for a year; pages and unhashed URLs are revalidated
+by ETag. Anything else under static/ (images, audio, video) falls through to
+StaticFiles.
+
+Loading may mean compressing every asset (gzip -9, brotli -11) when there is no
+build, so the ASGI app and `page` load on a worker thread, never on the loop.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+import startup_snapshot
+from build_static import DIST_DIRNAME, MANIFEST_NAME, collect_assets, load_dist
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """Best encoding in `available` allowed by an Accept-Encoding header (q=0 excludes)."""
+    allowed = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        allowed[name.strip().lower()] = q
+    wildcard = allowed.get("*", 0.0)
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in available and allowed.get(encoding, wildcard) > 0:
+            return encoding
+    return "identity"
+
+
+def _is_stale(static_dir: str, assets: Dict[str, dict], built_at: float) -> bool:
+    for asset in assets.values():
+        source = os.path.join(static_dir, asset["source"])
+        if not os.path.exists(source) or os.path.getmtime(source) > built_at:
+            return True
+    return False
+
+
+def load_assets(static_dir: str) -> Dict[str, dict]:
+    """Assets from the startup snapshot, else the static build, else compressed in memory."""
+    snapshot = startup_snapshot.load()
+    if snapshot.get("static_dir") == os.path.realpath(static_dir):
+        if not _is_stale(static_dir, snapshot["static"], snapshot["built_at"]):
+            return snapshot["static"]
+        logger.warning("Snapshot static assets are older than their sources; ignoring them")
+    assets = load_dist(static_dir)
+    if assets is None:
+        logger.info("No static build found; compressing assets in memory")
+        return collect_assets(static_dir)
+    manifest_mtime = os.path.getmtime(os.path.join(static_dir, DIST_DIRNAME, MANIFEST_NAME))
+    if _is_stale(static_dir, assets, manifest_mtime):
+        logger.warning("Static build is older than its sources; rebuilding in memory (run build_static.py)")
+        return collect_assets(static_dir)
+    return assets
+
+
+class StaticAssets:
+    """ASGI app for the /static mount; assets are loaded on first use to keep imports cheap."""
+
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self._files: Optional[StaticFiles] = None
+        self._assets: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+        self._loading: Optional[asyncio.Future] = None
+        self.urls: Dict[str, str] = {}
+
+    @property
+    def files(self) -> StaticFiles:
+        if self._files is None:
+            self._files = StaticFiles(directory=self.static_dir)
+        return self._files
+
+    @property
+    def assets(self) -> Dict[str, dict]:
+        return self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        with self._lock:
+            if self._assets is None:
+                try:
+                    assets = load_assets(self.static_dir)
+                except Exception as e:
+                    # Everything is still reachable through StaticFiles, just uncompressed
+                    logger.error(f"Error loading static assets: {e}", exc_info=True)
+                    assets = {}
+                self._assets = self._index(assets)
+                logger.info(f"Serving {len(assets)} static assets from memory")
+        return self._assets
+
+    async def load(self) -> Dict[str, dict]:
+        """Load the assets on a worker thread (once); concurrent callers share the load."""
+        if self._assets is not None:
+            return self._assets
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self._load)
+        return await asyncio.shield(self._loading)
+
+    def _index(self, assets: Dict[str, dict]) -> Dict[str, dict]:
+        served = dict(assets)
+        for url_path, asset in assets.items():
+            self.urls[asset["source"]] = url_path
+            if asset["immutable"]:
+                # Old pages may still link the unhashed URL; serve it, but revalidated
+                served.setdefault(asset["source"], dict(asset, immutable=False))
+        return served
+
+    def url(self, source: str) -> str:
+        """Public URL for a source path such as "css/main.css"."""
+        self._load()
+        return f"/static/{self.urls.get(source, source)}"
+
+    def response(self, path: str, headers: Headers, method: str = "GET") -> Optional[Response]:
+        """Response for an asset path relative to /static, or None if it isn't built."""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        variants = asset["variants"]
+        encoding = choose_encoding(headers.get("accept-encoding", ""), variants)
+        etag = asset["etag"] if encoding == "identity" else f'{asset["etag"][:-1]}-{encoding}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if asset["immutable"] else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        body = variants[encoding]
+        if method == "HEAD":
+            response_headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(body, media_type=asset["media_type"], headers=response_headers)
+
+    async def page(self, name: str, request: Request) -> Optional[Response]:
+        """Serve a top-level page such as "index.html"."""
+        await self.load()
+        return self.response(name, request.headers, request.method)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            # Starlette keeps the mount prefix in path and exposes it as root_path
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            await self.load()
+            response = self.response(path.lstrip("/"), Headers(scope=scope), scope["method"])
+            if response is not None:
+                await response(scope, receive, send)
+                return
+        await self.files(scope, receive, send)
@@ -0,0 +1,225 @@
+"""
+Storytelling mode for simple_app's /chat socket: stories told in segments, with the next one prefetched.
+
+A bedtime story used to be one 150-token reply, and every "what happens
+next?" paid a cold completion plus TTS while the child waited. When a child
+asks for a story, the socket switches to story mode:
+
+- The story is generated one segment at a time (a few sentences each, up to
+  STORY_MAX_SEGMENTS), every segment continuing the story so far.
+- As soon as segment N is sent, segment N+1's text and speech are generated in
+  the background, so "what happens next?" is answered from the prefetch.
+- Anything else the child says about the story steers it ("make the dragon
+  purple"): the prefetched segment no longer fits and is discarded, and the
+  next one is written with the child's idea in it.
+- Prefetching is speculative work, so it has a budget: at most
+  STORY_PREFETCH_MAX prefetches per process at once, none while the service
+  is degraded (degradation.py), and none after the last segment.
+- A message that is only "stop", "the end", "fin"..., or a child saying they
+  are hurt or scared, ends the story, and the message is answered as a normal
+  turn. The same words inside a steer ("make the dragon stop") do not.
+
+Segments go out as normal reply frames plus
+{"story": {"id": ..., "segment": n, "last": bool}}, so clients that know
+nothing about stories simply show them. snowpaws_story_segment_gap_seconds
+reports the gap the child waits between asking for a segment and getting it,
+by whether it came from a prefetch; prefetch outcomes are counted in
+snowpaws_story_prefetch_total.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from degradation import controller as degradation
+from metrics import Counter, Histogram
+from tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+STORY_MODE_ENABLED = os.getenv("STORY_MODE_ENABLED", "true").lower() == "true"
+STORY_MAX_SEGMENTS = int(os.getenv("STORY_MAX_SEGMENTS", "6"))
+STORY_SEGMENT_TOKENS = int(os.getenv("STORY_SEGMENT_TOKENS", "220"))
+STORY_PREFETCH_MAX = int(os.getenv("STORY_PREFETCH_MAX", "16"))
+
+STORY_INSTRUCTIONS = """
+You are telling a bedtime story in short segments, one segment per reply.
+Write only the next segment: 3 to 5 gentle sentences in your storytelling voice, continuing the story so far.
+If the child asked for something, weave it into the story.
+End the segment at a calm moment that makes the child curious about what happens next.
+"""
+LAST_SEGMENT = "This is the last segment: bring the story to a calm, happy ending and wish the child sweet dreams."
+
+_START = re.compile(
+    r"\b(tell|read|hear|want|share)\b.*\b(story|stories|tale)\b|\bbedtime story\b|"
+    r"\b(cu[eé]ntame|contar|cuenta|leer|escuchar|quiero)\b.*\b(cuento|historia)\b",
+    re.IGNORECASE,
+)
+_CONTINUE = re.compile(
+    r"^\W*(and\s+)?(then|next|more|continue|keep going|go on|what happen(s|ed)? next|and then what|"
+    r"y\s+(luego|despu[eé]s)|qu[eé] pas[oó] despu[eé]s|qu[eé] pasa despu[eé]s|sigue|m[aá]s|contin[uú]a)\W*"
+    r"(please|por favor)?\W*$",
+    re.IGNORECASE,
+)
+# Only a whole message ends the story ("stop!", "fin"): the same words inside a steer do not
+_EXIT = re.compile(
+    r"^\W*(stop|the end|i'?m done|no more|enough|that'?s enough|"
+    r"basta|ya no|fin|ya est[aá]|no m[aá]s)\W*(please|por favor)?\W*$",
+    re.IGNORECASE,
+)
+# The child (not a character) is hurt, sick or scared: only a message that starts with the
+# child's own state counts, so "make my dragon scared" still steers
+_DISTRESS = re.compile(
+    r"^\W*("
+    r"(i'?m|i am|i feel|i'?m feeling)\s+((so|very|really|too|a little|kind of)\s+)?"
+    r"(scared|afraid|frightened|sick|hurt|hurting|in pain|not (ok|okay|well))"
+    r"|(my \w+|it) (hurts?|is hurting)"
+    r"|me duele|tengo miedo|tengo dolor|estoy enferm[oa]|estoy asustad[oa]|me siento mal"
+    r")\b",
+    re.IGNORECASE,
+)
+
+STORY_SEGMENT_GAP_SECONDS = Histogram(
+    "snowpaws_story_segment_gap_seconds",
+    "Time from the child asking for the next story segment to it being sent",
+    ["source"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0),
+)
+STORY_PREFETCH = Counter("snowpaws_story_prefetch_total", "Prefetched story segments by outcome", ("outcome",))
+STORY_SEGMENTS = Counter("snowpaws_story_segments_total", "Story segments sent", ("source",))
+
+Complete = Callable[[List[dict], str], Awaitable[str]]
+Render = Callable[[str, str], Awaitable[dict]]
+
+_prefetching = 0
+
+
+def wants_story(message: str) -> bool:
+    """Whether the child is asking for a story."""
+    return STORY_MODE_ENABLED and bool(_START.search(message))
+
+
+def classify(message: str) -> str:
+    """What a message means during a story: "continue", "exit" or "steer"."""
+    if _CONTINUE.match(message):
+        return "continue"
+    if _EXIT.match(message) or _DISTRESS.match(message):
+        return "exit"
+    return "steer"
+
+
+class Segment:
+    """One generated segment: its text and the rendered frame (speech included)."""
+
+    def __init__(self, text: str, frame: dict):
+        self.text = text
+        self.frame = frame
+
+
+class Story:
+    """
+    A story being told on one socket. `complete(messages, language)` writes a
+    segment from chat messages; `render(text, language)` turns it into a
+    reply frame with speech.
+    """
+
+    def __init__(self, complete: Complete, render: Render, language: str, system_message: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.complete = complete
+        self.render = render
+        self.language = language
+        self.system_message = system_message
+        # The story so far: the child's requests and the segments told
+        self.messages: List[dict] = []
+        self.segments = 0
+        self.prefetch: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.segments >= STORY_MAX_SEGMENTS
+
+    def _prompt(self, request: str, number: int) -> List[dict]:
+        system = self.system_message + STORY_INSTRUCTIONS
+        if number >= STORY_MAX_SEGMENTS:
+            system += LAST_SEGMENT
+        return [{"role": "system", "content": system}] + self.messages + [{"role": "user", "content": request}]
+
+    async def _generate(self, request: str, number: int) -> Segment:
+        text = await self.complete(self._prompt(request, number), self.language)
+        frame = await self.render(text, self.language)
+        frame["story"] = {"id": self.id, "segment": number, "last": number >= STORY_MAX_SEGMENTS}
+        return Segment(text, frame)
+
+    def _start_prefetch(self):
+        global _prefetching
+        if self.finished:
+            return
+        if degradation.current_level > 0 or _prefetching >= STORY_PREFETCH_MAX:
+            STORY_PREFETCH.inc(outcome="skipped")
+            return
+        _prefetching += 1
+
+        async def run() -> Segment:
+            with start_trace("story_prefetch", endpoint="simple_chat"):
+                return await self._generate("What happens next?", self.segments + 1)
+
+        def release(_):
+            global _prefetching
+            _prefetching -= 1
+
+        # A fresh context, so the prefetch is its own trace rather than a span of a finished turn
+        self.prefetch = asyncio.get_running_loop().create_task(run(), context=contextvars.Context())
+        self.prefetch.add_done_callback(release)
+
+    def discard_prefetch(self):
+        """Drop the prefetched segment (the story went somewhere else)."""
+        if self.prefetch is not None:
+            self.prefetch.cancel()
+            STORY_PREFETCH.inc(outcome="discarded")
+            self.prefetch = None
+
+    async def _take_prefetch(self) -> Optional[Segment]:
+        prefetch, self.prefetch = self.prefetch, None
+        if prefetch is None:
+            return None
+        try:
+            segment = await prefetch
+        except Exception as e:
+            logger.warning(f"Story prefetch failed, generating the segment now: {e}")
+            STORY_PREFETCH.inc(outcome="failed")
+            return None
+        STORY_PREFETCH.inc(outcome="used")
+        return segment
+
+    async def next(self, message: str, received_at: float, steer: bool) -> dict:
+        """
+        The next segment's frame. A continuation is served from the prefetch
+        when there is one; a steer discards it and writes the segment around
+        the child's message.
+        """
+        segment = None
+        source = "cold"
+        if steer:
+            self.discard_prefetch()
+        else:
+            ready = self.prefetch is not None and self.prefetch.done()
+            segment = await self._take_prefetch()
+            if segment is not None:
+                source = "prefetched" if ready else "prefetch_in_flight"
+        if segment is None:
+            segment = await self._generate(message, self.segments + 1)
+        self.segments += 1
+        self.messages += [{"role": "user", "content": message}, {"role": "assistant", "content": segment.text}]
+        STORY_SEGMENTS.inc(source=source)
+        # The first segment has nothing before it to wait between
+        if self.segments > 1:
+            STORY_SEGMENT_GAP_SECONDS.observe(time.perf_counter() - received_at, source=source)
+        self._start_prefetch()
+        return segment.frame
+
+    def close(self):
+        self.discard_prefetch()
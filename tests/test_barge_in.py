@@ -0,0 +1,64 @@
+import asyncio
+
+from barge_in import TurnScheduler, handle_control, parse_message
+
+
+def test_parse_message():
+    assert parse_message('{"type": "message", "id": "m1", "text": "hi"}')["id"] == "m1"
+    assert parse_message("hello") is None
+    assert parse_message('{"type": "message", "text": 3}') is None
+
+
+def run(scenario):
+    sent = []
+
+    async def send(frame):
+        sent.append(frame)
+
+    async def main():
+        scheduler = TurnScheduler("test", send)
+        await scenario(scheduler)
+        await scheduler.close()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    return sent
+
+
+def answer(text, delay=0.0):
+    async def reply(turn):
+        await asyncio.sleep(delay)
+        await turn.send({"text": text})
+    return reply
+
+
+def test_plain_turns_answer_in_order():
+    async def scenario(scheduler):
+        scheduler.submit(answer("first", 0.05))
+        last = scheduler.submit(answer("second"))
+        await last.task
+
+    assert run(scenario) == [{"text": "first"}, {"text": "second"}]
+
+
+def test_superseded_turn_is_cancelled():
+    async def scenario(scheduler):
+        scheduler.submit(answer("slow", 0.5), message_id="m1")
+        await asyncio.sleep(0)
+        last = scheduler.submit(answer("fast"), message_id="m2", supersede=True)
+        await last.task
+
+    sent = run(scenario)
+    assert {"type": "cancelled", "id": "m1", "reason": "superseded"} in sent
+    assert {"text": "fast", "reply_to": "m2"} in sent
+    assert {"text": "slow", "reply_to": "m1"} not in sent
+
+
+def test_cancel_frame():
+    async def scenario(scheduler):
+        turn = scheduler.submit(answer("slow", 0.5), message_id="7")
+        await asyncio.sleep(0)
+        assert handle_control(scheduler, '{"type": "cancel", "id": 7}')
+        await asyncio.wait([turn.task])
+
+    assert run(scenario) == [{"type": "cancelled", "id": "7", "reason": "cancel"}]
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+import faq_pack
+from bot import DoctorSnowLeopardBot
+from degradation import controller as degradation
+from guardrails import GuardrailUnavailable
+from semantic_cache import SemanticCache
+
+
+class Guardrails:
+    def __init__(self, verdict=(True, "")):
+        self.verdict = verdict
+        self.checked = []
+
+    async def check_input(self, message):
+        self.checked.append(message)
+        if isinstance(self.verdict, Exception):
+            raise self.verdict
+        return self.verdict
+
+
+class Translator:
+    def quick_detect(self, message):
+        return "en"
+
+
+class Turn:
+    def set(self, **fields):
+        pass
+
+
+def make_bot(tmp_path, verdict=(True, "")):
+    bot = DoctorSnowLeopardBot.__new__(DoctorSnowLeopardBot)
+    bot.guardrails = Guardrails(verdict)
+    bot.translator = Translator()
+    entries = [{
+        "key": "shot",
+        "replies": {"en": {"text": "Just a little pinch!", "emotion": "caring", "speech": "Just a little pinch!",
+                           "questions": ["Will the shot hurt?"], "audio": {}}},
+    }]
+    faq_pack.write(str(tmp_path / "faq.bin"), entries, {}, {})
+    bot.faq_pack = faq_pack.FaqPack(str(tmp_path / "faq.bin"))
+    bot.semantic_cache = SemanticCache()
+    bot.semantic_cache.put("Why do I need a shot?", "en", "It keeps you strong!", "happy")
+
+    async def finish(text, language, audio_format, emotion=None):
+        return {"text": text, "audio": None, "emotion": emotion}
+
+    bot._finish = finish
+    return bot
+
+
+@pytest.fixture(autouse=True)
+def reset_degradation():
+    yield
+    degradation.force(None)
+
+
+def test_exact_pack_question_skips_the_input_check(tmp_path):
+    bot = make_bot(tmp_path)
+    reply = asyncio.run(bot._pack_response("Will the shot hurt?", Turn(), "mp3", None))
+    assert reply["text"] == "Just a little pinch!"
+    assert bot.guardrails.checked == []
+
+
+def test_pack_rephrasing_is_checked(tmp_path):
+    bot = make_bot(tmp_path)
+    reply = asyncio.run(bot._pack_response("Is the shot going to hurt?", Turn(), "mp3", None))
+    assert reply["text"] == "Just a little pinch!"
+    assert bot.guardrails.checked == ["Is the shot going to hurt?"]
+
+
+def test_unsafe_pack_rephrasing_gets_the_safe_reply(tmp_path):
+    bot = make_bot(tmp_path, verdict=(False, "Let's talk to a grown-up."))
+    reply = asyncio.run(bot._pack_response("Is the shot going to hurt?", Turn(), "mp3", None))
+    assert reply["text"] == "Let's talk to a grown-up."
+
+
+def test_pack_rephrasing_is_not_served_without_the_guardrail(tmp_path):
+    bot = make_bot(tmp_path, verdict=GuardrailUnavailable("breaker open"))
+    assert asyncio.run(bot._pack_response("Is the shot going to hurt?", Turn(), "mp3", None)) is None
+
+
+def test_semantic_hit_is_checked(tmp_path):
+    bot = make_bot(tmp_path)
+    reply = asyncio.run(bot._semantic_response("Why do I have to get a shot?", Turn(), "mp3", None))
+    assert reply["text"] == "It keeps you strong!"
+    assert bot.guardrails.checked == ["Why do I have to get a shot?"]
+
+
+def test_semantic_hit_is_not_served_without_the_guardrail(tmp_path):
+    bot = make_bot(tmp_path, verdict=GuardrailUnavailable("breaker open"))
+    assert asyncio.run(bot._semantic_response("Why do I have to get a shot?", Turn(), "mp3", None)) is None
+
+
+def test_semantic_cache_is_off_while_checks_are_skipped(tmp_path):
+    bot = make_bot(tmp_path)
+    degradation.force(degradation.levels.index("bank_skip_checks") + 1)
+    assert asyncio.run(bot._semantic_response("Why do I have to get a shot?", Turn(), "mp3", None)) is None
+    assert bot.guardrails.checked == []
+
+
+def test_pack_rephrasing_is_checked_under_load(tmp_path):
+    bot = make_bot(tmp_path)
+    degradation.force(len(degradation.levels))
+    asyncio.run(bot._pack_response("Is the shot going to hurt?", Turn(), "mp3", None))
+    assert bot.guardrails.checked == ["Is the shot going to hurt?"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from circuit_breaker import CircuitBreaker, is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error", [
+    asyncio.TimeoutError(),
+    ConnectionResetError(),
+    openai.APIConnectionError(request=httpx.Request("POST", "http://upstream")),
+    openai.APITimeoutError(request=httpx.Request("POST", "http://upstream")),
+    StatusError(429),
+    StatusError(500),
+    StatusError(503),
+])
+def test_retryable(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize("error", [
+    StatusError(400),
+    StatusError(401),
+    StatusError(404),
+    ValueError("unparseable reply"),
+    KeyError("choices"),
+])
+def test_not_retryable(error):
+    assert not is_retryable(error)
+
+
+def run_calls(breaker, error, count, retries=0):
+    attempts = []
+
+    async def factory():
+        attempts.append(1)
+        raise error
+
+    async def main():
+        for _ in range(count):
+            with pytest.raises(type(error)):
+                await breaker.call(factory, retries=retries)
+
+    asyncio.run(main())
+    return len(attempts)
+
+
+def test_client_errors_do_not_trip():
+    breaker = CircuitBreaker("test", min_calls=3, window=5)
+    assert run_calls(breaker, StatusError(400), 10, retries=2) == 10
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_server_errors_retry_and_trip():
+    breaker = CircuitBreaker("test", min_calls=3, window=5)
+    assert run_calls(breaker, StatusError(503), 1, retries=1) == 2
+    run_calls(breaker, StatusError(503), 1)
+    assert breaker.state == CircuitBreaker.OPEN
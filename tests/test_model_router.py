@@ -0,0 +1,64 @@
+import pytest
+
+from model_router import ModelRouter, TierStats, classify
+
+TIERS = {"light": "mini", "standard": "std", "heavy": "big"}
+
+
+def make_router(**kwargs):
+    return ModelRouter(dict(TIERS), **kwargs)
+
+
+def degrade(router, purpose, tier):
+    stats = router.stats.setdefault((purpose, tier), TierStats())
+    stats.record(30.0, ok=False)
+
+
+def test_classify():
+    assert classify("hi!")[0] == "light"
+    assert classify("I took too many pills") == ("heavy", "risk")
+
+
+def test_guardrail_never_below_min_tier():
+    router = make_router()
+    route = router.route("hi!", "guardrail", "default")
+    assert (route.tier, route.model) == ("standard", "std")
+    assert router.route("hi!", "chat", "default").tier == "light"
+
+
+def test_risky_guardrail_check_goes_heavy():
+    router = make_router()
+    assert router.route("I took too many pills", "guardrail", "default").tier == "heavy"
+
+
+def test_guardrail_failover_stays_at_or_above_min_tier():
+    router = make_router()
+    degrade(router, "guardrail", "standard")
+    assert router.route("hi!", "guardrail", "default").tier == "heavy"
+    # With heavy unhealthy too there is nowhere safe to go: the check stays on its tier
+    degrade(router, "guardrail", "heavy")
+    route = router.route("hi!", "guardrail", "default")
+    assert route.tier == "standard" and route.reason != "failover"
+
+
+def test_chat_failover():
+    router = make_router()
+    degrade(router, "chat", "light")
+    route = router.route("hi!", "chat", "default")
+    assert (route.tier, route.reason) == ("standard", "failover")
+
+
+def test_unhealthy_tier_gets_a_probe():
+    router = make_router(probe_seconds=0.0)
+    degrade(router, "chat", "light")
+    assert router.route("hi!", "chat", "default").tier == "light"
+
+
+def test_disabled_router_uses_the_call_site_model():
+    router = make_router(enabled=False)
+    assert router.route("I took too many pills", "guardrail", "default").model == "default"
+
+
+def test_unknown_tiers_are_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter({"huge": "x"})
@@ -0,0 +1,73 @@
+import pytest
+
+import faq_pack
+from semantic_cache import THRESHOLD, SemanticCache, cacheable, embed
+
+
+def similarity(a, b):
+    return float(embed(a) @ embed(b))
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Will the shot hurt?", "Is the shot going to hurt?"),
+    ("Will the shot hurt?", "Does the shot hurt?"),
+    ("Why do I need a shot?", "Why do I have to get a shot?"),
+])
+def test_rephrasings_match(stored, asked):
+    assert similarity(stored, asked) >= THRESHOLD
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Will the shot hurt?", "Will the surgery hurt?"),
+    ("Will the shot hurt?", "Will the blood test hurt?"),
+    ("What is a fever?", "Why do I have a fever?"),
+])
+def test_different_questions_miss(stored, asked):
+    assert similarity(stored, asked) < THRESHOLD
+
+
+def test_risky_questions_are_not_cacheable():
+    assert cacheable("Will the shot hurt?")
+    assert not cacheable("How many pills should I take?")
+    assert not cacheable("Will the surgery hurt?")
+
+
+def test_cache_never_answers_a_risky_question():
+    cache = SemanticCache()
+    cache.put("How many pills can I take?", "en", "Ask your grown-up!", "caring")
+    cache.put("Will the shot hurt?", "en", "Just a little pinch!", "caring")
+    # Same features as the stored question, but risky questions are never looked up or stored
+    assert similarity("How many pills can I take?", "How many pills should I take?") >= THRESHOLD
+    assert cache.get("How many pills should I take?", "en") is None
+    assert len(cache) == 1
+    hit = cache.get("Is the shot going to hurt?", "en")
+    assert hit is not None and hit.text == "Just a little pinch!"
+    assert cache.get("Is the shot going to hurt?", "es") is None
+
+
+def write_pack(path, questions):
+    entries = [{
+        "key": "shot",
+        "replies": {"en": {"text": "Just a little pinch!", "emotion": "caring", "speech": "Just a little pinch!",
+                           "questions": questions, "audio": {}}},
+    }]
+    faq_pack.write(str(path), entries, {}, {})
+    return faq_pack.FaqPack(str(path))
+
+
+def test_pack_exact_and_rephrased_matches(tmp_path):
+    pack = write_pack(tmp_path / "faq.bin", ["Will the shot hurt?"])
+    assert pack.threshold == THRESHOLD
+    exact = pack.match("will the SHOT hurt", "en")
+    assert exact is not None and exact.exact
+    rephrased = pack.match("Is the shot going to hurt?", "en")
+    assert rephrased is not None and not rephrased.exact
+    assert pack.match("What is a fever?", "en") is None
+    assert pack.match("Will the shot hurt?", "es") is None
+
+
+def test_pack_never_matches_a_risky_rephrasing(tmp_path):
+    pack = write_pack(tmp_path / "faq.bin", ["How many pills can I take?"])
+    # A curated question is served as is; a rephrasing of it has to be cacheable
+    assert pack.match("How many pills can I take?", "en").exact
+    assert pack.match("How many pills should I take?", "en") is None
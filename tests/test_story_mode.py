@@ -0,0 +1,41 @@
+import pytest
+
+import story_mode
+
+
+@pytest.mark.parametrize("message", [
+    "What happens next?",
+    "and then what",
+    "sigue por favor",
+])
+def test_continue(message):
+    assert story_mode.classify(message) == "continue"
+
+
+@pytest.mark.parametrize("message", [
+    "stop!",
+    "the end",
+    "fin",
+    "I'm scared",
+    "I'm really scared",
+    "I feel sick",
+    "my tummy hurts",
+    "it hurts",
+    "me duele la panza",
+    "tengo miedo",
+    "estoy enferma",
+])
+def test_exit(message):
+    assert story_mode.classify(message) == "exit"
+
+
+@pytest.mark.parametrize("message", [
+    "make my dragon scared",
+    "I want the knight to be afraid",
+    "the bear is sick, can the doctor help him?",
+    "make the dragon stop",
+    "I'm not scared of dragons",
+    "que el dragón tenga miedo",
+])
+def test_steer(message):
+    assert story_mode.classify(message) == "steer"
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import vad
+
+
+def test_wav_round_trip():
+    samples = (np.sin(np.linspace(0, 200, 24000)) * 0.5).astype(np.float32).reshape(-1, 1)
+    decoded, rate = vad.decode(vad.encode_wav(samples, 24000))
+    assert rate == 24000
+    assert decoded.shape == (24000, 1)
+    assert np.abs(decoded - samples).max() < 1e-3
+
+
+def test_pcm_format_from_content_type():
+    data = np.array([0, 16384, -16384, 32767], dtype="<i2").tobytes()
+    decoded, rate = vad.decode(data, "audio/pcm;rate=24000;channels=2")
+    assert rate == 24000
+    assert decoded.shape == (2, 2)
+    assert decoded[0, 1] == 0.5
+
+
+def test_pcm_drops_a_partial_frame():
+    decoded, _ = vad.decode(b"\0" * 7, "audio/pcm;channels=2")
+    assert decoded.shape == (1, 2)
+
+
+@pytest.mark.parametrize("content_type", [
+    "audio/pcm;rate=0",
+    "audio/pcm;rate=-16000",
+    "audio/pcm;channels=0",
+    "audio/pcm;rate=16000;channels=-1",
+])
+def test_invalid_pcm_format(content_type):
+    with pytest.raises(ValueError):
+        vad.decode(b"\0" * 64, content_type)
+
+
+def test_to_mono_16k():
+    stereo = np.ones((48000, 2), dtype=np.float32)
+    mono = vad.to_mono_16k(stereo, 48000)
+    assert mono.shape == (16000, 1)
@@ -0,0 +1,151 @@
+"""
+Per-turn tracing: nested timed spans kept in a bounded ring buffer.
+
+A trace is started once per turn (`start_trace`), and every pipeline stage
+opens a `span` inside it. The current trace and span travel in context
+variables, so spans opened in tasks spawned during the turn nest correctly.
+Spans named after a pipeline stage also feed the stage latency histogram.
+"""
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+from metrics import STAGE_SECONDS, STAGES
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+
+class Span:
+    """A named, timed unit of work with attributes and child spans."""
+
+    __slots__ = ("name", "attrs", "start", "end", "children", "error")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class Trace:
+    """All spans recorded for one turn."""
+
+    def __init__(self, name: str, turn_id: str, attrs: Dict[str, Any]):
+        self.turn_id = turn_id
+        self.started_at = time.time()
+        self.root = Span(name, attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turn_id": self.turn_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            "root": self.root.to_dict(self.root.start),
+        }
+
+
+RECENT_TRACES: Deque[Trace] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_current_session: ContextVar[Optional[str]] = ContextVar("current_session", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_turn_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.turn_id if trace else None
+
+
+def bind_session(session_id: Optional[str]):
+    """Record the session served by this task (and tasks it spawns), for log records."""
+    _current_session.set(session_id)
+
+
+def current_session_id() -> Optional[str]:
+    return _current_session.get()
+
+
+@contextmanager
+def start_trace(name: str, turn_id: Optional[str] = None, **attrs):
+    """
+    Start a turn trace, or open a nested span if a trace is already active.
+
+    The finished trace is appended to RECENT_TRACES.
+    """
+    if _current_trace.get() is not None:
+        with span(name, **attrs) as nested:
+            yield nested
+        return
+
+    trace = Trace(name, turn_id or uuid.uuid4().hex[:12], attrs)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace.root
+    except BaseException as e:
+        trace.root.error = type(e).__name__
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        RECENT_TRACES.append(trace)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage of the current turn; works (untraced) outside a turn too."""
+    current = Span(name, attrs)
+    parent = _current_span.get()
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        if name in STAGES:
+            STAGE_SECONDS.observe(current.end - current.start, stage=name)
+
+
+def export_traces(limit: Optional[int] = None, turn_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Most recent traces first, optionally filtered to a single turn."""
+    traces = [t for t in reversed(RECENT_TRACES) if turn_id is None or t.turn_id == turn_id]
+    if limit is not None:
+        traces = traces[:limit]
+    return [trace.to_dict() for trace in traces]
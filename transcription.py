@@ -0,0 +1,212 @@
+"""
+Speech-to-text uploads for the /transcribe endpoint.
+
+Accepts the recording as a raw request body (Content-Type: audio/webm, ...),
+as a multipart form upload (field "file" or "audio"), or in the legacy JSON
+shape {"audio": "data:audio/webm;base64,..."}. Raw and multipart bodies are
+streamed into a SpooledTemporaryFile that stays in memory for typical
+utterances, enforcing the size cap while reading; the buffer is handed to
+Whisper directly, without a temp file round-trip. WAV/PCM recordings have
+their silence trimmed first (vad.py). Transcriptions run through
+a bounded concurrency pool and the "transcribe" circuit breaker.
+"""
+import asyncio
+import base64
+import binascii
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import AsyncGenerator, BinaryIO, Optional, Tuple
+
+from openai import AsyncOpenAI
+from starlette.requests import Request
+
+from circuit_breaker import get_breaker
+from tracing import span
+from vad import VADResult, is_pcm, process_async
+
+logger = logging.getLogger(__name__)
+
+# Whisper rejects files above 25 MB
+MAX_UPLOAD_BYTES = int(os.getenv("TRANSCRIBE_MAX_BYTES", str(25 * 1024 * 1024)))
+# Uploads up to this size never touch the disk
+SPOOL_BYTES = int(os.getenv("TRANSCRIBE_SPOOL_BYTES", str(2 * 1024 * 1024)))
+MAX_CONCURRENT = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+# Requests waiting for a slot beyond this are turned away with 503
+MAX_QUEUED = int(os.getenv("TRANSCRIBE_MAX_QUEUED", "32"))
+# Trim silence from WAV/PCM uploads before sending them (see vad.py)
+VAD_ENABLED = os.getenv("TRANSCRIBE_VAD", "true").lower() == "true"
+
+EXTENSIONS = {
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/mp4": "m4a",
+    "audio/m4a": "m4a",
+    "audio/x-m4a": "m4a",
+    "audio/flac": "flac",
+}
+
+
+class TranscriptionError(Exception):
+    """A request the endpoint answers with an error status instead of a transcript."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def filename_for(content_type: str) -> str:
+    """Whisper picks the decoder from the file extension."""
+    media_type = content_type.split(";")[0].strip().lower()
+    return f"audio.{EXTENSIONS.get(media_type, 'webm')}"
+
+
+class TranscriptionService:
+    """Reads uploads within the size cap and transcribes them with bounded concurrency."""
+
+    def __init__(self, client: AsyncOpenAI, max_bytes: int = MAX_UPLOAD_BYTES,
+                 max_concurrent: int = MAX_CONCURRENT, max_queued: int = MAX_QUEUED):
+        self.client = client
+        self.max_bytes = max_bytes
+        self.max_queued = max_queued
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.breaker = get_breaker("transcribe")
+
+    def _check_declared_length(self, request: Request):
+        declared = request.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise TranscriptionError(413, f"Audio exceeds {self.max_bytes} bytes")
+
+    async def _limited_stream(self, request: Request) -> AsyncGenerator[bytes, None]:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > self.max_bytes:
+                raise TranscriptionError(413, f"Audio exceeds {self.max_bytes} bytes")
+            yield chunk
+
+    async def read_upload(self, request: Request) -> Tuple[str, BinaryIO, str]:
+        """
+        Read the recording from any of the accepted request shapes.
+
+        Returns:
+            (filename, file object positioned at 0, content type)
+        """
+        self._check_declared_length(request)
+        content_type = request.headers.get("content-type", "")
+
+        if content_type.startswith("application/json"):
+            return await self._read_json(request)
+
+        if content_type.startswith("multipart/form-data"):
+            from starlette.formparsers import MultiPartParser
+
+            form = await MultiPartParser(request.headers, self._limited_stream(request)).parse()
+            upload = form.get("file") or form.get("audio")
+            if upload is None or isinstance(upload, str):
+                raise TranscriptionError(400, "No audio file provided")
+            upload_type = upload.content_type or "audio/webm"
+            await upload.seek(0)
+            return upload.filename or filename_for(upload_type), upload.file, upload_type
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        try:
+            async for chunk in self._limited_stream(request):
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        if spool.tell() == 0:
+            spool.close()
+            raise TranscriptionError(400, "No audio data provided")
+        spool.seek(0)
+        return filename_for(content_type), spool, content_type or "audio/webm"
+
+    async def _read_json(self, request: Request) -> Tuple[str, BinaryIO, str]:
+        """Legacy shape: {"audio": "data:audio/webm;base64,..."}."""
+        body = bytearray()
+        async for chunk in self._limited_stream(request):
+            body += chunk
+        try:
+            audio = json.loads(body).get("audio")
+        except (ValueError, AttributeError):
+            raise TranscriptionError(400, "Invalid JSON body")
+        if not audio:
+            raise TranscriptionError(400, "No audio data provided")
+        if not isinstance(audio, str):
+            raise TranscriptionError(400, "Audio must be a base64 string")
+        header, _, encoded = audio.rpartition(",")
+        content_type = header[5:].split(";")[0] if header.startswith("data:") else "audio/webm"
+        try:
+            audio_bytes = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise TranscriptionError(400, "Audio is not valid base64")
+        return filename_for(content_type), io.BytesIO(audio_bytes), content_type
+
+    async def transcribe(self, filename: str, file: BinaryIO, content_type: str) -> str:
+        """Send the recording to Whisper once a concurrency slot is free."""
+        if self.semaphore.locked() and self.waiting >= self.max_queued:
+            raise TranscriptionError(503, "Too many transcriptions in progress")
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            def request_transcript():
+                # Retries re-send the same buffer from the start
+                file.seek(0)
+                return self.client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=(filename, file, content_type),
+                    response_format="text"
+                )
+
+            transcript = await self.breaker.call(request_transcript, retries=1, model="whisper-1")
+            return transcript if isinstance(transcript, str) else transcript.text
+        finally:
+            self.semaphore.release()
+
+    async def trim_silence(self, filename: str, file: BinaryIO,
+                           content_type: str) -> Tuple[str, BinaryIO, str, Optional[VADResult]]:
+        """Swap a WAV/PCM upload for its silence-trimmed 16 kHz mono version; other formats pass through."""
+        if not VAD_ENABLED or not (is_pcm(content_type) or filename.lower().endswith(".wav")):
+            return filename, file, content_type, None
+        with span("vad") as vad_span:
+            file.seek(0)
+            result = await process_async(file.read(), content_type)
+            if result is None:
+                return filename, file, content_type, None
+            vad_span.set(**result.to_dict())
+        file.close()
+        return "audio.wav", io.BytesIO(result.wav), "audio/wav", result
+
+    async def handle(self, request: Request) -> str:
+        """Read and transcribe one upload; raises TranscriptionError for client or capacity errors."""
+        filename, file, content_type = await self.read_upload(request)
+        try:
+            filename, file, content_type, trimmed = await self.trim_silence(filename, file, content_type)
+            if trimmed is not None and not trimmed.has_speech:
+                # Nothing but silence: no need to ask Whisper
+                return ""
+            return await self.transcribe(filename, file, content_type)
+        finally:
+            file.close()
+
+
+_service: Optional[TranscriptionService] = None
+
+
+def get_transcription_service(client: AsyncOpenAI) -> TranscriptionService:
+    global _service
+    if _service is None or _service.client is not client:
+        _service = TranscriptionService(client)
+    return _service
@@ -1,12 +1,19 @@
-from typing import Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
 import logging
 from openai import AsyncOpenAI
+from circuit_breaker import get_breaker
+from tracing import span
+
+if TYPE_CHECKING:
+    from session_store import Session
 
 class TranslationHandler:
     """Handles language detection and translation for Dr. Snow Paws."""
     
     def __init__(self, client: AsyncOpenAI):
         self.client = client
+        self.detect_breaker = get_breaker("detect")
+        self.translate_breaker = get_breaker("translate")
         self.session_languages = {}  # Store preferred language for each session
         
         # Extended lists of common words in Spanish and English
@@ -27,8 +34,8 @@ class TranslationHandler:
             "and", "or", "but", "for", "with", "without", "of", "the", "a", "an"
         }
     
-    async def detect_language(self, text: str) -> str:
-        """Detect the language of the input text."""
+    def quick_detect(self, text: str) -> Optional[str]:
+        """Local language detection; returns None when the text is ambiguous."""
         if not text or text.isspace():
             return "en"  # Default to English for empty text
             
@@ -49,10 +56,17 @@ class TranslationHandler:
             return "es"
         if english_matches > spanish_matches:
             return "en"
+        return None
+    
+    async def detect_language(self, text: str) -> str:
+        """Detect the language of the input text."""
+        quick = self.quick_detect(text)
+        if quick is not None:
+            return quick
             
         # For longer or ambiguous text, use the LLM
         try:
-            response = await self.client.chat.completions.create(
+            response = await self.detect_breaker.call(lambda: self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a language detector. Respond ONLY with 'en' for English or 'es' for Spanish."},
@@ -62,7 +76,7 @@ class TranslationHandler:
                 max_tokens=1,
                 presence_penalty=0,
                 frequency_penalty=0
-            )
+            ), retries=1, model="gpt-3.5-turbo")
             detected = response.choices[0].message.content.strip().lower()
             return detected if detected in ["en", "es"] else "en"
         except Exception as e:
@@ -75,7 +89,7 @@ class TranslationHandler:
             return text
             
         try:
-            response = await self.client.chat.completions.create(
+            response = await self.translate_breaker.call(lambda: self.client.chat.completions.create(
                 model="gpt-4-turbo",  # Using more capable model for better translations
                 messages=[
                     {"role": "system", "content": "Translate the following Spanish text to English. Preserve emojis, formatting, and proper nouns. Respond ONLY with the translation."},
@@ -83,7 +97,7 @@ class TranslationHandler:
                 ],
                 temperature=0.3,
                 max_tokens=300
-            )
+            ), retries=1, model="gpt-4-turbo")
             return response.choices[0].message.content.strip()
         except Exception as e:
             logging.error(f"Error translating to English: {e}")
@@ -110,7 +124,7 @@ class TranslationHandler:
             Respond ONLY with the Spanish translation.
             """
             
-            response = await self.client.chat.completions.create(
+            response = await self.translate_breaker.call(lambda: self.client.chat.completions.create(
                 model="gpt-4-turbo",  # Using more capable model for better translations
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -118,7 +132,7 @@ class TranslationHandler:
                 ],
                 temperature=0.3,
                 max_tokens=300
-            )
+            ), retries=1, model="gpt-4-turbo")
             return response.choices[0].message.content.strip()
         except Exception as e:
             logging.error(f"Error translating from English: {e}")
@@ -132,26 +146,36 @@ class TranslationHandler:
         """Get the preferred language for a session."""
         return self.session_languages.get(session_id, "en")
     
-    async def process_message(self, text: str, session_id: str = "default") -> Tuple[str, str, str]:
+    async def process_message(self, text: str, session_id: str = "default",
+                              session: Optional["Session"] = None) -> Tuple[str, str, str]:
         """
         Process a message: detect language, translate if needed, and return original text,
         English translation (if needed), and detected language code.
+
+        With a `session` (session_store.Session) the language preference is kept there,
+        so it follows the child across reconnects and instances.
         """
         # Get previous session language
-        prev_lang = self.get_session_language(session_id)
+        prev_lang = session.get("language", "en") if session else self.get_session_language(session_id)
         
         # Detect language
-        detected_lang = await self.detect_language(text)
+        with span("detect"):
+            detected_lang = await self.detect_language(text)
         
         # If previous interaction was in Spanish, bias towards Spanish for short messages
         if prev_lang == "es" and len(text.strip()) <= 15:
             detected_lang = "es"
         
         # Update session language preference
-        self.set_session_language(session_id, detected_lang)
+        if session:
+            if detected_lang != prev_lang:
+                session.set("language", detected_lang)
+        else:
+            self.set_session_language(session_id, detected_lang)
         
         # Translate to English if needed
-        english_text = await self.translate_to_english(text, detected_lang)
+        with span("translate_in"):
+            english_text = await self.translate_to_english(text, detected_lang)
         
         return english_text, detected_lang, text
         
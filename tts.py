@@ -1,7 +1,10 @@
 import base64
 from openai import AsyncOpenAI
+from circuit_breaker import get_breaker
+from audio_formats import DEFAULT_FORMAT, record_clip
 
-async def convert_text_to_speech(text: str, client: AsyncOpenAI, voice: str = "shimmer", language: str = "en") -> str:
+async def convert_text_to_speech(text: str, client: AsyncOpenAI, voice: str = "shimmer", language: str = "en",
+                                 audio_format: str = DEFAULT_FORMAT) -> str:
     """Convert text to speech using OpenAI's TTS API."""
     try:
         # Select appropriate voice for language
@@ -10,15 +13,17 @@ async def convert_text_to_speech(text: str, client: AsyncOpenAI, voice: str = "s
         else:
             voice = "shimmer"  # shimmer for English - warm and friendly tone
         
-        response = await client.audio.speech.create(
+        response = await get_breaker("tts").call(lambda: client.audio.speech.create(
             model="tts-1-hd",  # Using HD model for better quality
             voice=voice,
             input=text,
-            speed=0.95  # Slightly slower for more warmth and clarity
-        )
+            speed=0.95,  # Slightly slower for more warmth and clarity
+            response_format=audio_format
+        ), retries=1, model="tts-1-hd")
         
         # Convert to base64 for sending over websocket
         audio_bytes = response.read()
+        record_clip(audio_format, audio_bytes)
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         return audio_base64
         
@@ -0,0 +1,238 @@
+"""
+Voice activity detection and silence trimming for PCM/WAV recordings.
+
+A frame-level energy / zero-crossing-rate detector, vectorized with NumPy:
+frames louder than the estimated noise floor (or quieter but with the high
+zero-crossing rate of fricatives like "s" and "f") count as speech, and a
+short hangover keeps word edges. Leading and trailing silence is dropped and
+pauses inside the utterance are shortened to `max_pause_ms`. The result can be
+downmixed and resampled to 16 kHz mono, which is all Whisper uses anyway.
+
+Compressed formats (webm/ogg/mp3) would need a decoder and pass through untouched.
+"""
+import asyncio
+import io
+import os
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from metrics import VAD_AUDIO_BYTES, VAD_AUDIO_SECONDS
+
+TARGET_RATE = 16000
+FRAME_MS = 20
+# Speech must be this far above the noise floor...
+ENERGY_MARGIN_DB = 12.0
+# ...and never quieter than this, however quiet the room
+MIN_SPEECH_DBFS = -50.0
+# The floor is estimated from the quietest frames; a clip with no pauses (continuous
+# speech) has none, so the estimate is capped at a very noisy room's level
+MAX_NOISE_FLOOR_DBFS = -40.0
+# Frames within this of the floor still count as speech when they hiss (fricatives)
+FRICATIVE_MARGIN_DB = 6.0
+FRICATIVE_ZCR = 0.25
+HANGOVER_MS = 200
+MAX_PAUSE_MS = int(os.getenv("VAD_MAX_PAUSE_MS", "300"))
+
+PCM_TYPES = ("audio/wav", "audio/x-wav", "audio/wave", "audio/pcm", "audio/l16")
+
+# NumPy releases the GIL for the heavy lifting, so threads are enough to keep it off the loop
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("VAD_WORKERS", "2")), thread_name_prefix="vad")
+
+
+class VADResult:
+    """Compacted audio plus what trimming saved."""
+
+    def __init__(self, wav: bytes, sample_rate: int, bytes_in: int, seconds_in: float, seconds_out: float):
+        self.wav = wav
+        self.sample_rate = sample_rate
+        self.bytes_in = bytes_in
+        self.bytes_out = len(wav)
+        self.seconds_in = seconds_in
+        self.seconds_out = seconds_out
+
+    @property
+    def has_speech(self) -> bool:
+        return self.seconds_out > 0
+
+    def to_dict(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds_in": round(self.seconds_in, 3),
+            "seconds_out": round(self.seconds_out, 3),
+        }
+
+
+def is_pcm(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in PCM_TYPES
+
+
+def _content_type_params(content_type: str) -> dict:
+    params = {}
+    for part in content_type.split(";")[1:]:
+        key, _, value = part.strip().partition("=")
+        params[key.lower()] = value
+    return params
+
+
+def decode(data: bytes, content_type: str = "audio/wav") -> Tuple[np.ndarray, int]:
+    """
+    Decode WAV or raw little-endian 16-bit PCM into float32 samples.
+
+    Raw PCM takes its format from the content type, e.g. "audio/pcm;rate=24000;channels=1".
+
+    Returns:
+        (samples shaped [frames, channels] in [-1, 1], sample rate)
+    """
+    if data[:4] == b"RIFF":
+        with wave.open(io.BytesIO(data)) as wav:
+            width = wav.getsampwidth()
+            channels = wav.getnchannels()
+            rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+        if rate <= 0:
+            raise ValueError(f"Invalid WAV sample rate: {rate}")
+        if width == 1:
+            samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        elif width == 2:
+            samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+        elif width == 3:
+            as_bytes = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+            padded = np.zeros((len(as_bytes), 4), dtype=np.uint8)
+            padded[:, 1:] = as_bytes
+            samples = padded.view("<i4").reshape(-1).astype(np.float32) / 2147483648.0
+        elif width == 4:
+            samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+        else:
+            raise ValueError(f"Unsupported WAV sample width: {width}")
+    else:
+        params = _content_type_params(content_type)
+        rate = int(params.get("rate", TARGET_RATE))
+        channels = int(params.get("channels", 1))
+        if rate <= 0 or channels <= 0:
+            raise ValueError(f"Invalid PCM format: rate={rate}, channels={channels}")
+        usable = len(data) - len(data) % (2 * channels)
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0
+    return samples.reshape(-1, channels), rate
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """16-bit PCM WAV from float samples shaped [frames, channels]."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def to_mono_16k(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Downmix to mono and linearly resample to 16 kHz; returns shape [frames, 1]."""
+    mono = samples.mean(axis=1)
+    if sample_rate != TARGET_RATE and len(mono):
+        target_len = int(round(len(mono) * TARGET_RATE / sample_rate))
+        positions = np.arange(target_len, dtype=np.float64) * (sample_rate / TARGET_RATE)
+        mono = np.interp(positions, np.arange(len(mono)), mono).astype(np.float32)
+    return mono.reshape(-1, 1)
+
+
+def speech_mask(mono: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS,
+                hangover_ms: int = HANGOVER_MS) -> Tuple[np.ndarray, int]:
+    """
+    Per-frame speech decision.
+
+    Returns:
+        (boolean mask per frame, samples per frame)
+    """
+    frame_len = max(1, sample_rate * frame_ms // 1000)
+    n_frames = len(mono) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool), frame_len
+    frames = mono[:n_frames * frame_len].reshape(n_frames, frame_len)
+
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    energy_db = 20.0 * np.log10(rms)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+    noise_floor = min(np.percentile(energy_db, 10), MAX_NOISE_FLOOR_DBFS)
+    loud = energy_db > max(noise_floor + ENERGY_MARGIN_DB, MIN_SPEECH_DBFS)
+    hiss = (energy_db > max(noise_floor + FRICATIVE_MARGIN_DB, MIN_SPEECH_DBFS)) & (zcr > FRICATIVE_ZCR)
+    mask = loud | hiss
+
+    # Extend speech by the hangover on both sides so soft word edges survive
+    hangover = max(0, hangover_ms // frame_ms)
+    if hangover and mask.any():
+        kernel = np.ones(2 * hangover + 1, dtype=np.int32)
+        mask = np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+    return mask, frame_len
+
+
+def peak_dbfs(mono: np.ndarray, frame_len: int) -> float:
+    """Energy of the loudest frame, in dBFS."""
+    n_frames = len(mono) // frame_len
+    if n_frames == 0:
+        return -np.inf
+    frames = mono[:n_frames * frame_len].reshape(n_frames, frame_len)
+    return float(20.0 * np.log10(np.sqrt(np.mean(frames * frames, axis=1).max() + 1e-12)))
+
+
+def compact(samples: np.ndarray, mask: np.ndarray, frame_len: int, max_pause_frames: int) -> np.ndarray:
+    """Drop leading/trailing silence and shorten inner pauses to `max_pause_frames`."""
+    if not mask.any():
+        return samples[:0]
+    keep = mask.copy()
+    silent = ~mask
+    if silent.any():
+        # Position of each frame within its run of silence; keep the first max_pause_frames of each run
+        run_starts = np.diff(np.concatenate(([0], silent.astype(np.int8)))) == 1
+        start_index = np.flatnonzero(run_starts)[np.maximum(np.cumsum(run_starts) - 1, 0)]
+        position = np.arange(len(mask)) - start_index
+        keep |= silent & (position < max_pause_frames)
+
+    speech_frames = np.flatnonzero(mask)
+    keep[:speech_frames[0]] = False
+    keep[speech_frames[-1] + 1:] = False
+
+    frames = samples[:len(mask) * frame_len].reshape(len(mask), frame_len, samples.shape[1])
+    return frames[keep].reshape(-1, samples.shape[1])
+
+
+def process(data: bytes, content_type: str = "audio/wav", resample: bool = True,
+            max_pause_ms: int = MAX_PAUSE_MS) -> VADResult:
+    """Trim and compact silence in a WAV/PCM recording; returns a 16-bit WAV."""
+    samples, rate = decode(data, content_type)
+    seconds_in = len(samples) / rate if rate else 0.0
+    if resample:
+        samples = to_mono_16k(samples, rate)
+        rate = TARGET_RATE
+    mono = samples.mean(axis=1)
+    mask, frame_len = speech_mask(mono, rate)
+    if not mask.any() and peak_dbfs(mono, frame_len) > MIN_SPEECH_DBFS:
+        # Loud enough to be speech but not recognized as such: send it all rather than drop the child's words
+        compacted = samples
+    else:
+        compacted = compact(samples, mask, frame_len, max(1, max_pause_ms // FRAME_MS))
+    wav = encode_wav(compacted, rate)
+    return VADResult(wav, rate, len(data), seconds_in, len(compacted) / rate)
+
+
+async def process_async(data: bytes, content_type: str = "audio/wav", resample: bool = True,
+                        max_pause_ms: int = MAX_PAUSE_MS) -> Optional[VADResult]:
+    """Run `process` on the VAD worker pool; returns None when the audio can't be decoded."""
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(_executor, process, data, content_type, resample, max_pause_ms)
+    except (ValueError, wave.Error, EOFError):
+        return None
+    # Metrics are only touched from the event loop
+    VAD_AUDIO_BYTES.inc(result.bytes_in, direction="in")
+    VAD_AUDIO_BYTES.inc(result.bytes_out, direction="out")
+    VAD_AUDIO_SECONDS.inc(result.seconds_in, direction="in")
+    VAD_AUDIO_SECONDS.inc(result.seconds_out, direction="out")
+    return result